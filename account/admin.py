@@ -2,5 +2,38 @@ from django.contrib import admin
 from .models import CustomUser, Address
 
 
-admin.site.register(CustomUser)
+class OnlineFilter(admin.SimpleListFilter):
+
+    title = 'online'
+    parameter_name = 'online'
+
+    def lookups(self, request, model_admin):
+        return ('yes', 'Yes'), ('no', 'No')
+
+    def queryset(self, request, queryset):
+
+        online = CustomUser.objects.online().values('pk')
+
+        if self.value() == 'yes':
+            return queryset.filter(pk__in=online)
+        if self.value() == 'no':
+            return queryset.exclude(pk__in=online)
+        return queryset
+
+
+@admin.register(CustomUser)
+class CustomUserAdmin(admin.ModelAdmin):
+
+    list_display = ['username', 'phone_number', 'email', 'is_active', 'last_seen_at']
+    list_filter = [OnlineFilter, 'is_active', 'is_staff']
+    list_select_related = ['presence']
+    search_fields = ['username', 'phone_number', 'email']
+
+    @admin.display(ordering='presence__last_seen_at')
+    def last_seen_at(self, user):
+
+        presence = getattr(user, 'presence', None)
+        return presence.last_seen_at if presence else None
+
+
 admin.site.register(Address)
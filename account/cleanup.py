@@ -0,0 +1,49 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from .models import CustomUser
+
+
+def purge_inactive_users(now=None, batch_size=None, pause=None, progress=None):
+
+    """
+    Delete the users who did not activate their account within INACTIVE_USER_RETENTION_DAYS days.
+
+    Users are deleted (a logical delete, through LogicalManager) in primary key batches of 'batch_size': one query
+    reads the ids of a batch and one UPDATE covers its key range, with 'pause' seconds between batches so other
+    writers to the user table are not starved. 'progress' is called with the metrics after every batch.
+    """
+
+    now = now or timezone.now()
+    batch_size = batch_size or settings.INACTIVE_USER_BATCH_SIZE
+    pause = settings.INACTIVE_USER_BATCH_PAUSE if pause is None else pause
+
+    inactive = CustomUser.objects.filter(
+        is_active=False, create_at__lt=now - timedelta(days=settings.INACTIVE_USER_RETENTION_DAYS)
+    )
+    stats = {'deleted': 0, 'batches': 0, 'seconds': 0.0}
+    started = time.monotonic()
+    last_pk = 0
+
+    while True:
+        ids = list(inactive.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+
+        stats['deleted'] += inactive.filter(pk__gt=last_pk, pk__lte=ids[-1]).delete()
+        stats['batches'] += 1
+        stats['seconds'] = time.monotonic() - started
+        last_pk = ids[-1]
+
+        if progress:
+            progress(stats)
+
+        if len(ids) < batch_size:
+            break
+
+        if pause:
+            time.sleep(pause)
+
+    stats['seconds'] = time.monotonic() - started
+    return stats
@@ -0,0 +1,153 @@
+import smtplib
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from utils.send_email_to_user import verification_email
+from .models import PendingEmail
+
+
+_connection = None
+
+
+def get_mail_connection():
+
+    """
+    The email connection of this worker process, opened once and reused by every batch.
+    """
+
+    global _connection
+
+    if _connection is None:
+        _connection = get_connection()
+        _connection.open()
+
+    return _connection
+
+
+def close_mail_connection():
+
+    global _connection
+
+    if _connection is not None:
+        connection, _connection = _connection, None
+        connection.close()
+
+
+# noinspection PyUnusedLocal
+@receiver(setting_changed)
+def reset_mail_connection(setting, **kwargs):
+
+    if setting.startswith('EMAIL_'):
+        close_mail_connection()
+
+
+def queue_email(recipient, subject, body):
+    return PendingEmail.objects.create(recipient=recipient, subject=subject, body=body)
+
+
+def queue_verification_email(user_email, verification_code):
+    return queue_email(**verification_email(user_email, verification_code))
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=settings.MAIL_RETRY_BACKOFF * 2 ** (attempts - 1))
+
+
+def claim_batch(now, batch_size):
+
+    """
+    Take the next due emails out of the queue for MAIL_CLAIM_TIMEOUT seconds, so concurrent flushes skip them.
+    Emails that failed MAIL_MAX_ATTEMPTS times stay in the table and are not sent again.
+    """
+
+    with transaction.atomic():
+        batch = list(
+            PendingEmail.objects.select_for_update(skip_locked=True)
+            .filter(next_attempt_at__lte=now, attempts__lt=settings.MAIL_MAX_ATTEMPTS)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if batch:
+            PendingEmail.objects.filter(id__in=[email.id for email in batch]).update(
+                next_attempt_at=now + timedelta(seconds=settings.MAIL_CLAIM_TIMEOUT)
+            )
+
+    return batch
+
+
+def is_connection_lost(error):
+
+    # Only a refused message leaves the connection usable.
+    return isinstance(error, smtplib.SMTPServerDisconnected) or not isinstance(error, smtplib.SMTPException)
+
+
+def deliver(message):
+
+    """
+    Send 'message' over the worker connection and return whether it was delivered.
+
+    The server may have closed the connection while the worker sat idle between flushes, so a message that finds the
+    connection gone is sent once more over a fresh one before it counts as failed.
+    """
+
+    for reconnect in (True, False):
+        try:
+            return bool(get_mail_connection().send_messages([message]))
+        except (smtplib.SMTPException, OSError) as error:
+            if not is_connection_lost(error):
+                return False
+            close_mail_connection()
+            if not reconnect:
+                return False
+
+
+def send_batch(batch, now):
+
+    """
+    Send 'batch' over the worker connection, one message at a time so each one succeeds or fails on its own.
+    Sent emails are deleted; failed ones are retried after a delay doubling with every attempt.
+    """
+
+    sent, failed = [], []
+
+    for email in batch:
+        message = EmailMessage(email.subject, email.body, settings.DEFAULT_FROM_EMAIL, [email.recipient])
+        (sent if deliver(message) else failed).append(email)
+
+    for email in failed:
+        email.attempts += 1
+        email.next_attempt_at = now + retry_delay(email.attempts)
+
+    with transaction.atomic():
+        PendingEmail.objects.filter(id__in=[email.id for email in sent]).delete()
+        PendingEmail.objects.bulk_update(failed, ['attempts', 'next_attempt_at'])
+
+    return len(sent), len(failed)
+
+
+def flush_emails(now=None, batch_size=None):
+
+    """
+    Send every due email in batches of 'batch_size' and return the numbers of sent and failed emails.
+    """
+
+    now = now or timezone.now()
+    batch_size = batch_size or settings.MAIL_BATCH_SIZE
+    total_sent = total_failed = 0
+
+    while True:
+        batch = claim_batch(now, batch_size)
+        if not batch:
+            break
+
+        sent, failed = send_batch(batch, now)
+        total_sent += sent
+        total_failed += failed
+
+        if len(batch) < batch_size:
+            break
+
+    return total_sent, total_failed
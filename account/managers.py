@@ -1,9 +1,25 @@
 from core.managers import LogicalManager
+from datetime import timedelta
+from django.conf import settings
 from django.contrib.auth.models import UserManager as BaseUserManager
+from django.db.models import F, Q
+from django.utils import timezone
 
 
 class UserManager(LogicalManager, BaseUserManager):
 
+    def online(self, now=None):
+
+        """
+        Users seen within the last PRESENCE_ONLINE_WINDOW seconds and since they last logged out, as last flushed from
+        the presence buffers.
+        """
+
+        since = (now or timezone.now()) - timedelta(seconds=settings.PRESENCE_ONLINE_WINDOW)
+        return self.filter(presence__last_seen_at__gte=since).filter(
+            Q(presence__left_at__isnull=True) | Q(presence__last_seen_at__gt=F('presence__left_at'))
+        )
+
     def create_superuser(self, phone_number, email=None, password=None, **extra_fields):
         extra_fields.setdefault("is_staff", True)
         extra_fields.setdefault("is_superuser", True)
@@ -0,0 +1,25 @@
+from django.conf import settings
+from .presence import get_presence_buffer
+
+
+class PresenceMiddleware:
+
+    """
+    Mark authenticated users as seen, and flush the last-seen buffer once it is due.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+
+        response = self.get_response(request)
+        buffer = get_presence_buffer()
+
+        # Requests without a session cookie are anonymous; skip them without loading a session.
+        if settings.SESSION_COOKIE_NAME in request.COOKIES and request.user.is_authenticated:
+            buffer.touch(request.user.pk)
+
+        buffer.flush_if_due()
+
+        return response
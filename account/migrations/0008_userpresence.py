@@ -0,0 +1,26 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0007_alter_customuser_password'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserPresence',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='presence', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('last_seen_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'User Presence',
+                'verbose_name_plural': 'User Presences',
+            },
+        ),
+    ]
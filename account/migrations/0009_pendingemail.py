@@ -0,0 +1,30 @@
+# Generated by Django 5.0.6 on 2026-10-18 17:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0008_userpresence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient', models.EmailField(max_length=254)),
+                ('subject', models.CharField(max_length=255)),
+                ('body', models.TextField()),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Pending Email',
+                'verbose_name_plural': 'Pending Emails',
+                'indexes': [models.Index(fields=['next_attempt_at'], name='account_pendingemail_due_idx')],
+            },
+        ),
+    ]
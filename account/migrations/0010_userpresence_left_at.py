@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0009_pendingemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userpresence',
+            name='left_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
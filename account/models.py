@@ -2,6 +2,7 @@ from core.models import TimeStampMixin, LogicalMixin
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, Group, Permission
 from django.core.validators import RegexValidator
 from django.db import models, IntegrityError
+from django.utils import timezone
 from account.managers import UserManager
 
 
@@ -32,6 +33,7 @@ class CustomUser(AbstractBaseUser, PermissionsMixin, TimeStampMixin, LogicalMixi
     first_name = models.CharField(max_length=255, blank=True, null=True)
     last_name = models.CharField(max_length=255, blank=True, null=True)
     age = models.IntegerField(blank=True, null=True)
+    # No longer maintained: whether a user is online is derived from UserPresence.
     is_logged_in = models.BooleanField(default=False)
     is_active = models.BooleanField(default=False)
     profile_image = models.ImageField(
@@ -83,6 +85,49 @@ user_permissions = models.ManyToManyField(
 )
 
 
+class UserPresence(models.Model):
+
+    """
+    When a user was last seen, and when they last logged out. Rows are written in batches by account.presence, never
+    on the request path; a user is online when seen recently and after their last logout.
+    """
+
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='presence')
+    last_seen_at = models.DateTimeField(db_index=True)
+    left_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'User Presence'
+        verbose_name_plural = 'User Presences'
+
+    def __str__(self):
+        return f'{self.user_id} last seen at {self.last_seen_at}'
+
+
+class PendingEmail(models.Model):
+
+    """
+    An email waiting in the outbox. account.mail sends them in batches and pushes failed ones back with a backoff.
+    """
+
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Pending Email'
+        verbose_name_plural = 'Pending Emails'
+
+        indexes = [
+            models.Index(fields=['next_attempt_at'], name='account_pendingemail_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} to {self.recipient}'
+
+
 class Address(LogicalMixin, models.Model):
 
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='addresses')
@@ -0,0 +1,120 @@
+import threading
+import time
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import UserPresence
+
+
+class PresenceBuffer:
+
+    """
+    Collects the last-seen and logout times of users in process memory and writes them in batches.
+
+    Requests only update a dict; flush() reads the UserPresence rows of the pending users and writes them back with one
+    bulk_update, creating the missing ones with one bulk_create. Every process keeps its own buffer, so a flush never
+    moves a time backwards, and a last-seen time older than the logout of the user, as flushed by another process, is
+    dropped instead of bringing the user back online.
+    """
+
+    def __init__(self, flush_interval=None, batch_size=None):
+
+        self.flush_interval = settings.PRESENCE_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.batch_size = batch_size or settings.PRESENCE_BATCH_SIZE
+        self.pending = {}
+        self.left = {}
+        self.flushed_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def touch(self, user_id, now=None):
+
+        with self.lock:
+            self.pending[user_id] = now or timezone.now()
+
+    def leave(self, user_id, now=None):
+
+        with self.lock:
+            self.pending.pop(user_id, None)
+            self.left[user_id] = now or timezone.now()
+
+    def is_due(self):
+
+        return (len(self.pending) + len(self.left) >= self.batch_size
+                or time.monotonic() - self.flushed_at >= self.flush_interval)
+
+    def flush_if_due(self):
+
+        # Pending times are never written into a transaction opened by someone else, such as a test case.
+        if (self.pending or self.left) and self.is_due() and not connection.in_atomic_block:
+            return self.flush()
+
+        return 0
+
+    def flush(self):
+
+        """
+        Write the pending last-seen and logout times and return the number of users written.
+        """
+
+        with self.lock:
+            seen, self.pending = self.pending, {}
+            left, self.left = self.left, {}
+            self.flushed_at = time.monotonic()
+
+        if not seen and not left:
+            return 0
+
+        with transaction.atomic():
+            # The rows stay locked until they are written back, so concurrent flushes apply their times one by one.
+            existing = UserPresence.objects.select_for_update().in_bulk(list(seen.keys() | left.keys()))
+            created = {}
+
+            for user_id, left_at in left.items():
+                presence = existing.get(user_id) or created.setdefault(
+                    user_id, UserPresence(user_id=user_id, last_seen_at=left_at)
+                )
+                presence.left_at = max(presence.left_at or left_at, left_at)
+
+            for user_id, seen_at in seen.items():
+                presence = existing.get(user_id) or created.setdefault(
+                    user_id, UserPresence(user_id=user_id, last_seen_at=seen_at)
+                )
+                if presence.left_at is None or seen_at > presence.left_at:
+                    presence.last_seen_at = max(presence.last_seen_at, seen_at)
+
+            UserPresence.objects.bulk_update(
+                existing.values(), ['last_seen_at', 'left_at'], batch_size=self.batch_size
+            )
+            UserPresence.objects.bulk_create(
+                created.values(),
+                batch_size=self.batch_size,
+                # Another process may have written the first presence of the same user.
+                ignore_conflicts=True,
+            )
+
+        return len(seen.keys() | left.keys())
+
+
+_buffer = None
+
+
+def get_presence_buffer():
+
+    global _buffer
+
+    if _buffer is None:
+        _buffer = PresenceBuffer()
+
+    return _buffer
+
+
+# noinspection PyUnusedLocal
+@receiver(setting_changed)
+def reset_presence_buffer(setting, **kwargs):
+
+    global _buffer
+
+    if setting in ('PRESENCE_FLUSH_INTERVAL', 'PRESENCE_BATCH_SIZE'):
+        _buffer = None
@@ -1,37 +1,44 @@
-from time import sleep
 from celery import shared_task
-from datetime import timedelta
-from django.utils import timezone
-from utils.send_email_to_user import send_verification_code
-from .models import CustomUser
-import pytz
+from celery.utils.log import get_task_logger
+from core.locks import task_lock
+from django.conf import settings
+from .cleanup import purge_inactive_users
+from .mail import flush_emails, queue_verification_email
+
+
+logger = get_task_logger(__name__)
 
 
 # noinspection PyUnusedLocal
 @shared_task(bind=True)
 def send_verification_code_to_user(self, user_email, verification_code):
-    print(f"Task started: Sending email to {user_email} with code {verification_code}")
-    send_verification_code(user_email, verification_code)
-    print(f"Email sent to ==> {user_email}")
-    return "Done"
+
+    # Kept for tasks queued before verification emails went through the outbox.
+    queue_verification_email(user_email, verification_code)
+    return "Queued"
 
 
 # noinspection PyUnusedLocal
 @shared_task(bind=True)
-def delete_inactive_users(self):
+def flush_pending_emails(self, batch_size=None):
+
+    sent, failed = flush_emails(batch_size=batch_size)
+    return f"Sent {sent} emails, {failed} failed."
+
+
+@shared_task(bind=True)
+def delete_inactive_users(self, batch_size=None, pause=None):
 
-    current_time_utc = timezone.now()
-    local_timezone = pytz.timezone('Asia/Tehran')
-    current_time_tehran = current_time_utc.astimezone(local_timezone)
+    def report(stats):
+        logger.info("Deleted %(deleted)d inactive users in %(batches)d batches (%(seconds).1fs)", stats)
+        # Progress is only stored for runs on a worker; a direct call has no task id to store it under.
+        if self.request.id:
+            self.update_state(state='PROGRESS', meta=stats)
 
-    three_days_ago = current_time_tehran - timedelta(days=3)
+    with task_lock('delete-inactive-users', settings.INACTIVE_USER_LOCK_TIMEOUT) as acquired:
+        if not acquired:
+            return "Inactive users are already being deleted by another worker."
 
-    inactive_users = CustomUser.objects.filter(is_active=False, create_at__lt=three_days_ago)
-    if inactive_users:
-        print("Deleting inactive users")
-        sleep(10)
-    else:
-        print("None")
+        stats = purge_inactive_users(batch_size=batch_size, pause=pause, progress=report)
 
-    deleted_count = inactive_users.delete()
-    return f"Deleted {deleted_count} inactive users."
+    return f"Deleted {stats['deleted']} inactive users in {stats['batches']} batches ({stats['seconds']:.1f}s)."
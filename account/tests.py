@@ -1,7 +1,24 @@
-from account.models import CustomUser, Address
+from account.admin import CustomUserAdmin, OnlineFilter
+from account.cleanup import purge_inactive_users
+from account.mail import close_mail_connection, flush_emails, queue_email, queue_verification_email
+from account.models import CustomUser, Address, PendingEmail, UserPresence
+from account.presence import PresenceBuffer
+from account.tasks import delete_inactive_users
+from core.locks import task_lock
+from datetime import timedelta
+from django.contrib.auth.hashers import make_password
+from django.core import mail
 from django.core.exceptions import ValidationError
+from django.core.mail.backends import locmem
+from django.db import connection
 from django.db.utils import IntegrityError
-from django.test import TestCase
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from types import SimpleNamespace
+import smtplib
+from unittest.mock import patch
 
 
 # noinspection PyUnusedLocal
@@ -372,3 +389,275 @@ class AddressModelTestCase(TestCase):
         address_id = address.id
         address.delete()
         self.assertEqual(Address.objects.filter(id=address_id).count(), 0)
+
+
+class UserPresenceTestCase(TestCase):
+
+    def setUp(self):
+
+        self.now = timezone.now()
+        self.users = [
+            CustomUser.objects.create(
+                username=f'presence_user_{index}', password=make_password('Test@1234'),
+                phone_number=f'0912345670{index}', email=f'presence{index}@example.com', is_active=True,
+            )
+            for index in range(3)
+        ]
+        self.buffer = PresenceBuffer(flush_interval=60, batch_size=100)
+
+    def test_sign_in_does_not_update_the_user_row(self):
+
+        with patch('account.views.get_presence_buffer', return_value=self.buffer), \
+                CaptureQueriesContext(connection) as context:
+            response = self.client.post(
+                reverse('account:signin'), {'phone_number': '09123456700', 'password': 'Test@1234'}
+            )
+
+        self.assertEqual(response.status_code, 302)
+        updates = [query['sql'] for query in context.captured_queries if query['sql'].startswith('UPDATE "account_')]
+        self.assertTrue(all('SET "last_login"' in sql for sql in updates), updates)
+        self.assertIn(self.users[0].pk, self.buffer.pending)
+
+    def test_flush_writes_last_seen_times_in_batches(self):
+
+        UserPresence.objects.create(user=self.users[0], last_seen_at=self.now - timedelta(hours=1))
+        for user in self.users:
+            self.buffer.touch(user.pk, self.now)
+
+        with self.assertNumQueries(5):
+            self.assertEqual(self.buffer.flush(), 3)
+
+        self.assertEqual(self.buffer.pending, {})
+        self.assertEqual(set(CustomUser.objects.online(self.now)), set(self.users))
+        self.assertFalse(CustomUser.objects.online(self.now + timedelta(hours=1)).exists())
+
+    def test_leave_marks_the_user_offline(self):
+
+        for user in self.users:
+            self.buffer.touch(user.pk, self.now)
+        self.buffer.flush()
+
+        self.buffer.leave(self.users[1].pk, self.now + timedelta(seconds=1))
+        self.buffer.flush()
+
+        self.assertEqual(set(CustomUser.objects.online(self.now)), {self.users[0], self.users[2]})
+
+    def test_other_processes_do_not_undo_a_leave(self):
+
+        other = PresenceBuffer(flush_interval=60, batch_size=100)
+        other.touch(self.users[0].pk, self.now)
+
+        # The logout is flushed before the last-seen time another process buffered while the user was still in.
+        self.buffer.leave(self.users[0].pk, self.now + timedelta(seconds=1))
+        self.buffer.flush()
+        other.flush()
+
+        self.assertFalse(CustomUser.objects.online(self.now).exists())
+
+        # Signing in again, in any process, brings the user back.
+        other.touch(self.users[0].pk, self.now + timedelta(seconds=2))
+        other.flush()
+        self.buffer.touch(self.users[0].pk, self.now - timedelta(seconds=5))
+        self.buffer.flush()
+
+        self.assertEqual(list(CustomUser.objects.online(self.now)), [self.users[0]])
+        self.assertEqual(UserPresence.objects.get().last_seen_at, self.now + timedelta(seconds=2))
+
+    def test_flush_waits_for_the_interval_or_a_full_batch(self):
+
+        self.buffer.touch(self.users[0].pk, self.now)
+
+        with patch('account.presence.connection', SimpleNamespace(in_atomic_block=False)):
+            self.assertEqual(self.buffer.flush_if_due(), 0)
+            self.buffer.batch_size = 1
+            self.assertEqual(self.buffer.flush_if_due(), 1)
+
+        self.assertTrue(UserPresence.objects.filter(user=self.users[0]).exists())
+
+    def test_admin_filters_online_users(self):
+
+        UserPresence.objects.create(user=self.users[0], last_seen_at=timezone.now())
+        request = RequestFactory().get('/')
+        users = CustomUser.objects.filter(pk__in=[user.pk for user in self.users])
+
+        for value, expected in (('yes', {self.users[0]}), ('no', {self.users[1], self.users[2]})):
+            online_filter = OnlineFilter(request, {'online': [value]}, CustomUser, CustomUserAdmin)
+            self.assertEqual(set(online_filter.queryset(request, users)), expected)
+
+
+class FlakyEmailBackend(locmem.EmailBackend):
+
+    """
+    Refuses every message to refused@example.com and counts the connections opened.
+    """
+
+    opened = 0
+
+    def open(self):
+
+        FlakyEmailBackend.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+
+        if any('refused@example.com' in message.to for message in messages):
+            raise smtplib.SMTPRecipientsRefused({'refused@example.com': (550, b'Refused')})
+        return super().send_messages(messages)
+
+
+@override_settings(
+    EMAIL_BACKEND='account.tests.FlakyEmailBackend', MAIL_BATCH_SIZE=10, MAIL_MAX_ATTEMPTS=3, MAIL_RETRY_BACKOFF=30
+)
+class PendingEmailTestCase(TestCase):
+
+    def setUp(self):
+
+        # Flushes run a minute after the emails are queued.
+        self.now = timezone.now() + timedelta(minutes=1)
+        FlakyEmailBackend.opened = 0
+        close_mail_connection()
+        self.addCleanup(close_mail_connection)
+
+    def test_verification_request_queues_the_email(self):
+
+        response = self.client.post(reverse('account:authenticate'), {'email': 'new@example.com'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mail.outbox, [])
+        email = PendingEmail.objects.get()
+        self.assertEqual(email.recipient, 'new@example.com')
+        self.assertIn(self.client.session['verification_code'], email.body)
+
+    def test_flush_sends_batches_over_one_connection(self):
+
+        for index in range(25):
+            queue_verification_email(f'user{index}@example.com', f'{index:06}')
+
+        self.assertEqual(flush_emails(self.now), (25, 0))
+        queue_verification_email('late@example.com', '000000')
+        self.assertEqual(flush_emails(self.now + timedelta(seconds=1)), (1, 0))
+
+        self.assertEqual(len(mail.outbox), 26)
+        self.assertEqual(mail.outbox[0].to, ['user0@example.com'])
+        self.assertEqual(FlakyEmailBackend.opened, 1)
+        self.assertFalse(PendingEmail.objects.exists())
+
+    def test_failed_emails_are_retried_with_backoff(self):
+
+        queue_email('refused@example.com', 'Subject', 'Body')
+        queue_email('user@example.com', 'Subject', 'Body')
+
+        self.assertEqual(flush_emails(self.now), (1, 1))
+        email = PendingEmail.objects.get()
+        self.assertEqual((email.attempts, email.next_attempt_at), (1, self.now + timedelta(seconds=30)))
+
+        self.assertEqual(flush_emails(self.now + timedelta(seconds=29)), (0, 0))
+        self.assertEqual(flush_emails(self.now + timedelta(seconds=30)), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.attempts, email.next_attempt_at), (2, self.now + timedelta(seconds=90)))
+
+        self.assertEqual(flush_emails(self.now + timedelta(seconds=90)), (0, 1))
+        self.assertEqual(flush_emails(self.now + timedelta(days=1)), (0, 0))
+        self.assertEqual(PendingEmail.objects.get().attempts, 3)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_lost_connections_are_reopened(self):
+
+        queue_email('user1@example.com', 'Subject', 'Body')
+        queue_email('user2@example.com', 'Subject', 'Body')
+
+        with patch.object(
+            FlakyEmailBackend, 'send_messages', side_effect=[smtplib.SMTPServerDisconnected(), 1, 1], autospec=True
+        ):
+            self.assertEqual(flush_emails(self.now), (2, 0))
+
+        self.assertEqual(FlakyEmailBackend.opened, 2)
+        self.assertFalse(PendingEmail.objects.exists())
+
+    def test_connection_lost_twice_fails_the_message(self):
+
+        queue_email('user1@example.com', 'Subject', 'Body')
+
+        with patch.object(
+            FlakyEmailBackend, 'send_messages', side_effect=[ConnectionResetError(), ConnectionResetError()],
+            autospec=True
+        ):
+            self.assertEqual(flush_emails(self.now), (0, 1))
+
+        self.assertEqual(FlakyEmailBackend.opened, 2)
+        self.assertEqual(PendingEmail.objects.get().attempts, 1)
+
+
+class DeleteInactiveUsersTestCase(TestCase):
+
+    def setUp(self):
+
+        self.now = timezone.now()
+
+    def create_users(self, count, prefix, is_active=False, age=timedelta(days=4)):
+
+        # Rows are inserted with one executemany: building 200k model instances for bulk_create takes a minute.
+        template = CustomUser(password='!', is_active=is_active, create_at=self.now - age, modify_at=self.now)
+        fields = [field for field in CustomUser._meta.concrete_fields if not field.primary_key]
+        values = {field.attname: field.get_db_prep_save(getattr(template, field.attname), connection)
+                  for field in fields}
+
+        quote = connection.ops.quote_name
+        columns = ', '.join(quote(field.column) for field in fields)
+
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {quote(CustomUser._meta.db_table)} ({columns}) '
+                f'VALUES ({", ".join(["%s"] * len(fields))})',
+                [
+                    [{**values, 'username': f'{prefix}_{index}', 'phone_number': f'{prefix}{index}',
+                      'email': f'{prefix}{index}@example.com'}[field.attname] for field in fields]
+                    for index in range(count)
+                ],
+            )
+
+    def test_purge_deletes_inactive_users_in_batches(self):
+
+        self.create_users(200_000, 'stale')
+        self.create_users(10, 'active', is_active=True)
+        self.create_users(10, 'recent', age=timedelta(days=1))
+        progress = []
+
+        # Every batch reads its ids and updates their range; one last read finds nothing left.
+        with self.assertNumQueries(41):
+            stats = purge_inactive_users(
+                self.now, batch_size=10_000, pause=0, progress=lambda stats: progress.append(stats['deleted'])
+            )
+
+        self.assertEqual((stats['deleted'], stats['batches']), (200_000, 20))
+        self.assertEqual(progress, list(range(10_000, 200_001, 10_000)))
+        self.assertEqual(CustomUser.objects.archived.filter(username__startswith='stale_', is_deleted=True).count(),
+                         200_000)
+        self.assertEqual(CustomUser.objects.filter(username__startswith='active_').count(), 10)
+        self.assertEqual(CustomUser.objects.filter(username__startswith='recent_').count(), 10)
+
+        self.assertEqual(purge_inactive_users(self.now, batch_size=10_000, pause=0)['deleted'], 0)
+
+    def test_pauses_between_batches(self):
+
+        self.create_users(25, 'stale')
+
+        with patch('account.cleanup.time.sleep') as sleep:
+            stats = purge_inactive_users(self.now, batch_size=10, pause=0.5)
+
+        self.assertEqual((stats['deleted'], stats['batches']), (25, 3))
+        self.assertEqual(sleep.call_count, 2)
+        sleep.assert_called_with(0.5)
+
+    def test_task_runs_on_one_worker_at_a_time(self):
+
+        self.create_users(5, 'stale')
+
+        with task_lock('delete-inactive-users', 60) as acquired:
+            self.assertTrue(acquired)
+            self.assertIn('already', delete_inactive_users(pause=0))
+            self.assertEqual(CustomUser.objects.filter(username__startswith='stale_').count(), 5)
+
+        # The run time in the message depends on the machine; only the counts are checked.
+        self.assertTrue(delete_inactive_users(pause=0).startswith('Deleted 5 inactive users in 1 batches '))
+        self.assertFalse(CustomUser.objects.filter(username__startswith='stale_').exists())
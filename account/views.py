@@ -9,6 +9,8 @@ from .forms import (
     AddressForm,
     AddressUpdateForm
 )
+from .mail import queue_verification_email
+from .presence import get_presence_buffer
 from .serializers import AddressSerializer
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
@@ -36,10 +38,14 @@ from rest_framework.decorators import action
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .tasks import send_verification_code_to_user
+from shop.cart_store import cart_for
 import json
 
 
+# Set on sign in and cleared by the first login status check, so the page can drop the anonymous local cart.
+LOGGED_IN_COOKIE = 'logged_in'
+
+
 class SignInView(View):
     template_name = 'signin.html'
 
@@ -55,14 +61,17 @@ class SignInView(View):
         user = authenticate(request, phone_number=phone_number, password=password)
         if user is not None:
             if not user.is_deleted:
-                user.is_logged_in = True
-                user.save()
-
                 login(request, user)
-                request.session['success_message'] = 'Logged in successfully!'
+                get_presence_buffer().touch(user.pk)
+                messages.success(request, 'Logged in successfully!')
                 self.merge_carts(request, local_cart)
-                request.session['logged_in'] = True
-                return redirect(reverse_lazy('shop:home'))
+
+                # One-shot flags travel in cookies, so reading them does not write the session.
+                response = redirect(reverse_lazy('shop:home'))
+                response.set_signed_cookie(
+                    LOGGED_IN_COOKIE, '1', salt=LOGGED_IN_COOKIE, max_age=60 * 60, httponly=True, samesite='Lax'
+                )
+                return response
             else:
                 messages.error(request, 'Your account is disabled.')
         else:
@@ -73,38 +82,27 @@ class SignInView(View):
 
     @staticmethod
     def merge_carts(request, local_cart):
-        session_cart = request.session.get('cart', {})
-
-        for product_id, item in local_cart.items():
-            if product_id in session_cart:
-                session_cart[product_id]['quantity'] += item['quantity']
-            else:
-                session_cart[product_id] = item
-
-        request.session['cart'] = session_cart
-        request.session.modified = True
+        cart_for(request).merge(local_cart)
 
 
 class CheckLoginStatusAPIView(APIView):
     @staticmethod
     def get(request):
-        logged_in = request.session.pop('logged_in', False)
-        return Response({'logged_in': logged_in})
+        logged_in = request.get_signed_cookie(LOGGED_IN_COOKIE, default=None, salt=LOGGED_IN_COOKIE) == '1'
+        response = Response({'logged_in': logged_in})
+        if LOGGED_IN_COOKIE in request.COOKIES:
+            response.delete_cookie(LOGGED_IN_COOKIE, samesite='Lax')
+        return response
 
 
 class LogOutView(View):
 
     def post(self, request):
-        cart_data = self.request.session.get('cart', {})
-
-        self.request.user.is_logged_in = False
-        self.request.user.save(update_fields=['is_logged_in'])
+        if self.request.user.is_authenticated:
+            get_presence_buffer().leave(self.request.user.pk)
 
         logout(self.request)
 
-        self.request.session['cart'] = cart_data
-        self.request.session.modified = True
-
         return redirect('shop:home')
 
 
@@ -163,8 +161,7 @@ class AuthUserView(View):
         if 'email' in request.POST:
             user_email = request.POST.get('email')
             verification_code = generate_verification_code()
-            print(f"Sending task to send email to {user_email}")
-            send_verification_code_to_user.apply_async(args=[user_email, verification_code])
+            queue_verification_email(user_email, verification_code)
             request.session['user_email'] = user_email
             request.session['verification_code'] = verification_code
             return render(request, self.template_name, {'show_verification_code_input': True})
@@ -1,6 +1,6 @@
 from __future__ import absolute_import, unicode_literals
 from celery import Celery
-from celery.signals import worker_ready
+from celery.signals import worker_process_shutdown
 from django.conf import settings
 import os
 
@@ -23,7 +23,7 @@ def debug_task(self):
 
 
 # noinspection PyUnusedLocal
-@worker_ready.connect
-def at_start(sender, **kwargs):
-    from account.tasks import delete_inactive_users
-    delete_inactive_users.apply_async()
+@worker_process_shutdown.connect
+def close_worker_mail_connection(**kwargs):
+    from account.mail import close_mail_connection
+    close_mail_connection()
@@ -26,7 +26,8 @@ INSTALLED_APPS = [
     'crispy_forms',
     "crispy_tailwind",
     'rest_framework',
-    "usermgmt"
+    "usermgmt",
+    "search",
 ]
 
 JAZZMIN_SETTINGS = {
@@ -40,10 +41,11 @@ JAZZMIN_SETTINGS = {
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'account.middleware.PresenceMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -117,6 +119,28 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 AUTH_USER_MODEL = 'account.CustomUser'
 
+# Catalog
+PRODUCT_PAGE_SIZE = config('PRODUCT_PAGE_SIZE', default=24, cast=int)
+ORDER_HISTORY_PAGE_SIZE = config('ORDER_HISTORY_PAGE_SIZE', default=20, cast=int)
+SEARCH_BACKEND = config('SEARCH_BACKEND', default='')
+
+# Cart
+CART_STORE = config('CART_STORE', default='shop.cart_store.DatabaseCartStore')
+CART_REDIS_URL = config('CART_REDIS_URL', default='redis://localhost:6379/1')
+CART_TIMEOUT = config('CART_TIMEOUT', default=60 * 60 * 24 * 30, cast=int)
+STOCK_RESERVATION_TTL = config('STOCK_RESERVATION_TTL', default=15 * 60, cast=int)
+
+# Checkout
+# A confirmation refused a write lock by the database (SQLite does not queue writers) is run again up to
+# CHECKOUT_LOCK_RETRIES times, after a random pause of up to CHECKOUT_LOCK_BACKOFF seconds doubling every attempt.
+CHECKOUT_LOCK_RETRIES = config('CHECKOUT_LOCK_RETRIES', default=20, cast=int)
+CHECKOUT_LOCK_BACKOFF = config('CHECKOUT_LOCK_BACKOFF', default=0.01, cast=float)
+
+# Throttling
+THROTTLE_BUCKET_STORE = config('THROTTLE_BUCKET_STORE', default='shop.throttling.CacheBucketStore')
+COUPON_CHECK_BURST = config('COUPON_CHECK_BURST', default=10, cast=int)
+COUPON_CHECK_RATE = config('COUPON_CHECK_RATE', default=0.2, cast=float)
+
 # styles
 CRISPY_ALLOWED_TEMPLATE_PACKS = "tailwind"
 CRISPY_TEMPLATE_PACK = "tailwind"
@@ -145,10 +169,103 @@ CELERY_ACCEPT_CONTENT = [config('CELERY_ACCEPT_CONTENT')]
 CELERY_RESULT_SERIALIZER = config('CELERY_RESULT_SERIALIZER')
 CELERY_TASK_SERIALIZER = config('CELERY_TASK_SERIALIZER')
 CELERY_TIMEZONE = config('CELERY_TIMEZONE')
+CELERY_BEAT_SCHEDULE = {
+    'release-expired-stock-reservations': {
+        'task': 'shop.tasks.release_expired_reservations',
+        'schedule': config('STOCK_RESERVATION_SWEEP_INTERVAL', default=60, cast=int),
+    },
+    'sync-discount-rules': {
+        'task': 'shop.tasks.sync_discount_rules',
+        'schedule': config('DISCOUNT_RULE_SYNC_INTERVAL', default=60, cast=int),
+    },
+    'flush-pending-emails': {
+        'task': 'account.tasks.flush_pending_emails',
+        'schedule': config('MAIL_FLUSH_INTERVAL', default=5, cast=int),
+    },
+    'delete-inactive-users': {
+        'task': 'account.tasks.delete_inactive_users',
+        'schedule': config('INACTIVE_USER_SWEEP_INTERVAL', default=60 * 60, cast=int),
+    },
+}
+
+# Inactive users
+# Accounts not activated within INACTIVE_USER_RETENTION_DAYS days are deleted INACTIVE_USER_BATCH_SIZE at a time,
+# pausing INACTIVE_USER_BATCH_PAUSE seconds between batches. One worker at a time holds the sweep lock.
+INACTIVE_USER_RETENTION_DAYS = config('INACTIVE_USER_RETENTION_DAYS', default=3, cast=int)
+INACTIVE_USER_BATCH_SIZE = config('INACTIVE_USER_BATCH_SIZE', default=1000, cast=int)
+INACTIVE_USER_BATCH_PAUSE = config('INACTIVE_USER_BATCH_PAUSE', default=0.1, cast=float)
+INACTIVE_USER_LOCK_TIMEOUT = config('INACTIVE_USER_LOCK_TIMEOUT', default=60 * 60, cast=int)
+
+# Outgoing mail
+# Emails are queued in the database and sent by the flush task in batches of MAIL_BATCH_SIZE. A failed email is
+# retried after MAIL_RETRY_BACKOFF seconds, doubling with every attempt, up to MAIL_MAX_ATTEMPTS attempts.
+MAIL_BATCH_SIZE = config('MAIL_BATCH_SIZE', default=100, cast=int)
+MAIL_MAX_ATTEMPTS = config('MAIL_MAX_ATTEMPTS', default=5, cast=int)
+MAIL_RETRY_BACKOFF = config('MAIL_RETRY_BACKOFF', default=30, cast=int)
+MAIL_CLAIM_TIMEOUT = config('MAIL_CLAIM_TIMEOUT', default=5 * 60, cast=int)
+
+# Cache settings
+# 'local' keeps every alias in process memory; 'production' puts them on Redis, shared by all workers.
+CACHE_PROFILE = config('CACHE_PROFILE', default='local')
+CACHE_REDIS_URL = config('CACHE_REDIS_URL', default='redis://localhost:6379/2')
+# Hit and miss counters of the Redis caches are pushed to the server every CACHE_STATS_FLUSH_READS reads or
+# CACHE_STATS_FLUSH_INTERVAL seconds, whichever comes first.
+CACHE_STATS_FLUSH_READS = config('CACHE_STATS_FLUSH_READS', default=1000, cast=int)
+CACHE_STATS_FLUSH_INTERVAL = config('CACHE_STATS_FLUSH_INTERVAL', default=10, cast=int)
+
+# Alias: (timeout in seconds, key prefix). 'default' holds anything not listed here.
+CACHE_ALIASES = {
+    'default': (config('CACHE_DEFAULT_TIMEOUT', default=300, cast=int), 'shop'),
+    'catalog': (config('CACHE_CATALOG_TIMEOUT', default=60 * 10, cast=int), 'catalog'),
+    'sessions': (config('SESSION_COOKIE_AGE', cast=int), 'sessions'),
+    'ratelimit': (config('CACHE_RATELIMIT_TIMEOUT', default=60 * 60, cast=int), 'ratelimit'),
+    'fragments': (config('CACHE_FRAGMENTS_TIMEOUT', default=60 * 60, cast=int), 'fragments'),
+}
+
+if CACHE_PROFILE == 'production':
+    CACHES = {
+        alias: {
+            'BACKEND': 'core.cache.InstrumentedRedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+            'TIMEOUT': timeout,
+            'KEY_PREFIX': prefix,
+            'STATS_NAME': alias,
+            'STATS_FLUSH_READS': CACHE_STATS_FLUSH_READS,
+            'STATS_FLUSH_INTERVAL': CACHE_STATS_FLUSH_INTERVAL,
+        }
+        for alias, (timeout, prefix) in CACHE_ALIASES.items()
+    }
+else:
+    CACHES = {
+        alias: {
+            'BACKEND': 'core.cache.InstrumentedLocMemCache',
+            'LOCATION': alias,
+            'TIMEOUT': timeout,
+            'KEY_PREFIX': prefix,
+            'STATS_NAME': alias,
+            'OPTIONS': {'MAX_ENTRIES': config('CACHE_LOCAL_MAX_ENTRIES', default=10000, cast=int)},
+        }
+        for alias, (timeout, prefix) in CACHE_ALIASES.items()
+    }
 
 # Session settings
-SESSION_ENGINE = config('SESSION_ENGINE')
+SESSION_ENGINE = config(
+    'SESSION_ENGINE',
+    default='django.contrib.sessions.backends.cached_db' if CACHE_PROFILE == 'production'
+    else 'django.contrib.sessions.backends.db',
+)
+SESSION_CACHE_ALIAS = 'sessions'
 SESSION_COOKIE_AGE = config('SESSION_COOKIE_AGE', cast=int)
 SESSION_EXPIRE_AT_BROWSER_CLOSE = config('SESSION_EXPIRE_AT_BROWSER_CLOSE', cast=bool)
 SESSION_SAVE_EVERY_REQUEST = config('SESSION_SAVE_EVERY_REQUEST', cast=bool)
+# Sessions are only written when their data changes. SESSION_SAVE_EVERY_REQUEST pushes the expiry back at most
+# once per SESSION_REFRESH_INTERVAL seconds.
+SESSION_REFRESH_INTERVAL = config('SESSION_REFRESH_INTERVAL', default=5 * 60, cast=int)
 SESSION_COOKIE_NAME = config('SESSION_COOKIE_NAME')
+
+# Presence
+# Users seen within PRESENCE_ONLINE_WINDOW seconds are online. Last-seen times are kept in memory and written every
+# PRESENCE_FLUSH_INTERVAL seconds, or as soon as PRESENCE_BATCH_SIZE users are pending.
+PRESENCE_ONLINE_WINDOW = config('PRESENCE_ONLINE_WINDOW', default=5 * 60, cast=int)
+PRESENCE_FLUSH_INTERVAL = config('PRESENCE_FLUSH_INTERVAL', default=60, cast=int)
+PRESENCE_BATCH_SIZE = config('PRESENCE_BATCH_SIZE', default=1000, cast=int)
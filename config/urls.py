@@ -6,6 +6,7 @@ from django.urls import path, include
 urlpatterns = [
     path('', include('shop.urls')),
     path('', include('account.urls')),
+    path('', include('search.urls')),
 ]
 
 if settings.DEBUG:
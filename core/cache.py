@@ -0,0 +1,182 @@
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+
+
+_stats = {}
+_stats_flushed_at = {}
+_stats_lock = threading.Lock()
+_missing = object()
+
+
+def cache_stats():
+
+    """
+    Hit, miss and eviction counters of every instrumented cache alias, read from where each backend keeps them.
+    """
+
+    return {alias: caches[alias].stats() for alias in settings.CACHES if isinstance(caches[alias], StatsMixin)}
+
+
+def reset_cache_stats():
+
+    for alias in settings.CACHES:
+        if isinstance(caches[alias], StatsMixin):
+            caches[alias].reset_stats()
+
+    with _stats_lock:
+        _stats.clear()
+
+
+class StatsMixin:
+
+    """
+    Count hits and misses of reads, and evictions, under the cache's 'STATS_NAME' (its alias in the settings).
+
+    The counters are kept next to the entries they describe: in process memory for process-local caches, where
+    Django's one backend instance per thread share them at module level, and on the server for shared ones.
+    """
+
+    def __init__(self, location, params):
+
+        super().__init__(location, params)
+        self.stats_name = params.get('STATS_NAME') or params.get('KEY_PREFIX') or location
+
+    def count(self, **counts):
+
+        with _stats_lock:
+            _stats.setdefault(self.stats_name, Counter({'hits': 0, 'misses': 0, 'evictions': 0})).update(counts)
+
+    def stats(self):
+
+        with _stats_lock:
+            return dict(_stats.get(self.stats_name, {'hits': 0, 'misses': 0, 'evictions': 0}))
+
+    def reset_stats(self):
+
+        with _stats_lock:
+            _stats.pop(self.stats_name, None)
+
+    def get(self, key, default=None, version=None):
+
+        value = super().get(key, _missing, version)
+
+        if value is _missing:
+            self.count(misses=1)
+            return default
+
+        self.count(hits=1)
+        return value
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+
+        # The base implementation reads the key back after adding it, which would count a miss and a hit.
+        value = super().get(key, _missing, version)
+
+        if value is not _missing:
+            self.count(hits=1)
+            return value
+
+        self.count(misses=1)
+        if callable(default):
+            default = default()
+        self.add(key, default, timeout=timeout, version=version)
+
+        return super().get(key, default, version)
+
+
+class InstrumentedLocMemCache(StatsMixin, LocMemCache):
+
+    """
+    Process-local stand-in for the shared caches: entries culled when MAX_ENTRIES is reached count as evictions.
+    Like the entries, the counters only cover the process that reads them.
+    """
+
+    def _cull(self):
+
+        size = len(self._cache)
+        super()._cull()
+        self.count(evictions=size - len(self._cache))
+
+
+class InstrumentedRedisCache(StatsMixin, RedisCache):
+
+    """
+    Counters are kept in a hash under the cache's key prefix, so every process of every worker adds to the same ones
+    and the cache_stats command reads them from the server. Reads are counted in process memory first and pushed in
+    one pipeline once STATS_FLUSH_READS reads are pending or STATS_FLUSH_INTERVAL seconds have passed, so counting
+    does not add a round trip to every read.
+
+    Redis evicts keys on its own when it runs out of memory and only reports the total of the server, so evictions
+    are not counted per alias; server_evictions() returns that total, which covers every alias sharing the server.
+    """
+
+    def __init__(self, location, params):
+
+        super().__init__(location, params)
+        self.stats_flush_reads = params.get('STATS_FLUSH_READS', 1000)
+        self.stats_flush_interval = params.get('STATS_FLUSH_INTERVAL', 10)
+
+    def stats_key(self):
+        return self.make_key('cache-stats', version=0)
+
+    def count(self, **counts):
+
+        super().count(**counts)
+
+        with _stats_lock:
+            pending = sum(_stats[self.stats_name].values())
+            flushed_at = _stats_flushed_at.setdefault(self.stats_name, time.monotonic())
+
+        if pending >= self.stats_flush_reads or time.monotonic() - flushed_at >= self.stats_flush_interval:
+            self.flush_stats()
+
+    def flush_stats(self):
+
+        with _stats_lock:
+            counts = _stats.pop(self.stats_name, {})
+            _stats_flushed_at[self.stats_name] = time.monotonic()
+
+        counts = {name: value for name, value in counts.items() if value}
+        if not counts:
+            return
+
+        pipeline = self._cache.get_client(write=True).pipeline(transaction=False)
+        for name, value in counts.items():
+            pipeline.hincrby(self.stats_key(), name, value)
+        pipeline.execute()
+
+    def stats(self):
+
+        self.flush_stats()
+
+        counters = self._cache.get_client().hgetall(self.stats_key())
+        stats = {'hits': 0, 'misses': 0, 'evictions': None}
+        stats.update({name.decode(): int(value) for name, value in counters.items()})
+
+        return stats
+
+    def reset_stats(self):
+
+        super().reset_stats()
+        self._cache.get_client(write=True).delete(self.stats_key())
+
+    def get_many(self, keys, version=None):
+
+        # Unlike the base implementation, the Redis one fetches all keys at once instead of calling get().
+        keys = list(keys)
+        found = super().get_many(keys, version)
+        self.count(hits=len(found), misses=len(keys) - len(found))
+
+        return found
+
+    def server(self):
+        return tuple(self._servers)
+
+    def server_evictions(self):
+        return self._cache.get_client().info('stats').get('evicted_keys', 0)
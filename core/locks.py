@@ -0,0 +1,48 @@
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .models import TaskLock
+
+
+def acquire_lock(name, token, timeout, now=None):
+
+    """
+    Take the lock 'name' for 'timeout' seconds and return whether it was taken.
+
+    The lock is a row in the database every worker shares: the primary key lets only one worker create it, and a lock
+    whose holder did not release it in time is taken over with a conditional UPDATE that only one worker can match.
+    """
+
+    now = now or timezone.now()
+    expires_at = now + timedelta(seconds=timeout)
+
+    if TaskLock.objects.filter(name=name, expires_at__lte=now).update(token=token, expires_at=expires_at):
+        return True
+
+    try:
+        with transaction.atomic():
+            TaskLock.objects.create(name=name, token=token, expires_at=expires_at)
+    except IntegrityError:
+        return False
+
+    return True
+
+
+@contextmanager
+def task_lock(name, timeout):
+
+    """
+    Hold the lock 'name' for at most 'timeout' seconds. Yields whether the lock was acquired; the lock is only
+    released by its holder.
+    """
+
+    token = uuid.uuid4().hex
+    acquired = acquire_lock(name, token, timeout)
+
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            TaskLock.objects.filter(name=name, token=token).delete()
@@ -0,0 +1,81 @@
+from contextlib import contextmanager
+from core.middleware import SessionMiddleware
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware as DjangoSessionMiddleware
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from unittest.mock import patch
+from utils.benchmark import rollback_atomic
+
+
+@contextmanager
+def count_session_writes(counter):
+
+    def execute(execute_sql, sql, params, many, context):
+        if sql.startswith(('INSERT', 'UPDATE')) and 'django_session' in sql:
+            counter['writes'] += 1
+        return execute_sql(sql, params, many, context)
+
+    with connection.execute_wrapper(execute):
+        yield
+
+
+class Command(BaseCommand):
+
+    help = 'Count the session rows written per 1,000 page views by Django\'s and this project\'s session middleware'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('--views', type=int, default=1000, help='Page views simulated per middleware')
+        parser.add_argument('--sessions', type=int, default=20, help='Sessions the page views are spread over')
+        parser.add_argument('--change-every', type=int, default=25, help='Every Nth view changes the session data')
+        parser.add_argument('--gap', type=float, default=5, help='Seconds between two views of the same session')
+
+    def handle(self, *args, **kwargs):
+
+        self.stdout.write(
+            f'SESSION_SAVE_EVERY_REQUEST={settings.SESSION_SAVE_EVERY_REQUEST}, '
+            f'SESSION_REFRESH_INTERVAL={settings.SESSION_REFRESH_INTERVAL}s'
+        )
+        self.stdout.write(f'{"middleware":<12} {"views":>7} {"writes":>7} {"writes/1k views":>16}')
+
+        for name, middleware_class in (('django', DjangoSessionMiddleware), ('core', SessionMiddleware)):
+            writes = self.simulate(middleware_class, **kwargs)
+            self.stdout.write(f'{name:<12} {kwargs["views"]:>7} {writes:>7} {writes * 1000 / kwargs["views"]:>16.1f}')
+
+        self.stdout.write(self.style.SUCCESS('Successfully benchmarked session writes'))
+
+    @staticmethod
+    def simulate(middleware_class, views, sessions, change_every, gap, **kwargs):
+
+        counter = {'writes': 0}
+        factory = RequestFactory()
+
+        def view(request):
+            request.session.get('cart')
+            if request.view_number % change_every == 0:
+                request.session['visits'] = request.view_number
+            return HttpResponse()
+
+        with rollback_atomic(), override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db'):
+            middleware = middleware_class(view)
+            store = middleware.SessionStore
+            keys = []
+            for _ in range(sessions):
+                session = store()
+                session['cart'] = {}
+                session.create()
+                keys.append(session.session_key)
+
+            clock = patch('core.middleware.time.time')
+            with clock as now, count_session_writes(counter):
+                for number in range(1, views + 1):
+                    now.return_value = 1_000_000 + (number // sessions) * gap
+                    request = factory.get('/')
+                    request.COOKIES[settings.SESSION_COOKIE_NAME] = keys[number % sessions]
+                    request.view_number = number
+                    middleware(request)
+
+        return counter['writes']
@@ -0,0 +1,44 @@
+from core.cache import cache_stats
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+
+    help = 'Show the hit, miss and eviction counters of every cache alias'
+
+    def handle(self, *args, **kwargs):
+
+        stats = cache_stats()
+        servers = {}
+
+        self.stdout.write(f'{"alias":<12} {"backend":<24} {"hits":>8} {"misses":>8} {"hit rate":>9} {"evictions":>10}')
+
+        for alias in settings.CACHES:
+            counters = stats.get(alias, {})
+            hits, misses = counters.get('hits', 0), counters.get('misses', 0)
+            evictions = counters.get('evictions', 0)
+
+            backend = caches[alias]
+            if hasattr(backend, 'server_evictions'):
+                servers.setdefault(backend.server(), []).append(alias)
+
+            hit_rate = f'{hits / (hits + misses):.1%}' if hits + misses else '-'
+            evictions = '-' if evictions is None else evictions
+            self.stdout.write(
+                f'{alias:<12} {type(backend).__name__:<24} {hits:>8} {misses:>8} {hit_rate:>9} {evictions:>10}'
+            )
+
+        # Redis only reports the keys it evicted from the whole server, whichever alias they belonged to.
+        for aliases in servers.values():
+            self.stdout.write(
+                f'Evicted by the Redis server shared by {", ".join(aliases)}: '
+                f'{caches[aliases[0]].server_evictions()} keys'
+            )
+
+        if any(isinstance(caches[alias], LocMemCache) for alias in settings.CACHES):
+            self.stdout.write('Process-local caches only count the reads of this process.')
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully listed {len(settings.CACHES)} cache aliases'))
@@ -0,0 +1,44 @@
+from core.cache import reset_cache_stats
+from core.tests import FakeRedis
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from io import StringIO
+from unittest.mock import patch
+
+
+class CacheStatsCommandTest(TestCase):
+
+    def test_lists_every_alias(self):
+
+        reset_cache_stats()
+        caches['catalog'].set('key', 'value')
+        caches['catalog'].get('key')
+        caches['catalog'].get('missing')
+
+        out = StringIO()
+        call_command('cache_stats', stdout=out)
+
+        self.assertRegex(out.getvalue(), r'catalog\s+InstrumentedLocMemCache\s+1\s+1\s+50.0%\s+0')
+        self.assertRegex(out.getvalue(), r'sessions\s+InstrumentedLocMemCache\s+0\s+0\s+-\s+0')
+        self.assertIn('only count the reads of this process', out.getvalue())
+        self.assertIn('Successfully listed 5 cache aliases', out.getvalue())
+
+    def test_redis_evictions_are_reported_per_server(self):
+
+        caches_setting = {
+            alias: {'BACKEND': 'core.cache.InstrumentedRedisCache', 'LOCATION': 'redis://localhost:6379/2',
+                    'KEY_PREFIX': alias, 'STATS_NAME': alias}
+            for alias in ('default', 'catalog')
+        }
+        out = StringIO()
+
+        with override_settings(CACHES=caches_setting), \
+                patch('django.core.cache.backends.redis.RedisCacheClient.get_client', return_value=FakeRedis()):
+            reset_cache_stats()
+            caches['catalog'].get('missing')
+            call_command('cache_stats', stdout=out)
+
+        self.assertRegex(out.getvalue(), r'catalog\s+InstrumentedRedisCache\s+0\s+1\s+0.0%\s+-')
+        self.assertIn('Evicted by the Redis server shared by default, catalog: 7 keys', out.getvalue())
+        self.assertNotIn('process', out.getvalue())
@@ -17,11 +17,10 @@ class LogicalQuerySet(models.QuerySet):
 
 class LogicalManager(models.Manager):
 
-    def get_queryset_object(self):
-        if not hasattr(self.__class__, "__queryset"):
-            self.__class__.__queryset = LogicalQuerySet(self.model)
+    _queryset_class = LogicalQuerySet
 
-        return self.__queryset
+    def get_queryset_object(self):
+        return self._queryset_class(self.model, using=self._db)
 
     def get_queryset(self):
         return self.get_queryset_object().filter(is_deleted=False)
@@ -0,0 +1,127 @@
+import time
+from django.conf import settings
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.exceptions import SessionInterrupted
+from django.contrib.sessions.middleware import SessionMiddleware as BaseSessionMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+
+
+# Session key holding the time the session expiry was last pushed back.
+REFRESHED_KEY = '_refreshed_at'
+
+
+class DirtyTrackingSessionMixin:
+
+    """
+    Remember the serialized session data as it was loaded, so a save can be skipped when the data did not really
+    change: writing back a value that is already stored, or popping a missing key, leaves the session clean.
+    """
+
+    def _get_session(self, no_load=False):
+
+        loaded = hasattr(self, '_session_cache')
+        session = super()._get_session(no_load)
+
+        if not loaded:
+            self._loaded_state = self.serializer().dumps(session)
+
+        return session
+
+    # SessionBase binds its own _get_session to this property.
+    _session = property(_get_session)
+
+    def has_changes(self):
+
+        if not hasattr(self, '_loaded_state'):
+            return self.modified
+
+        return self.modified and self.serializer().dumps(self._session_cache) != self._loaded_state
+
+
+class SessionMiddleware(BaseSessionMiddleware):
+
+    """
+    Session middleware that only writes sessions whose data changed.
+
+    SESSION_SAVE_EVERY_REQUEST keeps its sliding expiry, but the expiry of a session read by a request is only
+    pushed back once every SESSION_REFRESH_INTERVAL seconds instead of on every request.
+    """
+
+    def __init__(self, get_response):
+
+        super().__init__(get_response)
+        # Session data is signed with a salt made of the store's qualified name, which must not change.
+        self.SessionStore = type(
+            self.SessionStore.__name__,
+            (DirtyTrackingSessionMixin, self.SessionStore),
+            {'__qualname__': self.SessionStore.__qualname__, '__module__': self.SessionStore.__module__},
+        )
+
+    @staticmethod
+    def needs_save(session):
+
+        if session.has_changes():
+            return True
+
+        if not settings.SESSION_SAVE_EVERY_REQUEST or not session.accessed:
+            return False
+
+        now = int(time.time())
+        if now - session.get(REFRESHED_KEY, 0) < settings.SESSION_REFRESH_INTERVAL:
+            return False
+
+        session[REFRESHED_KEY] = now
+        return True
+
+    def process_response(self, request, response):
+
+        try:
+            accessed = request.session.accessed
+            empty = request.session.is_empty()
+        except AttributeError:
+            return response
+
+        if settings.SESSION_COOKIE_NAME in request.COOKIES and empty:
+            response.delete_cookie(
+                settings.SESSION_COOKIE_NAME,
+                path=settings.SESSION_COOKIE_PATH,
+                domain=settings.SESSION_COOKIE_DOMAIN,
+                samesite=settings.SESSION_COOKIE_SAMESITE,
+            )
+            patch_vary_headers(response, ('Cookie',))
+            return response
+
+        if accessed:
+            patch_vary_headers(response, ('Cookie',))
+
+        if empty or response.status_code >= 500 or not self.needs_save(request.session):
+            return response
+
+        if request.session.get_expire_at_browser_close():
+            max_age, expires = None, None
+        else:
+            max_age = request.session.get_expiry_age()
+            expires = http_date(time.time() + max_age)
+
+        try:
+            request.session.save()
+        except UpdateError:
+            raise SessionInterrupted(
+                "The request's session was deleted before the request completed. "
+                "The user may have logged out in a concurrent request, for example."
+            )
+
+        response.set_cookie(
+            settings.SESSION_COOKIE_NAME,
+            request.session.session_key,
+            max_age=max_age,
+            expires=expires,
+            domain=settings.SESSION_COOKIE_DOMAIN,
+            path=settings.SESSION_COOKIE_PATH,
+            secure=settings.SESSION_COOKIE_SECURE or None,
+            httponly=settings.SESSION_COOKIE_HTTPONLY or None,
+            samesite=settings.SESSION_COOKIE_SAMESITE,
+        )
+
+        return response
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.6 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskLock',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('token', models.CharField(max_length=32)),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+    ]
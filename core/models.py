@@ -42,3 +42,21 @@ class LogicalMixin(models.Model):
 
     class Meta:
         abstract = True
+
+
+class TaskLock(models.Model):
+    """
+    A lock held by one worker at a time, for tasks that must not run concurrently:
+
+    fields:
+        - name: CharField (the lock, primary key)
+        - token: CharField (identifies the holder)
+        - expires_at: DateTimeField (after which another worker may take the lock over)
+    """
+
+    name = models.CharField(max_length=100, primary_key=True)
+    token = models.CharField(max_length=32)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return self.name
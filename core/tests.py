@@ -1,3 +1,216 @@
-from django.test import TestCase
+from core.cache import InstrumentedLocMemCache, InstrumentedRedisCache, reset_cache_stats
+from core.locks import acquire_lock, task_lock
+from core.middleware import REFRESHED_KEY, SessionMiddleware
+from core.models import TaskLock
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from unittest.mock import patch
+import time
 
-# Create your tests here.
+
+class InstrumentedCacheTest(TestCase):
+
+    def setUp(self):
+
+        reset_cache_stats()
+        self.cache = InstrumentedLocMemCache('instrumented-test', {
+            'STATS_NAME': 'test', 'KEY_PREFIX': 'test', 'OPTIONS': {'MAX_ENTRIES': 4, 'CULL_FREQUENCY': 2},
+        })
+        self.cache.clear()
+
+    def test_counts_hits_and_misses(self):
+
+        self.cache.set('present', None)
+        self.cache.set('other', 1)
+
+        self.assertIsNone(self.cache.get('present', 'default'))
+        self.assertEqual(self.cache.get('absent', 'default'), 'default')
+        self.assertEqual(self.cache.get_many(['present', 'other', 'absent']), {'present': None, 'other': 1})
+        self.assertEqual(self.cache.get_or_set('absent', 2), 2)
+
+        self.assertEqual(self.cache.stats(), {'hits': 3, 'misses': 3, 'evictions': 0})
+
+    def test_counts_evictions(self):
+
+        for index in range(5):
+            self.cache.set(f'key-{index}', index)
+
+        self.assertEqual(self.cache.stats()['evictions'], 2)
+
+
+class FakeRedis:
+
+    # Just enough of a Redis client for the instrumented cache: reads find nothing, counters are hashes.
+    def __init__(self):
+        self.hashes = {}
+        self.pipelines = 0
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def execute(self):
+        self.pipelines += 1
+
+    def get(self, key):
+        return None
+
+    def mget(self, keys):
+        return [None for _ in keys]
+
+    def hincrby(self, key, field, amount):
+        counters = self.hashes.setdefault(key, {})
+        counters[field.encode()] = counters.get(field.encode(), 0) + amount
+
+    def hgetall(self, key):
+        return {field: str(value).encode() for field, value in self.hashes.get(key, {}).items()}
+
+    def delete(self, key):
+        self.hashes.pop(key, None)
+
+    def info(self, section):
+        return {'evicted_keys': 7}
+
+
+class InstrumentedRedisCacheTest(TestCase):
+
+    def setUp(self):
+
+        reset_cache_stats()
+        self.server = FakeRedis()
+        client = patch('django.core.cache.backends.redis.RedisCacheClient.get_client', return_value=self.server)
+        client.start()
+        self.addCleanup(client.stop)
+
+    @staticmethod
+    def instance(alias='catalog', **params):
+        return InstrumentedRedisCache('redis://localhost:6379/2', {'STATS_NAME': alias, 'KEY_PREFIX': alias, **params})
+
+    def test_counters_are_shared_through_the_server(self):
+
+        # One instance counts and pushes every read, as a web worker would; another, as the cache_stats command,
+        # reads the counters from the server.
+        self.instance(STATS_FLUSH_READS=1).get('absent')
+        self.instance(STATS_FLUSH_READS=1).get_many(['a', 'b'])
+        self.assertEqual(self.server.hgetall(self.instance().stats_key()), {b'misses': b'3'})
+
+        other = self.instance('sessions')
+        other.get('absent')
+
+        self.assertEqual(self.instance().stats(), {'hits': 0, 'misses': 3, 'evictions': None})
+        self.assertEqual(other.stats(), {'hits': 0, 'misses': 1, 'evictions': None})
+
+        self.instance().reset_stats()
+        self.assertEqual(self.instance().stats()['misses'], 0)
+        self.assertEqual(other.stats()['misses'], 1)
+
+    def test_counters_are_pushed_in_batches(self):
+
+        cache = self.instance(STATS_FLUSH_READS=3, STATS_FLUSH_INTERVAL=60)
+
+        cache.get('absent')
+        cache.get('absent')
+        self.assertEqual(self.server.pipelines, 0)
+
+        cache.get('absent')
+        self.assertEqual(self.server.pipelines, 1)
+
+        cache.get('absent')
+        with patch('core.cache.time.monotonic', return_value=time.monotonic() + 60):
+            cache.get('absent')
+        self.assertEqual(self.server.pipelines, 2)
+        self.assertEqual(self.server.hgetall(cache.stats_key()), {b'misses': b'5'})
+
+
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db', SESSION_SAVE_EVERY_REQUEST=True,
+                   SESSION_REFRESH_INTERVAL=300)
+class SessionMiddlewareTest(TestCase):
+
+    def setUp(self):
+
+        self.store = SessionStore()
+        self.store.update({'cart': 1, REFRESHED_KEY: int(time.time())})
+        self.store.create()
+
+    def run_request(self, view):
+
+        request = RequestFactory().get('/')
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = self.store.session_key
+
+        def get_response(request):
+            view(request)
+            return HttpResponse()
+
+        middleware = SessionMiddleware(get_response)
+
+        with CaptureQueriesContext(connection) as context:
+            response = middleware(request)
+
+        writes = [query for query in context.captured_queries if query['sql'].startswith(('UPDATE', 'INSERT'))]
+        return response, len(writes)
+
+    def test_unchanged_sessions_are_not_written(self):
+
+        def view(request):
+            request.session.get('cart')
+            request.session['cart'] = 1
+            request.session.pop('missing', None)
+
+        response, writes = self.run_request(view)
+
+        self.assertEqual(writes, 0)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+    def test_changed_sessions_are_written(self):
+
+        def view(request):
+            request.session['cart'] = 2
+
+        response, writes = self.run_request(view)
+
+        self.assertEqual(writes, 1)
+        self.assertIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertEqual(SessionStore(self.store.session_key)['cart'], 2)
+
+    def test_expiry_is_refreshed_once_per_interval(self):
+
+        self.assertEqual(self.run_request(lambda request: request.session.get('cart'))[1], 0)
+
+        with patch('core.middleware.time.time', return_value=time.time() + 301):
+            response, writes = self.run_request(lambda request: request.session.get('cart'))
+
+        self.assertEqual(writes, 1)
+        self.assertIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+
+class TaskLockTest(TestCase):
+
+    def test_lock_is_held_by_one_worker_at_a_time(self):
+
+        with task_lock('sweep', 60) as first:
+            with task_lock('sweep', 60) as second:
+                self.assertTrue(first)
+                self.assertFalse(second)
+            self.assertTrue(TaskLock.objects.filter(name='sweep').exists())
+
+        self.assertFalse(TaskLock.objects.exists())
+
+    def test_expired_lock_is_taken_over(self):
+
+        now = timezone.now()
+        self.assertTrue(acquire_lock('sweep', 'dead', 60, now - timedelta(minutes=5)))
+        self.assertFalse(acquire_lock('sweep', 'other', 60, now - timedelta(minutes=4, seconds=30)))
+
+        with task_lock('sweep', 60) as acquired:
+            self.assertTrue(acquired)
+
+        # Only the holder releases the lock, so the worker whose lock expired leaves the new one alone.
+        self.assertTrue(acquire_lock('sweep', 'next', 60))
+        with task_lock('sweep', 60) as acquired:
+            self.assertFalse(acquired)
+        self.assertEqual(TaskLock.objects.get().token, 'next')
@@ -0,0 +1,232 @@
+import math
+from django.db import connection, transaction
+from django.db.models import Avg, Case, Count, FloatField, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+from .models import SearchDocument, SearchPosting
+from .tokenizer import NAME_WEIGHT, document_terms, tokenize
+
+
+class BaseSearchBackend:
+
+    """
+    A search backend keeps an index of the name and description of active products and ranks them with BM25.
+
+    'candidates' is a Product queryset holding the filters of a search; backends only return products in it.
+    """
+
+    # Maximum number of index terms a trailing prefix expands to.
+    max_prefix_terms = 10
+
+    def index(self, product):
+        raise NotImplementedError
+
+    def remove(self, product_id):
+        raise NotImplementedError
+
+    def rebuild(self, queryset, batch_size=1000):
+        raise NotImplementedError
+
+    def search(self, query, candidates, limit=20, offset=0, prefix=False):
+        raise NotImplementedError
+
+    @staticmethod
+    def is_indexable(product):
+        return product.is_active and not product.is_deleted
+
+    @staticmethod
+    def batches(queryset, batch_size):
+
+        """
+        Yield the (id, name, about) rows of the active products in 'queryset' in primary key batches.
+        """
+
+        rows = queryset.filter(is_active=True).order_by('id').values_list('id', 'name', 'about')
+        last_id = 0
+
+        while True:
+            batch = list(rows.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                return
+            yield batch
+            last_id = batch[-1][0]
+
+
+class InvertedIndexBackend(BaseSearchBackend):
+
+    """
+    Portable backend: postings are stored in the SearchPosting table and BM25 is computed in SQL.
+    """
+
+    k1 = 1.2
+    b = 0.75
+
+    def index(self, product):
+
+        if not self.is_indexable(product):
+            return self.remove(product.pk)
+
+        frequencies, length = document_terms(product.name, product.about)
+
+        with transaction.atomic():
+            SearchPosting.objects.filter(product_id=product.pk).delete()
+            SearchPosting.objects.bulk_create(
+                SearchPosting(term=term, product_id=product.pk, frequency=frequency)
+                for term, frequency in frequencies.items()
+            )
+            SearchDocument.objects.update_or_create(product_id=product.pk, defaults={'length': length})
+
+    def remove(self, product_id):
+
+        with transaction.atomic():
+            SearchPosting.objects.filter(product_id=product_id).delete()
+            SearchDocument.objects.filter(product_id=product_id).delete()
+
+    def rebuild(self, queryset, batch_size=1000):
+
+        indexed = 0
+
+        with transaction.atomic():
+            SearchPosting.objects.all().delete()
+            SearchDocument.objects.all().delete()
+
+            for batch in self.batches(queryset, batch_size):
+                postings, documents = [], []
+                for pk, name, about in batch:
+                    frequencies, length = document_terms(name, about)
+                    documents.append(SearchDocument(product_id=pk, length=length))
+                    postings.extend(
+                        SearchPosting(term=term, product_id=pk, frequency=frequency)
+                        for term, frequency in frequencies.items()
+                    )
+                SearchDocument.objects.bulk_create(documents, batch_size=batch_size)
+                SearchPosting.objects.bulk_create(postings, batch_size=batch_size)
+                indexed += len(documents)
+
+        return indexed
+
+    def expand_terms(self, query, prefix):
+
+        terms = tokenize(query)
+
+        if prefix and terms:
+            expansions = (
+                # A range instead of 'startswith' so the lookup is an index range scan on every database.
+                SearchPosting.objects.filter(term__gte=terms[-1], term__lt=terms[-1] + '\uffff')
+                .values('term').annotate(df=Count('id')).order_by('-df')
+                .values_list('term', flat=True)[:self.max_prefix_terms]
+            )
+            terms = terms[:-1] + list(expansions)
+
+        return list(dict.fromkeys(terms))
+
+    def search(self, query, candidates, limit=20, offset=0, prefix=False):
+
+        terms = self.expand_terms(query, prefix)
+
+        if not terms:
+            return []
+
+        stats = SearchDocument.objects.aggregate(total=Count('product'), average_length=Avg('length'))
+        total, average_length = stats['total'], stats['average_length'] or 1
+
+        document_frequencies = dict(
+            SearchPosting.objects.filter(term__in=terms).values('term').annotate(df=Count('id')).values_list('term', 'df')
+        )
+
+        if not document_frequencies:
+            return []
+
+        # BM25 is summed by the database, so only the requested page of scores is read back.
+        idf = Case(
+            *(When(term=term, then=Value(math.log(1 + (total - df + 0.5) / (df + 0.5))))
+              for term, df in document_frequencies.items()),
+            output_field=FloatField(),
+        )
+        frequency = Cast('frequency', FloatField())
+        length = Cast(Coalesce('product__search_document__length', 0), FloatField())
+        norm = Value(self.k1 * (1 - self.b)) + Value(self.k1 * self.b / average_length) * length
+
+        ranked = (
+            SearchPosting.objects.filter(term__in=document_frequencies, product__in=candidates.values('id'))
+            .values('product_id')
+            .annotate(score=Sum(idf * frequency * Value(self.k1 + 1) / (frequency + norm), output_field=FloatField()))
+            .order_by('-score', 'product_id')
+            .values_list('product_id', 'score')
+        )
+
+        return list(ranked[offset:offset + limit])
+
+
+class FTS5Backend(BaseSearchBackend):
+
+    """
+    SQLite backend: the index is an FTS5 virtual table keyed by product id and ranked with its bm25() function.
+    """
+
+    table = 'search_product_fts'
+
+    @classmethod
+    def is_available(cls):
+
+        return connection.vendor == 'sqlite' and cls.table in connection.introspection.table_names()
+
+    def index(self, product):
+
+        if not self.is_indexable(product):
+            return self.remove(product.pk)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [product.pk])
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, name, about) VALUES (%s, %s, %s)',
+                [product.pk, product.name, product.about],
+            )
+
+    def remove(self, product_id):
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [product_id])
+
+    def rebuild(self, queryset, batch_size=1000):
+
+        indexed = 0
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+
+            for batch in self.batches(queryset, batch_size):
+                cursor.executemany(f'INSERT INTO {self.table} (rowid, name, about) VALUES (%s, %s, %s)', batch)
+                indexed += len(batch)
+
+        return indexed
+
+    @staticmethod
+    def match_expression(query, prefix):
+
+        # Tokens are plain word characters, so quoting them is enough to keep FTS5 operators out of the query.
+        terms = [f'"{term}"' for term in dict.fromkeys(tokenize(query))]
+
+        if prefix and terms:
+            terms[-1] += '*'
+
+        return ' OR '.join(terms)
+
+    def search(self, query, candidates, limit=20, offset=0, prefix=False):
+
+        expression = self.match_expression(query, prefix)
+
+        if not expression:
+            return []
+
+        candidate_sql, candidate_params = candidates.values('id').query.sql_with_params()
+
+        # The unary '+' keeps SQLite from handing the candidate filter to FTS5, which would re-run the full text
+        # match once per candidate row instead of once per query.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, -bm25({self.table}, {float(NAME_WEIGHT)}, 1.0) AS score FROM {self.table} '
+                f'WHERE {self.table} MATCH %s AND +rowid IN ({candidate_sql}) '
+                f'ORDER BY score DESC, rowid LIMIT %s OFFSET %s',
+                [expression, *candidate_params, limit, offset],
+            )
+            return cursor.fetchall()
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.utils.module_loading import import_string
+from shop.models import Product
+from .backends import FTS5Backend, InvertedIndexBackend
+
+
+_backend = None
+
+
+def get_backend():
+
+    """
+    Return the configured search backend. Without a SEARCH_BACKEND setting the FTS5 backend is used when its
+    table exists (SQLite built with FTS5), and the inverted index backend otherwise.
+    """
+
+    global _backend
+
+    if _backend is None:
+        if settings.SEARCH_BACKEND:
+            _backend = import_string(settings.SEARCH_BACKEND)()
+        elif FTS5Backend.is_available():
+            _backend = FTS5Backend()
+        else:
+            _backend = InvertedIndexBackend()
+
+    return _backend
+
+
+def search_products(query, category_id=None, min_price=None, max_price=None, limit=20, offset=0, prefix=False,
+                    backend=None):
+
+    """
+    Search active products by name and description, ranked by BM25.
+    Results can be restricted to a category subtree and to a range of the effective (discounted) price.
+    Returns the matching products, in rank order, with their score in 'search_score'.
+    """
+
+    candidates = Product.objects.filter(is_active=True)
+
+    if category_id is not None:
+        candidates = candidates.in_category(category_id)
+
+    if min_price is not None:
+        candidates = candidates.filter(effective_price__gte=min_price)
+    if max_price is not None:
+        candidates = candidates.filter(effective_price__lte=max_price)
+
+    ranked = (backend or get_backend()).search(query, candidates, limit=limit, offset=offset, prefix=prefix)
+
+    products = Product.objects.for_catalog().in_bulk([product_id for product_id, _ in ranked])
+
+    results = []
+    for product_id, score in ranked:
+        if product_id in products:
+            product = products[product_id]
+            product.search_score = score
+            results.append(product)
+
+    return results
+
+
+def autocomplete(query, limit=10, backend=None):
+
+    """
+    Suggest products while the query is being typed; the last word of the query is matched as a prefix.
+    """
+
+    return search_products(query, limit=limit, prefix=True, backend=backend)
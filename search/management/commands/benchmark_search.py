@@ -0,0 +1,105 @@
+import random
+import statistics
+import time
+from account.models import CustomUser
+from django.core.management.base import BaseCommand
+from search.backends import FTS5Backend, InvertedIndexBackend
+from search.engine import search_products
+from shop.models import Category, Product
+from utils.benchmark import rollback_atomic
+
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ro', 'ta', 'vu', 'zi', 'pe', 'su', 'do', 'fa', 'gu', 'hi', 'ja', 'be']
+
+
+class Command(BaseCommand):
+
+    help = 'Benchmark product search latency on a synthetic catalog (all data is rolled back)'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('--products', type=int, default=100000, help='Number of synthetic products')
+        parser.add_argument('--vocabulary', type=int, default=5000, help='Number of distinct words')
+        parser.add_argument('--queries', type=int, default=50, help='Queries per scenario')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed of the synthetic catalog')
+
+    def handle(self, *args, **kwargs):
+
+        rng = random.Random(kwargs['seed'])
+        words = self.vocabulary(rng, kwargs['vocabulary'])
+        # Zipf-like word frequencies, so the catalog has both very common and rare terms.
+        weights = [1 / rank for rank in range(1, len(words) + 1)]
+
+        backends = [InvertedIndexBackend()]
+        if FTS5Backend.is_available():
+            backends.append(FTS5Backend())
+
+        with rollback_atomic():
+            categories = self.build_catalog(rng, words, weights, kwargs['products'])
+
+            for backend in backends:
+                start = time.perf_counter()
+                backend.rebuild(Product.objects.all(), batch_size=5000)
+                self.stdout.write(f'{type(backend).__name__}: indexed in {time.perf_counter() - start:.1f} s')
+
+                for scenario, make_params in self.scenarios(rng, words, weights, categories).items():
+                    timings = []
+                    for _ in range(kwargs['queries']):
+                        params = make_params()
+                        start = time.perf_counter()
+                        search_products(backend=backend, **params)
+                        timings.append((time.perf_counter() - start) * 1000)
+                    timings.sort()
+                    self.stdout.write(
+                        f'  {scenario:<18} p50 {statistics.median(timings):8.2f} ms   '
+                        f'p95 {timings[int(len(timings) * 0.95) - 1]:8.2f} ms'
+                    )
+
+    @staticmethod
+    def vocabulary(rng, size):
+
+        words = set()
+        while len(words) < size:
+            words.add(''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+        return sorted(words)
+
+    @staticmethod
+    def build_catalog(rng, words, weights, count):
+
+        user = CustomUser.objects.create(
+            username='benchmark_user', phone_number='benchmark', email='benchmark@example.com'
+        )
+        root = Category.objects.create(name='benchmark-root')
+        categories = [root] + [
+            Category.objects.create(name=f'benchmark-{index}', parent_category=root) for index in range(10)
+        ]
+
+        for start in range(0, count, 5000):
+            Product.objects.bulk_create(
+                Product(
+                    category=rng.choice(categories[1:]),
+                    user=user,
+                    name=' '.join(rng.choices(words, weights, k=3)),
+                    about=' '.join(rng.choices(words, weights, k=30)),
+                    price=rng.randint(1, 1000),
+                )
+                for _ in range(min(5000, count - start))
+            )
+
+        return categories
+
+    @staticmethod
+    def scenarios(rng, words, weights, categories):
+
+        return {
+            'common term': lambda: {'query': rng.choice(words[:20])},
+            'rare term': lambda: {'query': rng.choice(words[-1000:])},
+            'two terms': lambda: {'query': ' '.join(rng.choices(words, weights, k=2))},
+            'prefix': lambda: {'query': rng.choice(words)[:3], 'prefix': True, 'limit': 10},
+            'category + price': lambda: {
+                'query': ' '.join(rng.choices(words, weights, k=2)),
+                'category_id': rng.choice(categories[1:]).id,
+                'min_price': 100,
+                'max_price': 500,
+            },
+        }
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+from search.engine import get_backend
+from shop.models import Product
+
+
+class Command(BaseCommand):
+
+    help = 'Rebuild the product search index from scratch'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of products indexed per batch')
+        parser.add_argument('--backend', type=str, help='Dotted path of the backend to rebuild (default: active one)')
+
+    def handle(self, *args, **kwargs):
+
+        backend = import_string(kwargs['backend'])() if kwargs['backend'] else get_backend()
+
+        indexed = backend.rebuild(Product.objects.all(), batch_size=kwargs['batch_size'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully indexed {indexed} products with {type(backend).__name__}')
+        )
@@ -0,0 +1,31 @@
+from django.db import migrations, OperationalError
+
+
+def create_fts_table(apps, schema_editor): # noqa: unused-argument
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    try:
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_product_fts "
+            "USING fts5(name, about, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    except OperationalError:
+        # SQLite built without FTS5: the inverted index backend is used instead.
+        pass
+
+
+def drop_fts_table(apps, schema_editor): # noqa: unused-argument
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS search_product_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
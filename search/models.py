@@ -0,0 +1,33 @@
+from django.db import models
+from shop.models import Product
+
+
+class SearchDocument(models.Model):
+
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    length = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Search Document'
+        verbose_name_plural = 'Search Documents'
+
+    def __str__(self):
+        return f'{self.product_id} - {self.length} terms'
+
+
+class SearchPosting(models.Model):
+
+    term = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_postings')
+    frequency = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        verbose_name = 'Search Posting'
+        verbose_name_plural = 'Search Postings'
+
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'product'], name='search_posting_term_product_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.term} - {self.product_id}'
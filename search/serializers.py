@@ -0,0 +1,26 @@
+from rest_framework import serializers
+from shop.serializers import ProductSerializer
+
+
+class SearchQuerySerializer(serializers.Serializer):
+
+    q = serializers.CharField(max_length=255)
+    category = serializers.IntegerField(required=False)
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+    offset = serializers.IntegerField(min_value=0, default=0)
+
+
+class SearchResultSerializer(ProductSerializer):
+
+    score = serializers.FloatField(source='search_score', read_only=True)
+
+    class Meta(ProductSerializer.Meta):
+        fields = ProductSerializer.Meta.fields + ['score']
+
+
+class SuggestionSerializer(serializers.Serializer):
+
+    id = serializers.IntegerField()
+    name = serializers.CharField()
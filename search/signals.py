@@ -0,0 +1,23 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from shop.models import Product
+from .engine import get_backend
+
+
+INDEXED_FIELDS = {'name', 'about', 'is_active', 'is_deleted'}
+
+
+# noinspection PyUnusedLocal
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, update_fields=None, **kwargs):
+
+    if update_fields is not None and not INDEXED_FIELDS.intersection(update_fields):
+        return
+
+    get_backend().index(instance)
+
+
+# noinspection PyUnusedLocal
+@receiver(post_delete, sender=Product)
+def remove_product(sender, instance, **kwargs):
+    get_backend().remove(instance.pk)
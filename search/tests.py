@@ -0,0 +1,203 @@
+from account.models import CustomUser
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from io import StringIO
+from shop.models import Category, Discount, Product
+from .backends import FTS5Backend, InvertedIndexBackend
+from .engine import search_products
+from .models import SearchDocument, SearchPosting
+from .tokenizer import document_terms, tokenize
+
+
+class TokenizerTest(TestCase):
+
+    def test_tokenize(self):
+
+        self.assertEqual(tokenize('The Dell XPS-15, a laptop!'), ['dell', 'xps', '15', 'laptop'])
+
+    def test_document_terms_weights_name(self):
+
+        frequencies, length = document_terms('Laptop', 'A fast laptop')
+
+        self.assertEqual(frequencies['laptop'], 3)
+        self.assertEqual(length, 4)
+
+
+class SearchBackendTestMixin:
+
+    backend_class = None
+
+    def setUp(self):
+
+        self.backend = self.backend_class()
+        self.user = CustomUser.objects.create(
+            username='seller', email='seller@example.com', phone_number='+989393214333'
+        )
+        self.electronics = Category.objects.create(name='Electronics')
+        self.laptops = Category.objects.create(name='Laptops', parent_category=self.electronics)
+        self.books = Category.objects.create(name='Books')
+
+        self.dell = self.create_product(self.laptops, 'Dell XPS 15', 'A powerful laptop for developers', 1500)
+        self.hp = self.create_product(self.laptops, 'HP Spectre', 'Convertible laptop with a touch screen', 1200)
+        self.dune = self.create_product(self.books, 'Dune', 'A science fiction novel about a desert planet', 20)
+        self.lamp = self.create_product(self.electronics, 'Desk lamp', 'Laptop friendly desk lamp', 40)
+
+        self.backend.rebuild(Product.objects.all())
+
+    def create_product(self, category, name, about, price):
+
+        return Product.objects.create(category=category, user=self.user, name=name, about=about, price=price)
+
+    def search(self, query, **kwargs):
+
+        return [product.name for product in search_products(query, backend=self.backend, **kwargs)]
+
+    def test_ranks_name_matches_first(self):
+
+        sleeve = self.create_product(self.laptops, 'Laptop sleeve', 'Protective case', 30)
+        self.backend.index(sleeve)
+
+        self.assertEqual(self.search('laptop')[0], 'Laptop sleeve')
+        self.assertEqual(set(self.search('laptop')), {'Laptop sleeve', 'Dell XPS 15', 'HP Spectre', 'Desk lamp'})
+
+    def test_no_match(self):
+
+        self.assertEqual(self.search('keyboard'), [])
+
+    def test_stop_words_only(self):
+
+        self.assertEqual(self.search('the a'), [])
+
+    def test_prefix(self):
+
+        self.assertEqual(self.search('des', prefix=True)[0], 'Desk lamp')
+        self.assertIn('Dune', self.search('des', prefix=True))
+
+    def test_category_filter(self):
+
+        self.assertEqual(set(self.search('laptop', category_id=self.laptops.id)), {'Dell XPS 15', 'HP Spectre'})
+
+    def test_price_filter_uses_effective_price(self):
+
+        Discount.objects.create(product=self.dell, discount_percentage=50)
+
+        self.assertEqual(set(self.search('laptop', min_price=700, max_price=1300)), {'Dell XPS 15', 'HP Spectre'})
+
+    def test_incremental_update(self):
+
+        Product.objects.filter(pk=self.hp.pk).update(name='HP Envy')
+        self.hp.refresh_from_db()
+        self.backend.index(self.hp)
+
+        self.assertEqual(self.search('envy'), ['HP Envy'])
+        self.assertEqual(self.search('spectre'), [])
+
+    def test_remove(self):
+
+        self.backend.remove(self.dune.id)
+
+        self.assertEqual(self.search('dune'), [])
+
+    def test_inactive_products_are_not_indexed(self):
+
+        self.dune.is_active = False
+        self.backend.index(self.dune)
+
+        self.assertEqual(self.search('dune'), [])
+
+
+class InvertedIndexBackendTest(SearchBackendTestMixin, TestCase):
+
+    backend_class = InvertedIndexBackend
+
+    def test_postings_are_stored(self):
+
+        self.assertTrue(SearchPosting.objects.filter(term='laptop', product=self.dell).exists())
+        self.assertEqual(SearchDocument.objects.count(), 4)
+
+
+class FTS5BackendTest(SearchBackendTestMixin, TestCase):
+
+    backend_class = FTS5Backend
+
+
+class SearchSignalsTest(TestCase):
+
+    def setUp(self):
+
+        user = CustomUser.objects.create(username='seller', email='seller@example.com', phone_number='+989393214333')
+        category = Category.objects.create(name='Books')
+        self.product = Product.objects.create(
+            category=category, user=user, name='Dune', about='A science fiction novel', price=20
+        )
+
+    def test_indexed_on_create(self):
+
+        self.assertEqual(search_products('dune'), [self.product])
+
+    def test_reindexed_on_save(self):
+
+        self.product.name = 'Dune Messiah'
+        self.product.save()
+
+        self.assertEqual(search_products('messiah'), [self.product])
+
+    def test_removed_on_delete(self):
+
+        self.product.delete()
+
+        self.assertEqual(search_products('dune'), [])
+
+
+class SearchViewsTest(TestCase):
+
+    def setUp(self):
+
+        user = CustomUser.objects.create(username='seller', email='seller@example.com', phone_number='+989393214333')
+        category = Category.objects.create(name='Books')
+        self.product = Product.objects.create(
+            category=category, user=user, name='Dune', about='A science fiction novel', price=20
+        )
+
+    def test_search_api(self):
+
+        response = self.client.get(reverse('search:search-api'), {'q': 'fiction'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['name'], 'Dune')
+
+    def test_search_api_requires_query(self):
+
+        response = self.client.get(reverse('search:search-api'))
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_autocomplete_api(self):
+
+        response = self.client.get(reverse('search:autocomplete'), {'q': 'du'})
+
+        self.assertEqual(response.json()['suggestions'], [{'id': self.product.id, 'name': 'Dune'}])
+
+    def test_search_page(self):
+
+        response = self.client.get(reverse('search:search'), {'q': 'dune'})
+
+        self.assertEqual(list(response.context['products']), [self.product])
+
+
+class RebuildSearchIndexCommandTest(TestCase):
+
+    def test_rebuild(self):
+
+        user = CustomUser.objects.create(username='seller', email='seller@example.com', phone_number='+989393214333')
+        category = Category.objects.create(name='Books')
+        Product.objects.bulk_create(
+            Product(category=category, user=user, name=f'Book {index}', about='Novel', price=10) for index in range(3)
+        )
+
+        out = StringIO()
+        call_command('rebuild_search_index', '--backend', 'search.backends.InvertedIndexBackend', stdout=out)
+
+        self.assertIn('Successfully indexed 3 products with InvertedIndexBackend', out.getvalue())
+        self.assertEqual(SearchDocument.objects.count(), 3)
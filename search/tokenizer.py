@@ -0,0 +1,42 @@
+import re
+from collections import Counter
+
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+STOP_WORDS = frozenset({
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it', 'of', 'on', 'or', 'that',
+    'the', 'this', 'to', 'with',
+})
+
+MAX_TERM_LENGTH = 64
+
+# Matches in the product name count this many times more than matches in its description.
+NAME_WEIGHT = 2
+
+
+def tokenize(text):
+
+    """
+    Split text into lower-cased word tokens, dropping stop words.
+    """
+
+    return [
+        token[:MAX_TERM_LENGTH]
+        for token in TOKEN_PATTERN.findall((text or '').lower())
+        if token not in STOP_WORDS
+    ]
+
+
+def document_terms(name, about):
+
+    """
+    Return the term frequencies of a product document and its length, with the name weighted by NAME_WEIGHT.
+    """
+
+    frequencies = Counter(tokenize(about))
+
+    for term in tokenize(name):
+        frequencies[term] += NAME_WEIGHT
+
+    return frequencies, sum(frequencies.values())
@@ -0,0 +1,22 @@
+from django.urls import path
+from .views import (
+    ProductSearchView,
+    ProductSearchAPIView,
+    AutocompleteAPIView,
+)
+
+
+app_name = 'search'
+
+
+urlpatterns = [
+
+    # CBV
+
+    path('search/', ProductSearchView.as_view(), name='search'),
+
+    # API view
+
+    path('api/search/', ProductSearchAPIView.as_view(), name='search-api'),
+    path('api/search/autocomplete/', AutocompleteAPIView.as_view(), name='autocomplete'),
+]
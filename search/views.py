@@ -0,0 +1,62 @@
+from django.shortcuts import render
+from django.views.generic import View
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .engine import autocomplete, search_products
+from .serializers import SearchQuerySerializer, SearchResultSerializer, SuggestionSerializer
+
+
+class ProductSearchView(View):
+
+    @staticmethod
+    def get(request):
+        serializer = SearchQuerySerializer(data=request.GET)
+        products = []
+
+        if serializer.is_valid():
+            params = serializer.validated_data
+            products = search_products(
+                params['q'],
+                category_id=params.get('category'),
+                min_price=params.get('min_price'),
+                max_price=params.get('max_price'),
+                limit=params['limit'],
+                offset=params['offset'],
+            )
+
+        return render(request, 'product_list.html', {'products': products, 'query': request.GET.get('q', '')})
+
+
+class ProductSearchAPIView(APIView):
+
+    @staticmethod
+    def get(request):
+        serializer = SearchQuerySerializer(data=request.query_params)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        params = serializer.validated_data
+        products = search_products(
+            params['q'],
+            category_id=params.get('category'),
+            min_price=params.get('min_price'),
+            max_price=params.get('max_price'),
+            limit=params['limit'],
+            offset=params['offset'],
+        )
+
+        return Response({
+            'results': SearchResultSerializer(products, many=True, context={'request': request}).data,
+        })
+
+
+class AutocompleteAPIView(APIView):
+
+    @staticmethod
+    def get(request):
+        query = request.query_params.get('q', '')
+        suggestions = autocomplete(query) if query.strip() else []
+
+        return Response({'suggestions': SuggestionSerializer(suggestions, many=True).data})
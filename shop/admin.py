@@ -8,7 +8,9 @@ from .models import (
     Order,
     OrderItem,
     Discount,
-    Coupon
+    DiscountRule,
+    Coupon,
+    CartItem,
 )
 
 
@@ -20,4 +22,6 @@ admin.site.register(Wishlist)
 admin.site.register(Order)
 admin.site.register(OrderItem)
 admin.site.register(Discount)
+admin.site.register(DiscountRule)
 admin.site.register(Coupon)
+admin.site.register(CartItem)
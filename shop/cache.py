@@ -0,0 +1,227 @@
+import hashlib
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.http import HttpResponse
+from functools import wraps
+from time import time_ns
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.connection import ConnectionProxy
+from django.utils.http import http_date, quote_etag
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+from .models import Category, Coupon
+
+
+# Catalog pages and the catalog version, and data computed from the catalog and orders, have their own aliases.
+catalog_cache = ConnectionProxy(caches, 'catalog')
+fragments_cache = ConnectionProxy(caches, 'fragments')
+
+CATEGORY_TREE_CACHE_KEY = 'shop:category-tree'
+CATEGORY_TREE_TIMEOUT = 60 * 60
+ORDER_HISTORY_TIMEOUT = 60 * 60 * 24
+COUPON_TIMEOUT = 60
+CATALOG_VERSION_KEY = 'shop:catalog-version'
+
+# Cached for codes that do not match an active coupon, so misses are cached too.
+INVALID_COUPON = ''
+
+
+def build_category_tree():
+
+    """
+    Fetch the whole category tree in one query and render the subcategory fragment of every root category.
+    Returns a dict with the children of each category and the pre-rendered fragments of the roots.
+    """
+
+    children = {}
+    for pk, name, parent_id in Category.objects.order_by('id').values_list('id', 'name', 'parent_category_id'):
+        children.setdefault(parent_id, []).append((pk, name))
+
+    fragments = {pk: render_subcategories(children, pk) for pk, _ in children.get(None, [])}
+
+    return {'children': children, 'fragments': fragments}
+
+
+def render_subcategories(children, category_id):
+
+    subcategories = children.get(category_id)
+
+    if not subcategories:
+        return ''
+
+    html = ''.join(
+        format_html(
+            '<p><a href="{}" class="text-blue-500 hover:text-blue-700">{}</a></p>{}',
+            reverse('shop:category_products', args=[pk]),
+            name,
+            mark_safe(render_subcategories(children, pk)),
+        )
+        for pk, name in subcategories
+    )
+
+    return f'<div class="ml-4">{html}</div>'
+
+
+def get_category_tree():
+
+    tree = fragments_cache.get(CATEGORY_TREE_CACHE_KEY)
+
+    if tree is None:
+        tree = build_category_tree()
+        fragments_cache.set(CATEGORY_TREE_CACHE_KEY, tree, CATEGORY_TREE_TIMEOUT)
+
+    return tree
+
+
+def get_subcategories_html(category_id):
+
+    """
+    Return the rendered subcategory tree of a category, served from the cache without database queries on hits.
+    """
+
+    tree = get_category_tree()
+
+    if category_id in tree['fragments']:
+        return tree['fragments'][category_id]
+
+    return render_subcategories(tree['children'], category_id)
+
+
+def invalidate_category_tree():
+
+    fragments_cache.delete(CATEGORY_TREE_CACHE_KEY)
+
+
+def order_history_version(user_id):
+
+    # A fresh timestamp when the key was evicted, so pages cached under an older version can never come back.
+    return fragments_cache.get_or_set(f'shop:order-history-version:{user_id}', time_ns, None)
+
+
+def get_closed_orders_page(user_id, cursor, build_page):
+
+    """
+    Return a page of the closed orders of a user, built with build_page(cursor) on cache misses.
+    Closed orders never change, so pages stay valid until the user closes another order.
+    """
+
+    key = f'shop:order-history:{user_id}:{order_history_version(user_id)}:{cursor or ""}'
+    page = fragments_cache.get(key)
+
+    if page is None:
+        page = build_page(cursor)
+        fragments_cache.set(key, page, ORDER_HISTORY_TIMEOUT)
+
+    return page
+
+
+def invalidate_order_history(user_id):
+
+    fragments_cache.set(f'shop:order-history-version:{user_id}', time_ns(), None)
+
+
+def coupon_cache_key(coupon_code):
+
+    # Hand-entered codes may hold characters, like spaces, that are not portable in cache keys.
+    return f'shop:coupon:{coupon_code.encode().hex()}'
+
+
+def get_coupon_discount(coupon_code):
+
+    """
+    Return the discount of the active coupon with this code, or None. Both hits and misses are cached for
+    COUPON_TIMEOUT seconds, and codes too long to be stored are rejected without any lookup. Codes can be entered by
+    hand in the admin, so any other code is looked up like confirm_order does.
+    """
+
+    if not isinstance(coupon_code, str) or len(coupon_code) > Coupon._meta.get_field('coupon_code').max_length:
+        return None
+
+    key = coupon_cache_key(coupon_code)
+    discount = fragments_cache.get(key)
+
+    if discount is None:
+        discount = Coupon.objects.filter(coupon_code=coupon_code, is_active=True).values_list(
+            'amount_of_discount', flat=True
+        ).first() or INVALID_COUPON
+        fragments_cache.set(key, discount, COUPON_TIMEOUT)
+
+    return discount if discount != INVALID_COUPON else None
+
+
+def invalidate_coupons(*coupon_codes):
+
+    fragments_cache.delete_many([coupon_cache_key(coupon_code) for coupon_code in coupon_codes])
+
+
+def catalog_version():
+
+    # Like the order history version, a timestamp, so it can double as the Last-Modified date of catalog pages.
+    return catalog_cache.get_or_set(CATALOG_VERSION_KEY, time_ns, None)
+
+
+def bump_catalog_version():
+
+    catalog_cache.set(CATALOG_VERSION_KEY, time_ns(), None)
+
+
+def is_page_cacheable(request):
+
+    """
+    Only GET requests of anonymous visitors without pending messages get the shared copy of a page. Everything
+    else specific to a visitor, like the cart count, is filled in by the page scripts.
+    """
+
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        and not len(get_messages(request))
+    )
+
+
+def cache_anonymous_page(view):
+
+    """
+    Serve the catalog pages of anonymous visitors from the cache, under a key holding the catalog version, so every
+    catalog change invalidates all of them at once. The version also gives the ETag and Last-Modified headers of
+    the page, so revalidations from visitors with a copy get a 304 without rendering anything.
+    """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+
+        if not is_page_cacheable(request):
+            return view(request, *args, **kwargs)
+
+        version = catalog_version()
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        etag = quote_etag(f'{version}-{path}')
+        last_modified = version // 10 ** 9
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+        if response is None:
+            key = f'shop:page:{version}:{path}'
+            page = catalog_cache.get(key)
+
+            if page is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                if hasattr(response, 'render'):
+                    response.render()
+                page = (response.content, dict(response.items()))
+                catalog_cache.set(key, page)
+
+            content, headers = page
+            response = HttpResponse(content, headers=headers)
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ['Cookie'])
+
+        return response
+
+    return wrapper
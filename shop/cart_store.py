@@ -0,0 +1,382 @@
+import threading
+from decimal import Decimal
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+class BaseCartStore:
+
+    """
+    Server-side cart storage keyed by user id.
+
+    Carts are exposed as {product_id: {'quantity': int, 'price': str}} dicts, the format the session cart used.
+    Every write touches a single cart line atomically, without reading and rewriting the whole cart.
+    """
+
+    def items(self, user_id):
+        raise NotImplementedError
+
+    def increment(self, user_id, product_id, amount=1, price=None):
+
+        """
+        Add 'amount' (negative to decrement) to a line, creating it at 'price' if needed and removing it once
+        its quantity drops to zero. Returns the new quantity of the line.
+        """
+
+        raise NotImplementedError
+
+    def set_quantity(self, user_id, product_id, quantity, price=None):
+        raise NotImplementedError
+
+    def set_prices(self, user_id, prices):
+
+        """
+        Overwrite the stored price of existing lines from a {product_id: price} dict in one write.
+        """
+
+        raise NotImplementedError
+
+    def remove(self, user_id, *product_ids):
+        raise NotImplementedError
+
+    def clear(self, user_id):
+        raise NotImplementedError
+
+    def count(self, user_id):
+        return sum(item['quantity'] for item in self.items(user_id).values())
+
+    def merge(self, user_id, items):
+
+        for product_id, item in items.items():
+            self.increment(user_id, product_id, int(item['quantity']), item.get('price'))
+
+
+class InMemoryCartStore(BaseCartStore):
+
+    """
+    Process-local store, for tests and single process development servers.
+    """
+
+    def __init__(self):
+
+        self.carts = {}
+        self.lock = threading.Lock()
+
+    def items(self, user_id):
+
+        with self.lock:
+            return {product_id: dict(item) for product_id, item in self.carts.get(user_id, {}).items()}
+
+    def increment(self, user_id, product_id, amount=1, price=None):
+
+        with self.lock:
+            cart = self.carts.setdefault(user_id, {})
+            item = cart.setdefault(str(product_id), {'quantity': 0, 'price': str(price)})
+            item['quantity'] += amount
+            if item['quantity'] < 1:
+                del cart[str(product_id)]
+                return 0
+            return item['quantity']
+
+    def set_quantity(self, user_id, product_id, quantity, price=None):
+
+        if quantity < 1:
+            return self.remove(user_id, product_id)
+
+        with self.lock:
+            cart = self.carts.setdefault(user_id, {})
+            cart.setdefault(str(product_id), {'price': str(price)})['quantity'] = quantity
+
+    def set_prices(self, user_id, prices):
+
+        with self.lock:
+            cart = self.carts.get(user_id, {})
+            for product_id, price in prices.items():
+                if str(product_id) in cart:
+                    cart[str(product_id)]['price'] = str(price)
+
+    def remove(self, user_id, *product_ids):
+
+        with self.lock:
+            cart = self.carts.get(user_id, {})
+            for product_id in product_ids:
+                cart.pop(str(product_id), None)
+
+    def clear(self, user_id):
+
+        with self.lock:
+            self.carts.pop(user_id, None)
+
+
+class DatabaseCartStore(BaseCartStore):
+
+    """
+    One CartItem row per cart line, changed with single conditional UPDATE/INSERT/DELETE statements.
+    """
+
+    @staticmethod
+    def lines(user_id, product_id=None):
+
+        from .models import CartItem
+
+        queryset = CartItem.objects.filter(user_id=user_id)
+        return queryset if product_id is None else queryset.filter(product_id=product_id)
+
+    def items(self, user_id):
+
+        return {
+            str(product_id): {'quantity': quantity, 'price': str(price)}
+            for product_id, quantity, price in self.lines(user_id).values_list('product_id', 'quantity', 'price')
+        }
+
+    def increment(self, user_id, product_id, amount=1, price=None):
+
+        from .models import CartItem, Product
+
+        line = self.lines(user_id, product_id)
+
+        with transaction.atomic():
+            # A decrement that would empty the line deletes it instead of storing a quantity below one.
+            if amount < 0 and line.filter(quantity__lte=-amount).delete()[0]:
+                return 0
+
+            if not line.update(quantity=F('quantity') + amount):
+                if amount < 1:
+                    return 0
+                # Foreign keys may only be checked at commit, so a missing product is caught here.
+                if not Product.objects.archived.filter(pk=product_id).exists():
+                    raise Product.DoesNotExist(f'Product {product_id} does not exist')
+                try:
+                    with transaction.atomic():
+                        CartItem.objects.create(
+                            user_id=user_id, product_id=product_id, quantity=amount, price=Decimal(str(price))
+                        )
+                    return amount
+                except IntegrityError:
+                    # Another request created the line first; without a line the error was something else.
+                    if not line.update(quantity=F('quantity') + amount):
+                        raise
+
+            return line.values_list('quantity', flat=True).first() or 0
+
+    def set_quantity(self, user_id, product_id, quantity, price=None):
+
+        from .models import CartItem
+
+        if quantity < 1:
+            return self.remove(user_id, product_id)
+
+        if not self.lines(user_id, product_id).update(quantity=quantity):
+            CartItem.objects.update_or_create(
+                user_id=user_id, product_id=product_id,
+                defaults={'quantity': quantity}, create_defaults={'quantity': quantity, 'price': Decimal(str(price))},
+            )
+
+    def set_prices(self, user_id, prices):
+
+        if not prices:
+            return
+
+        self.lines(user_id).filter(product_id__in=prices).update(
+            price=Case(
+                *(When(product_id=product_id, then=Value(Decimal(str(price)))) for product_id, price in prices.items()),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2),
+            )
+        )
+
+    def remove(self, user_id, *product_ids):
+
+        self.lines(user_id).filter(product_id__in=product_ids).delete()
+
+    def clear(self, user_id):
+
+        self.lines(user_id).delete()
+
+    def count(self, user_id):
+
+        return self.lines(user_id).aggregate(count=Sum('quantity'))['count'] or 0
+
+
+class RedisCartStore(BaseCartStore):
+
+    """
+    Two Redis hashes per user: 'cart:<user>' holds line quantities (changed with HINCRBY) and
+    'cart:<user>:prices' the line prices. Any client with the redis-py hash API can be passed in.
+    """
+
+    def __init__(self, client=None, url=None, timeout=None):
+
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url or settings.CART_REDIS_URL, decode_responses=True)
+
+        self.client = client
+        self.timeout = timeout if timeout is not None else settings.CART_TIMEOUT
+
+    @staticmethod
+    def keys(user_id):
+        return f'cart:{user_id}', f'cart:{user_id}:prices'
+
+    def touch(self, pipeline, user_id):
+
+        for key in self.keys(user_id):
+            pipeline.expire(key, self.timeout)
+
+    def items(self, user_id):
+
+        quantities_key, prices_key = self.keys(user_id)
+        pipeline = self.client.pipeline()
+        pipeline.hgetall(quantities_key)
+        pipeline.hgetall(prices_key)
+        quantities, prices = pipeline.execute()
+
+        return {
+            str(product_id): {'quantity': int(quantity), 'price': prices.get(product_id)}
+            for product_id, quantity in quantities.items()
+            if int(quantity) > 0
+        }
+
+    def increment(self, user_id, product_id, amount=1, price=None):
+
+        quantities_key, prices_key = self.keys(user_id)
+
+        pipeline = self.client.pipeline()
+        pipeline.hincrby(quantities_key, product_id, amount)
+        if price is not None:
+            pipeline.hsetnx(prices_key, product_id, str(price))
+        self.touch(pipeline, user_id)
+        quantity = pipeline.execute()[0]
+
+        if quantity < 1:
+            self.remove(user_id, product_id)
+            return 0
+
+        return quantity
+
+    def set_quantity(self, user_id, product_id, quantity, price=None):
+
+        if quantity < 1:
+            return self.remove(user_id, product_id)
+
+        quantities_key, prices_key = self.keys(user_id)
+
+        pipeline = self.client.pipeline()
+        pipeline.hset(quantities_key, product_id, quantity)
+        if price is not None:
+            pipeline.hsetnx(prices_key, product_id, str(price))
+        self.touch(pipeline, user_id)
+        pipeline.execute()
+
+    def set_prices(self, user_id, prices):
+
+        if prices:
+            self.client.hset(
+                self.keys(user_id)[1], mapping={str(product_id): str(price) for product_id, price in prices.items()}
+            )
+
+    def remove(self, user_id, *product_ids):
+
+        if not product_ids:
+            return
+
+        pipeline = self.client.pipeline()
+        for key in self.keys(user_id):
+            pipeline.hdel(key, *product_ids)
+        pipeline.execute()
+
+    def clear(self, user_id):
+
+        self.client.delete(*self.keys(user_id))
+
+
+_store = None
+
+
+def get_cart_store():
+
+    global _store
+
+    if _store is None:
+        _store = import_string(settings.CART_STORE)()
+
+    return _store
+
+
+# noinspection PyUnusedLocal
+@receiver(setting_changed)
+def reset_cart_store(setting, **kwargs):
+
+    global _store
+
+    if setting in ('CART_STORE', 'CART_REDIS_URL', 'CART_TIMEOUT'):
+        _store = None
+
+
+class UserCart:
+
+    """
+    The cart of one user, bound to the configured store.
+    """
+
+    def __init__(self, user_id, store=None):
+
+        self.user_id = user_id
+        self.store = store or get_cart_store()
+
+    def items(self):
+        return self.store.items(self.user_id)
+
+    def increment(self, product_id, amount=1, price=None):
+        return self.store.increment(self.user_id, product_id, amount, price)
+
+    def set_quantity(self, product_id, quantity, price=None):
+        return self.store.set_quantity(self.user_id, product_id, quantity, price)
+
+    def set_prices(self, prices):
+        return self.store.set_prices(self.user_id, prices)
+
+    def remove(self, *product_ids):
+        return self.store.remove(self.user_id, *product_ids)
+
+    def clear(self):
+        return self.store.clear(self.user_id)
+
+    def count(self):
+        return self.store.count(self.user_id)
+
+    def merge(self, items):
+
+        """
+        Add the lines of another cart ({product_id: {'quantity': int, ...}}) holding their stock, as the cart views
+        do: lines are clamped to the stock that can still be held, at the current price, and dropped when none can.
+        """
+
+        from .reservations import hold_available
+
+        quantities = {}
+        for product_id, item in items.items():
+            try:
+                quantities[int(product_id)] = int(item['quantity'])
+            except (KeyError, TypeError, ValueError):
+                continue
+
+        for product, quantity in hold_available(self.user_id, quantities):
+            self.increment(product.id, quantity, product.effective_price)
+
+
+def cart_for(request):
+
+    """
+    Return the cart of the authenticated user, moving a cart left in the session by older versions into the store.
+    """
+
+    cart = UserCart(request.user.pk)
+
+    if 'cart' in request.session:
+        cart.merge(request.session.pop('cart'))
+
+    return cart
@@ -0,0 +1,169 @@
+import random
+import time
+from django.conf import settings
+from django.db import connection, models, transaction, OperationalError
+from django.db.models import Case, F, Q, Sum, When
+from functools import reduce
+from operator import or_
+from .cache import invalidate_coupons
+from .models import Cart, Coupon, Order, OrderItem, Product, StockReservation
+from .snapshots import take_snapshot
+
+
+class CheckoutError(ValueError):
+    pass
+
+
+class CouponUnavailable(CheckoutError):
+    pass
+
+
+def place_order(order, cart):
+
+    """
+    Move the lines of a cart ({product_id: {'quantity': int, ...}}) into 'order' with a fixed number of queries.
+
+    The product rows are locked in one SELECT ... FOR UPDATE ordered by id, so concurrent checkouts sharing
+    products always lock them in the same order and cannot deadlock. Stock is then taken with a single
+    conditional UPDATE that only matches rows still holding enough quantity; if any line does not match,
+    the whole checkout is rolled back and CheckoutError is raised.
+
+    Stock held by other users is not available; the holds of the ordering user on the products are consumed.
+    """
+
+    quantities = {int(product_id): int(item['quantity']) for product_id, item in cart.items()}
+
+    if not quantities or min(quantities.values()) < 1:
+        raise CheckoutError('Your cart is empty')
+
+    with transaction.atomic():
+        products = {
+            product.id: product
+            for product in Product.objects.filter(id__in=quantities, is_active=True)
+            .for_catalog().select_for_update(of=('self',)).order_by('id')
+        }
+
+        holds = StockReservation.objects.select_for_update().filter(user=order.user_id, product_id__in=quantities)
+        held = dict(holds.values_list('product_id', 'quantity'))
+
+        for product_id, quantity in quantities.items():
+            product = products.get(product_id)
+            if product is None:
+                raise CheckoutError(f'Product {product_id} is no longer available')
+            if product.available_quantity + held.get(product_id, 0) < quantity:
+                raise CheckoutError(f'Not enough quantity for product {product.name}')
+
+        taken = Product.objects.filter(
+            reduce(or_, (
+                Q(id=product_id, quantity__gte=F('reserved_quantity') - held.get(product_id, 0) + quantity)
+                for product_id, quantity in quantities.items()
+            ))
+        ).update(
+            quantity=Case(
+                *(When(id=product_id, then=F('quantity') - quantity) for product_id, quantity in quantities.items()),
+                default=F('quantity'),
+                output_field=models.PositiveIntegerField(),
+            ),
+            reserved_quantity=Case(
+                *(When(id=product_id, then=F('reserved_quantity') - quantity) for product_id, quantity in held.items()),
+                default=F('reserved_quantity'),
+                output_field=models.PositiveIntegerField(),
+            ),
+        )
+
+        if taken != len(quantities):
+            raise CheckoutError('Not enough quantity for some products in your cart')
+
+        if held:
+            holds.delete()
+
+        existing = {item.product_id: item for item in order.order_items.filter(product_id__in=quantities)}
+        new_items = []
+
+        for product_id, quantity in quantities.items():
+            unit_price = products[product_id].effective_price
+            item = existing.get(product_id)
+            if item is None:
+                new_items.append(
+                    OrderItem(order=order, product_id=product_id, quantity=quantity, price=unit_price * quantity)
+                )
+            else:
+                item.quantity += quantity
+                item.price = unit_price * item.quantity
+
+        OrderItem.objects.bulk_create(new_items)
+        OrderItem.objects.bulk_update(existing.values(), ['quantity', 'price'])
+
+        order.total_price = order.order_items.aggregate(total=Sum('price'))['total'] or 0
+        Order.objects.filter(pk=order.pk).update(total_price=order.total_price)
+
+        take_snapshot(order)
+
+    return order
+
+
+def redeem_coupon(coupon_code):
+
+    """
+    Use up the active coupon with this code and return it. Must run inside the transaction that consumes it.
+
+    The coupon is claimed with one conditional UPDATE from active to inactive, so when several confirmations race
+    for the same code exactly one of them matches the row; the others raise CouponUnavailable.
+    """
+
+    if not Coupon.objects.filter(coupon_code=coupon_code, is_active=True).update(is_active=False):
+        if Coupon.objects.filter(coupon_code=coupon_code).exists():
+            raise CouponUnavailable('This coupon has already been used')
+        raise CouponUnavailable('This coupon is not valid')
+
+    transaction.on_commit(lambda: invalidate_coupons(coupon_code))
+
+    return Coupon.objects.get(coupon_code=coupon_code)
+
+
+def is_lock_refused(error):
+
+    # SQLite refuses a write lock held by another connection instead of queueing it like PostgreSQL does.
+    return 'locked' in str(error)
+
+
+def confirm_order(order, address, coupon_code=None):
+
+    """
+    Close the active 'order' into a Cart, redeeming the coupon with this code if one is given.
+
+    Everything runs in one transaction with a fixed number of statements whatever the size of the order: one
+    conditional UPDATE closes the order, so it can not be confirmed twice; the coupon is claimed with another; the
+    total is a Sum() aggregate, and the closed cart is written with a single INSERT.
+
+    When the database refuses the write lock because a concurrent confirmation holds it, the whole transaction is
+    rolled back and run again after a short random pause, up to CHECKOUT_LOCK_RETRIES times.
+    """
+
+    for attempt in range(settings.CHECKOUT_LOCK_RETRIES + 1):
+        try:
+            return _confirm_order(order, address, coupon_code)
+        except OperationalError as e:
+            # Inside an outer transaction only the caller can roll back far enough to retry.
+            if attempt == settings.CHECKOUT_LOCK_RETRIES or not is_lock_refused(e) or connection.in_atomic_block:
+                raise
+            order.is_active = True
+            time.sleep(random.uniform(0, settings.CHECKOUT_LOCK_BACKOFF * 2 ** min(attempt, 5)))
+
+
+def _confirm_order(order, address, coupon_code):
+
+    with transaction.atomic():
+        if not Order.objects.filter(pk=order.pk, is_active=True).update(is_active=False):
+            raise CheckoutError('No active order found')
+        order.is_active = False
+
+        coupon = redeem_coupon(coupon_code) if coupon_code else None
+
+        cart = Cart(custom_user_id=order.user_id, order=order, address=address, coupon=coupon, is_active=False)
+        cart.total_price = cart.compute_total_price()
+        cart.save()
+
+        take_snapshot(order, final=True, cart=cart)
+
+    return cart
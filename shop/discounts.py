@@ -0,0 +1,67 @@
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .cache import bump_catalog_version
+from .models import Category, DiscountRule, Product
+
+
+def refresh_prices(product_ids=(), category_ids=()):
+
+    """
+    Recompute, with one UPDATE, the effective price of the given products and of every product in the subtrees of
+    the given categories.
+    """
+
+    condition = Q(pk__in=list(product_ids))
+
+    for path in Category.objects.filter(pk__in=list(category_ids)).values_list('path', flat=True):
+        condition |= Q(category__path__startswith=path)
+
+    repriced = Product.objects.archived.filter(condition).update_effective_prices()
+    bump_catalog_version()
+
+    return repriced
+
+
+def refresh_rule_prices(rules):
+
+    """
+    Recompute the effective price of every product covered by the discount rules of the 'rules' queryset.
+    """
+
+    repriced = Product.objects.archived.filter(rules.covered_products()).update_effective_prices()
+    bump_catalog_version()
+
+    return repriced
+
+
+def sync_discount_rules(now=None):
+
+    """
+    Turn on the discount rules whose time has come and turn off the ones that have ended, then recompute the
+    effective price of the products they cover.
+
+    Rules are switched with two set-based UPDATEs through the (is_live, starts_at) and (is_live, ends_at) indexes,
+    and the covered products are repriced with a single UPDATE, however many rules changed. Returns the number of
+    rules switched.
+    """
+
+    now = now or timezone.now()
+
+    with transaction.atomic():
+        starting = list(
+            DiscountRule.objects.select_for_update().filter(is_live=False).live_at(now).values_list('id', flat=True)
+        )
+        ending = list(
+            DiscountRule.objects.select_for_update().filter(is_live=True)
+            .filter(Q(starts_at__gt=now) | Q(ends_at__lte=now)).values_list('id', flat=True)
+        )
+
+        if not starting and not ending:
+            return 0
+
+        DiscountRule.objects.filter(id__in=starting).update(is_live=True)
+        DiscountRule.objects.filter(id__in=ending).update(is_live=False)
+        refresh_rule_prices(DiscountRule.objects.filter(id__in=starting + ending))
+
+    return len(starting) + len(ending)
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Prefetch
+from shop.cache import invalidate_order_history
+from shop.models import Cart, Order, OrderSnapshot
+from shop.snapshots import build_document, snapshot_item_queryset
+
+
+class Command(BaseCommand):
+
+    help = 'Write the missing order snapshots, streaming orders in primary key chunks'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('--chunk-size', type=int, default=500, help='Number of orders loaded per query')
+
+    def handle(self, *args, **kwargs):
+
+        chunk_size = kwargs['chunk_size']
+        orders = Order.objects.archived.filter(snapshot__isnull=True).order_by('id').prefetch_related(
+            Prefetch('order_items', queryset=snapshot_item_queryset().order_by('id')),
+            Prefetch('cart', queryset=Cart.objects.select_related('coupon')),
+        )
+
+        last_id, written, users = 0, 0, set()
+
+        while True:
+            chunk = list(orders.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+
+            snapshots = []
+            for order in chunk:
+                cart = getattr(order, 'cart', None)
+                snapshots.append(OrderSnapshot(
+                    order=order,
+                    user_id=order.user_id,
+                    order_date=order.order_date,
+                    total_price=order.total_price,
+                    is_final=not order.is_active,
+                    document=build_document(order, order.order_items.all(), None if order.is_active else cart),
+                ))
+                if not order.is_active:
+                    users.add(order.user_id)
+
+            with transaction.atomic():
+                OrderSnapshot.objects.bulk_create(snapshots, ignore_conflicts=True)
+
+            written += len(snapshots)
+            last_id = chunk[-1].id
+
+        for user_id in users:
+            invalidate_order_history(user_id)
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully wrote {written} order snapshots'))
@@ -0,0 +1,77 @@
+from account.models import CustomUser
+from django.core.management.base import BaseCommand
+from itertools import islice
+from shop.models import Category, Product
+from utils.benchmark import measure, rollback_atomic
+
+
+class Command(BaseCommand):
+
+    help = 'Benchmark the category subtree product lookups on synthetic trees (all data is rolled back)'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('--depths', type=int, nargs='+', default=[2, 4, 8, 12], help='Tree depths to measure')
+        parser.add_argument('--fanouts', type=int, nargs='+', default=[5, 10, 25, 50], help='Children per category')
+        parser.add_argument('--max-width', type=int, default=500, help='Maximum number of categories per level')
+        parser.add_argument('--products-per-category', type=int, default=2, help='Products created per category')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement')
+
+    def handle(self, *args, **kwargs):
+
+        self.stdout.write(
+            f'{"depth":>5} {"fanout":>6} {"nodes":>7} {"strategy":<18} {"median ms":>10} {"min ms":>8} {"queries":>7}'
+        )
+
+        for depth in kwargs['depths']:
+            for fanout in kwargs['fanouts']:
+                with rollback_atomic():
+                    root, nodes = self.build_tree(
+                        depth, fanout, kwargs['max_width'], kwargs['products_per_category']
+                    )
+                    for strategy, lookup in self.strategies(root).items():
+                        result = measure(lambda: list(lookup().values_list('id', flat=True)), kwargs['repeat'])
+                        self.stdout.write(
+                            f'{depth:>5} {fanout:>6} {nodes:>7} {strategy:<18} '
+                            f'{result["median"]:>10.2f} {result["min"]:>8.2f} {result["queries"]:>7}'
+                        )
+
+    @staticmethod
+    def strategies(root):
+
+        return {
+            'materialized-list': lambda: Product.objects.filter(
+                category__in=list(root.get_descendants(include_self=True))
+            ).distinct(),
+            'path-prefix': lambda: Product.objects.filter(category__path__startswith=root.path),
+            'recursive-cte': lambda: Product.objects.in_category(root.id),
+        }
+
+    @staticmethod
+    def build_tree(depth, fanout, max_width, products_per_category):
+
+        user = CustomUser.objects.create(
+            username='benchmark_user', phone_number='benchmark', email='benchmark@example.com'
+        )
+        root = Category.objects.create(name='benchmark-root')
+
+        level, nodes = [root], 1
+        for current_depth in range(1, depth + 1):
+            parents = islice((parent for parent in level for _ in range(fanout)), max_width)
+            children = [
+                Category(name=f'benchmark-{current_depth}-{index}', parent_category=parent)
+                for index, parent in enumerate(parents)
+            ]
+            level = Category.objects.bulk_create(children)
+            nodes += len(level)
+
+        Category.objects.rebuild_tree()
+        root.refresh_from_db()
+
+        Product.objects.bulk_create(
+            Product(category_id=category_id, user=user, name=f'benchmark-{category_id}-{index}', about='', price=1)
+            for category_id in Category.objects.filter(path__startswith=root.path).values_list('id', flat=True)
+            for index in range(products_per_category)
+        )
+
+        return root, nodes
@@ -0,0 +1,54 @@
+from account.models import Address, CustomUser
+from django.core.management.base import BaseCommand
+from django.db import connection
+from shop.checkout import confirm_order
+from shop.models import Category, Coupon, Order, OrderItem, Product
+from utils.benchmark import measure, rollback_atomic
+
+
+class Command(BaseCommand):
+
+    help = 'Benchmark order confirmation throughput on the configured database (all data is rolled back)'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('--orders', type=int, default=500, help='Orders confirmed per measurement')
+        parser.add_argument('--items', type=int, nargs='+', default=[1, 10, 50], help='Order items per order')
+        parser.add_argument('--coupon', action='store_true', help='Redeem a coupon with every confirmation')
+
+    def handle(self, *args, **kwargs):
+
+        self.stdout.write(f'Database: {connection.vendor}')
+        self.stdout.write(f'{"items":>6} {"orders":>7} {"ms":>9} {"orders/s":>9} {"queries/order":>14}')
+
+        for items in kwargs['items']:
+            with rollback_atomic():
+                pending = self.build_orders(kwargs['orders'], items, kwargs['coupon'])
+                result = measure(lambda: [confirm_order(*args) for args in pending], repeat=1)
+
+            self.stdout.write(
+                f'{items:>6} {len(pending):>7} {result["median"]:>9.0f} '
+                f'{len(pending) / (result["median"] / 1000):>9.0f} {result["queries"] / len(pending):>14.1f}'
+            )
+
+    @staticmethod
+    def build_orders(count, items, with_coupon):
+
+        user = CustomUser.objects.create(
+            username='benchmark_user', phone_number='benchmark', email='benchmark@example.com'
+        )
+        address = Address.objects.create(
+            user=user, country='benchmark', city='benchmark', address='benchmark', zipcode='0', is_active=True
+        )
+        category = Category.objects.create(name='benchmark-confirm')
+        products = Product.objects.bulk_create(
+            Product(category=category, user=user, name=f'benchmark-{index}', about='', price=10)
+            for index in range(items)
+        )
+        orders = Order.objects.bulk_create(Order(user=user, total_price=10 * items) for _ in range(count))
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=product, quantity=1, price=10) for order in orders for product in products
+        )
+        codes = Coupon.objects.mint(count, 5) if with_coupon else [None] * count
+
+        return [(order, address, code) for order, code in zip(orders, codes)]
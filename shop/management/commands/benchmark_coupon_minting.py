@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from shop.models import Coupon
+from utils.benchmark import measure, rollback_atomic
+
+
+class Command(BaseCommand):
+
+    help = 'Benchmark creating coupons one save at a time against Coupon.objects.mint (all data is rolled back)'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('--counts', type=int, nargs='+', default=[1000, 10000, 100000, 1000000],
+                            help='Numbers of coupons to create')
+        parser.add_argument('--max-saves', type=int, default=10000,
+                            help='Largest count measured with one save per coupon')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Batch size passed to mint')
+
+    def handle(self, *args, **kwargs):
+
+        # Query counts are left out: the query log only keeps the last 9000 queries.
+        self.stdout.write(f'{"coupons":>8} {"strategy":<10} {"ms":>10} {"coupons/s":>10}')
+
+        for count in kwargs['counts']:
+            strategies = {'mint': lambda: Coupon.objects.mint(count, 50, batch_size=kwargs['batch_size'])}
+            if count <= kwargs['max_saves']:
+                strategies['save'] = lambda: [Coupon.objects.create(amount_of_discount=50) for _ in range(count)]
+
+            for strategy, func in strategies.items():
+                with rollback_atomic():
+                    result = measure(func, repeat=1)
+                self.stdout.write(
+                    f'{count:>8} {strategy:<10} {result["median"]:>10.0f} '
+                    f'{count / (result["median"] / 1000):>10.0f}'
+                )
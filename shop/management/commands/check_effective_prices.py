@@ -0,0 +1,47 @@
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from shop.models import Product
+
+
+class Command(BaseCommand):
+
+    help = 'Compare the stored effective price of every product with its price and discount, in primary key chunks'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Number of products checked per query')
+        parser.add_argument('--fix', action='store_true', help='Rewrite the effective price of mismatched products')
+
+    def handle(self, *args, **kwargs):
+
+        queryset = Product.objects.archived.order_by('id')
+        rows = queryset.annotate(expected=queryset.effective_price_expression()).values_list(
+            'id', 'effective_price', 'expected'
+        )
+        cent = Decimal('0.01')
+        last_id, checked, mismatched = 0, 0, []
+
+        while True:
+            chunk = list(rows.filter(id__gt=last_id)[:kwargs['chunk_size']])
+            if not chunk:
+                break
+
+            wrong = []
+            for pk, stored, expected in chunk:
+                if Decimal(stored).quantize(cent) != Decimal(expected).quantize(cent):
+                    wrong.append(pk)
+                    self.stdout.write(f'Product {pk}: stored {stored}, expected {Decimal(expected).quantize(cent)}')
+
+            if kwargs['fix'] and wrong:
+                Product.objects.archived.filter(id__in=wrong).update_effective_prices()
+
+            mismatched += wrong
+            checked += len(chunk)
+            last_id = chunk[-1][0]
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully checked {checked} products, {len(mismatched)} mismatched'
+                + (', fixed' if kwargs['fix'] and mismatched else '')
+            )
+        )
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from importlib import import_module
+from shop.cart_store import UserCart
+
+
+class Command(BaseCommand):
+
+    help = 'Move the carts stored in database backed sessions into the configured cart store'
+
+    def handle(self, *args, **kwargs):
+
+        session_store = import_module(settings.SESSION_ENGINE).SessionStore
+        keys = Session.objects.filter(expire_date__gt=timezone.now()).values_list('session_key', flat=True)
+        migrated = 0
+
+        for session_key in keys.iterator():
+            session = session_store(session_key=session_key)
+            user_id = session.get('_auth_user_id')
+
+            if 'cart' not in session or user_id is None:
+                continue
+
+            UserCart(int(user_id)).merge(session.pop('cart'))
+            session.save()
+            migrated += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully migrated {migrated} session carts'))
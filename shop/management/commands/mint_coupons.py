@@ -0,0 +1,32 @@
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from shop.models import Coupon
+
+
+class Command(BaseCommand):
+
+    help = 'Create a batch of coupons with unique generated codes'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('count', type=int, help='Number of coupons to create')
+        parser.add_argument('--amount', type=Decimal, required=True, help='Amount of discount of every coupon')
+        parser.add_argument('--inactive', action='store_true', help='Create the coupons deactivated')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Number of codes generated per insert')
+        parser.add_argument('--output', help='File the minted codes are written to, one per line')
+
+    def handle(self, *args, **kwargs):
+
+        try:
+            codes = Coupon.objects.mint(
+                kwargs['count'], kwargs['amount'], is_active=not kwargs['inactive'], batch_size=kwargs['batch_size']
+            )
+        except ValidationError as error:
+            raise CommandError(error.messages[0])
+
+        if kwargs['output']:
+            with open(kwargs['output'], 'w') as output:
+                output.writelines(f'{code}\n' for code in codes)
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully minted {len(codes)} coupons'))
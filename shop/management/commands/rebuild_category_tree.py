@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from shop.models import Category
+
+
+class Command(BaseCommand):
+
+    help = 'Rebuild the materialized path index of the category tree'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of categories updated per query')
+
+    def handle(self, *args, **kwargs):
+
+        rebuilt = Category.objects.rebuild_tree(batch_size=kwargs['batch_size'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully rebuilt the tree index for {rebuilt} categories')
+        )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from shop.models import Inventory
+
+
+class Command(BaseCommand):
+
+    help = 'Recompute the denormalized product counters of every inventory'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of inventories updated per query')
+
+    def handle(self, *args, **kwargs):
+
+        corrected = Inventory.objects.reconcile(batch_size=kwargs['batch_size'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully reconciled inventory counters, {corrected} corrected')
+        )
@@ -0,0 +1,34 @@
+from account.models import CustomUser
+from django.core.management import call_command
+from django.test import TestCase
+from io import StringIO
+from shop.models import Category, Order, OrderItem, OrderSnapshot, Product
+
+
+class BackfillOrderSnapshotsCommandTest(TestCase):
+
+    def setUp(self):
+
+        user = CustomUser.objects.create(username='shopper', email='shopper@example.com', phone_number='+989393214334')
+        product = Product.objects.create(
+            category=Category.objects.create(name='Test Category'), user=user, name='Product', about='', price=5
+        )
+        self.closed, self.active = Order.objects.bulk_create([Order(user=user, is_active=False), Order(user=user)])
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=product, quantity=2, price=10) for order in (self.closed, self.active)
+        )
+
+    def test_snapshots_written_in_chunks(self):
+
+        out = StringIO()
+
+        call_command('backfill_order_snapshots', '--chunk-size', '1', stdout=out)
+        call_command('backfill_order_snapshots', stdout=out)
+
+        snapshots = dict(OrderSnapshot.objects.values_list('order', 'is_final'))
+        self.assertEqual(snapshots, {self.closed.id: True, self.active.id: False})
+        self.assertEqual(
+            OrderSnapshot.objects.get(pk=self.closed.pk).document['items'][0]['product_name'], 'Product'
+        )
+        self.assertIn('Successfully wrote 2 order snapshots', out.getvalue())
+        self.assertIn('Successfully wrote 0 order snapshots', out.getvalue())
@@ -0,0 +1,36 @@
+from account.models import CustomUser
+from decimal import Decimal
+from django.core.management import call_command
+from django.test import TestCase
+from io import StringIO
+from shop.models import Category, Discount, Product
+
+
+class CheckEffectivePricesCommandTest(TestCase):
+
+    def setUp(self):
+
+        user = CustomUser.objects.create(username='seller', email='seller@example.com', phone_number='+989393214333')
+        category = Category.objects.create(name='Test Category')
+        self.products = [
+            Product.objects.create(category=category, user=user, name=f'Product {index}', about='', price=40)
+            for index in range(3)
+        ]
+        Discount.objects.create(product=self.products[0], discount_percentage=25)
+        Product.objects.filter(id=self.products[0].id).update(effective_price=40)
+
+    def test_reports_mismatches(self):
+
+        out = StringIO()
+
+        call_command('check_effective_prices', '--chunk-size', '2', stdout=out)
+
+        self.assertIn(f'Product {self.products[0].id}: stored 40.00, expected 30.00', out.getvalue())
+        self.assertIn('Successfully checked 3 products, 1 mismatched', out.getvalue())
+
+    def test_fix(self):
+
+        call_command('check_effective_prices', '--fix', stdout=StringIO())
+
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].effective_price, Decimal('30.00'))
@@ -0,0 +1,43 @@
+from account.models import CustomUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from io import StringIO
+from shop.cart_store import get_cart_store
+from shop.models import Category, Product, StockReservation
+
+
+@override_settings(
+    CART_STORE='shop.cart_store.InMemoryCartStore', SESSION_ENGINE='django.contrib.sessions.backends.db'
+)
+class MigrateSessionCartsCommandTest(TestCase):
+
+    def setUp(self):
+
+        self.user = CustomUser.objects.create(
+            username='shopper', email='shopper@example.com', phone_number='+989393214334'
+        )
+        category = Category.objects.create(name='Test Category')
+        self.product = Product.objects.create(
+            category=category, user=self.user, name='Product', about='About', price=100, quantity=5
+        )
+
+        self.session = SessionStore()
+        self.session['_auth_user_id'] = str(self.user.id)
+        self.session['cart'] = {str(self.product.id): {'quantity': 2, 'price': '100'}}
+        self.session.create()
+
+        anonymous = SessionStore()
+        anonymous['cart'] = {str(self.product.id): {'quantity': 1, 'price': '100'}}
+        anonymous.create()
+
+    def test_carts_moved_to_store(self):
+
+        out = StringIO()
+
+        call_command('migrate_session_carts', stdout=out)
+
+        self.assertEqual(get_cart_store().count(self.user.id), 2)
+        self.assertEqual(StockReservation.objects.get(user=self.user, product=self.product).quantity, 2)
+        self.assertNotIn('cart', SessionStore(session_key=self.session.session_key).load())
+        self.assertIn('Successfully migrated 1 session carts', out.getvalue())
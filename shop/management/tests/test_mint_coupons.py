@@ -0,0 +1,28 @@
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from io import StringIO
+from shop.models import Coupon
+from tempfile import NamedTemporaryFile
+
+
+class MintCouponsCommandTest(TestCase):
+
+    def test_mint(self):
+
+        out = StringIO()
+
+        with NamedTemporaryFile('r') as output:
+            call_command('mint_coupons', '25', '--amount', '500', '--batch-size', '10', '--output', output.name,
+                         stdout=out)
+            codes = output.read().split()
+
+        self.assertIn('Successfully minted 25 coupons', out.getvalue())
+        self.assertEqual(len(set(codes)), 25)
+        self.assertEqual(Coupon.objects.filter(coupon_code__in=codes, rarity='Rare', is_active=True).count(), 25)
+
+    def test_invalid_amount(self):
+
+        with self.assertRaises(CommandError):
+            call_command('mint_coupons', '5', '--amount', '0', stdout=StringIO())
+
+        self.assertFalse(Coupon.objects.exists())
@@ -0,0 +1,33 @@
+from django.core.management import call_command
+from django.test import TestCase
+from io import StringIO
+from shop.models import Category
+
+
+class RebuildCategoryTreeCommandTest(TestCase):
+
+    def setUp(self):
+
+        self.root = Category.objects.create(name='Root')
+        self.child = Category.objects.create(name='Child', parent_category=self.root)
+        self.grandchild = Category.objects.create(name='Grandchild', parent_category=self.child)
+
+        Category.objects.update(path='', depth=0)
+
+    def test_rebuild_restores_paths(self):
+
+        out = StringIO()
+
+        call_command('rebuild_category_tree', stdout=out)
+
+        self.grandchild.refresh_from_db()
+        self.assertEqual(self.grandchild.path, f'/{self.root.id}/{self.child.id}/{self.grandchild.id}/')
+        self.assertEqual(self.grandchild.depth, 2)
+
+    def test_rebuild_output(self):
+
+        out = StringIO()
+
+        call_command('rebuild_category_tree', stdout=out)
+
+        self.assertIn('Successfully rebuilt the tree index for 3 categories', out.getvalue())
@@ -0,0 +1,31 @@
+from account.models import CustomUser
+from django.core.management import call_command
+from django.test import TestCase
+from io import StringIO
+from shop.models import Category, Inventory, Product
+
+
+class ReconcileInventoryCountsCommandTest(TestCase):
+
+    def setUp(self):
+
+        user = CustomUser.objects.create(username='seller', email='seller@example.com', phone_number='+989393214333')
+        category = Category.objects.create(name='Test Category')
+        self.inventory = Inventory.objects.create(name='Inventory', capacity=10)
+
+        for index in range(3):
+            Product.objects.create(
+                category=category, user=user, inventory=self.inventory, name=f'Product {index}', about='', price=1
+            )
+
+        Inventory.objects.update(product_count=0)
+
+    def test_counters_recomputed(self):
+
+        out = StringIO()
+
+        call_command('reconcile_inventory_counts', stdout=out)
+
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.product_count, 3)
+        self.assertIn('Successfully reconciled inventory counters, 1 corrected', out.getvalue())
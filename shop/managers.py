@@ -0,0 +1,333 @@
+from core.managers import LogicalManager, LogicalQuerySet
+from decimal import Decimal
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, F, Max, Q, Value, When
+from django.db.models.expressions import Exists, ExpressionWrapper, OuterRef, RawSQL, Subquery
+from django.db.models.functions import Coalesce, Greatest, Round
+
+
+class CategoryQuerySet(models.QuerySet):
+
+    def subtree_ids(self, category_id, include_self=True):
+
+        """
+        Return a recursive CTE selecting the ids of a category subtree, meant to be used as the right hand
+        side of an '__in' lookup so the whole subtree is resolved by the database in the same statement.
+        """
+
+        table = self.model._meta.db_table
+        parent_column = self.model._meta.get_field('parent_category').column
+
+        sql = (
+            f'WITH RECURSIVE subtree(id) AS ('
+            f'SELECT id FROM {table} WHERE id = %s '
+            f'UNION ALL '
+            f'SELECT child.id FROM {table} AS child INNER JOIN subtree ON child.{parent_column} = subtree.id'
+            f') SELECT id FROM subtree'
+        )
+        params = [category_id]
+
+        if not include_self:
+            sql += ' WHERE id <> %s'
+            params.append(category_id)
+
+        return RawSQL(sql, params)
+
+    def rebuild_tree(self, batch_size=1000):
+
+        """
+        Recompute the materialized path and depth of every category from parent links.
+        Loads the (id, parent) pairs in one query and writes the result back with bulk_update.
+        """
+
+        children = {}
+        for pk, parent_id in self.model.objects.values_list('id', 'parent_category_id'):
+            children.setdefault(parent_id, []).append(pk)
+
+        categories = []
+        stack = [(pk, '/') for pk in children.get(None, [])]
+
+        while stack:
+            pk, parent_path = stack.pop()
+            path = f'{parent_path}{pk}/'
+            categories.append(self.model(id=pk, path=path, depth=path.count('/') - 2))
+            stack.extend((child, path) for child in children.get(pk, []))
+
+        with transaction.atomic():
+            self.model.objects.bulk_update(categories, ['path', 'depth'], batch_size=batch_size)
+
+        return len(categories)
+
+
+class CategoryManager(models.Manager.from_queryset(CategoryQuerySet)):
+    pass
+
+
+class InventoryQuerySet(models.QuerySet):
+
+    def move_product(self, old_inventory_id, new_inventory_id):
+
+        """
+        Move one product between inventories (either may be None), keeping product_count up to date.
+        Capacity is enforced by the UPDATE itself, so concurrent assignments can never overfill an inventory.
+        """
+
+        if new_inventory_id is not None:
+            taken = self.filter(id=new_inventory_id, product_count__lt=F('capacity')).update(
+                product_count=F('product_count') + 1
+            )
+            if not taken:
+                return False
+
+        if old_inventory_id is not None:
+            self.filter(id=old_inventory_id, product_count__gt=0).update(product_count=F('product_count') - 1)
+
+        return True
+
+    def adjust_counts(self, counts):
+
+        """
+        Add a {inventory_id: delta} dict to the product counters with one UPDATE.
+        """
+
+        if counts:
+            self.filter(id__in=counts).update(
+                product_count=Case(
+                    *(When(id=inventory_id, then=F('product_count') + delta) for inventory_id, delta in counts.items()),
+                    default=F('product_count'),
+                    output_field=models.PositiveIntegerField(),
+                )
+            )
+
+    def reconcile(self, batch_size=1000):
+
+        """
+        Recompute every product counter from the products table. Returns the number of corrected inventories.
+        """
+
+        product_model = self.model._meta.get_field('product').related_model
+        actual = product_model.objects.inventory_counts()
+
+        inventories = []
+        for inventory in self.only('id', 'product_count').iterator(chunk_size=batch_size):
+            if inventory.product_count != actual.get(inventory.id, 0):
+                inventory.product_count = actual.get(inventory.id, 0)
+                inventories.append(inventory)
+
+        with transaction.atomic():
+            self.model.objects.bulk_update(inventories, ['product_count'], batch_size=batch_size)
+
+        return len(inventories)
+
+
+class InventoryManager(models.Manager.from_queryset(InventoryQuerySet)):
+    pass
+
+
+class ProductQuerySet(LogicalQuerySet):
+
+    CATALOG_FIELDS = (
+        'id', 'name', 'about', 'image', 'price', 'effective_price', 'quantity', 'reserved_quantity', 'is_active',
+        'create_at', 'category', 'category__name', 'discount__product', 'discount__discount_percentage',
+    )
+
+    def for_catalog(self):
+
+        """
+        Products as shown on listing pages: discount and category joined in the same query and only the displayed
+        columns loaded. 'discount_percentage' is the discount that won, the product's own or a discount rule's.
+        """
+
+        return (
+            self.select_related('discount', 'category').only(*self.CATALOG_FIELDS)
+            .annotate(discount_percentage=self.discount_percentage_expression())
+        )
+
+    def discount_percentage_expression(self, prefix=''):
+
+        """
+        The best discount of each product: its own Discount row or the largest live DiscountRule covering it,
+        either directly or through an ancestor of its category. Built from subqueries only, so it can also be
+        used in UPDATE statements. 'prefix' is the path to the product when the expression is used on a related
+        model, such as 'product__' for order items.
+        """
+
+        discount_model = self.model._meta.get_field('discount').related_model
+        rule_model = self.model._meta.get_field('discount_rules').related_model
+        category_model = self.model._meta.get_field('category').related_model
+
+        own = discount_model.objects.filter(product=OuterRef(f'{prefix}pk')).values('discount_percentage')[:1]
+        in_rule_category = category_model.objects.filter(
+            id=OuterRef(OuterRef(f'{prefix}category_id')), path__startswith=OuterRef('categories__path')
+        )
+        rules = (
+            rule_model.objects.filter(is_live=True)
+            .filter(Q(products=OuterRef(f'{prefix}pk')) | Exists(in_rule_category))
+            .order_by().values('is_live').annotate(best=Max('discount_percentage')).values('best')
+        )
+
+        return Greatest(
+            Coalesce(Subquery(own), Value(Decimal(0))),
+            Coalesce(Subquery(rules), Value(Decimal(0))),
+            output_field=models.DecimalField(max_digits=5, decimal_places=2),
+        )
+
+    def effective_price_expression(self):
+
+        """
+        The discounted price, as stored in 'effective_price'.
+        """
+
+        return Round(
+            ExpressionWrapper(
+                F('price') * (Value(Decimal(100)) - self.discount_percentage_expression()) / Value(Decimal(100)),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2),
+            ),
+            2,
+        )
+
+    def update_effective_prices(self):
+
+        return self.update(effective_price=self.effective_price_expression())
+
+    def bulk_create(self, objs, *args, **kwargs):
+
+        # New products have no discount of their own yet, so their effective price is their price unless a live
+        # discount rule covers their category.
+        objs = list(objs)
+        for obj in objs:
+            if obj.effective_price is None:
+                obj.effective_price = self.model.compute_effective_price(obj.price)
+
+        rule_model = self.model._meta.get_field('discount_rules').related_model
+
+        with transaction.atomic():
+            created = super().bulk_create(objs, *args, **kwargs)
+
+            if rule_model.objects.filter(is_live=True, categories__isnull=False).exists():
+                by_id = {obj.pk: obj for obj in created if obj.pk is not None}
+                ids = list(by_id)
+                for start in range(0, len(ids), 1000):
+                    products = self.model.objects.archived.filter(pk__in=ids[start:start + 1000])
+                    products.update_effective_prices()
+                    for pk, effective_price in products.values_list('pk', 'effective_price'):
+                        by_id[pk].effective_price = effective_price
+
+        return created
+
+    def inventory_counts(self):
+
+        return dict(
+            self.filter(inventory__isnull=False).order_by()
+            .values('inventory').annotate(count=Count('id')).values_list('inventory', 'count')
+        )
+
+    def delete(self):
+
+        inventory_model = self.model._meta.get_field('inventory').related_model
+
+        with transaction.atomic():
+            counts = self.filter(is_deleted=False).inventory_counts()
+            deleted = super().delete()
+            inventory_model.objects.adjust_counts({inventory_id: -count for inventory_id, count in counts.items()})
+
+        return deleted
+
+    def undelete(self):
+
+        inventory_model = self.model._meta.get_field('inventory').related_model
+
+        with transaction.atomic():
+            counts = self.filter(is_deleted=True).inventory_counts()
+            restored = super().undelete()
+            inventory_model.objects.adjust_counts(counts)
+
+        return restored
+
+    def in_category(self, category_id):
+
+        """
+        Products of a category and all of its subcategories, in a single query.
+        """
+
+        category_model = self.model._meta.get_field('category').related_model
+        return self.filter(category_id__in=category_model.objects.subtree_ids(category_id))
+
+
+class ProductManager(LogicalManager.from_queryset(ProductQuerySet)):
+    pass
+
+
+class DiscountRuleQuerySet(models.QuerySet):
+
+    def live_at(self, now):
+
+        return self.filter(Q(ends_at__isnull=True) | Q(ends_at__gt=now), starts_at__lte=now)
+
+    def covered_products(self):
+
+        """
+        Q object matching the products covered by the rules of this queryset, directly or by category subtree.
+        """
+
+        paths = set(self.filter(categories__isnull=False).values_list('categories__path', flat=True))
+        condition = Q(discount_rules__in=self.values('id'))
+
+        for path in paths:
+            condition |= Q(category__path__startswith=path)
+
+        return condition
+
+
+class DiscountRuleManager(models.Manager.from_queryset(DiscountRuleQuerySet)):
+    pass
+
+
+class CouponQuerySet(models.QuerySet):
+
+    def mint(self, count, amount_of_discount, is_active=True, batch_size=5000):
+
+        """
+        Create 'count' coupons worth 'amount_of_discount' and return their codes.
+
+        Codes are generated 'batch_size' at a time and deduplicated in memory. Codes already in use are dropped
+        with one lookup per batch, and the rest are inserted with a single bulk INSERT. The rarity is computed
+        once for the whole run.
+        """
+
+        from utils.coupon_generator import generate_coupon_codes
+        from .cache import invalidate_coupons
+
+        self.model.validate_amount(amount_of_discount)
+        rarity = self.model.rarity_for(amount_of_discount)
+        minted = []
+
+        while len(minted) < count:
+            codes = generate_coupon_codes(min(batch_size, count - len(minted)))
+            codes -= set(self.filter(coupon_code__in=codes).values_list('coupon_code', flat=True))
+
+            try:
+                with transaction.atomic():
+                    self.bulk_create(
+                        (
+                            self.model(
+                                coupon_code=code, amount_of_discount=amount_of_discount,
+                                is_active=is_active, rarity=rarity,
+                            )
+                            for code in codes
+                        ),
+                        batch_size=batch_size,
+                    )
+            except IntegrityError:
+                # A code was taken by a concurrent insert after the lookup; generate the batch again.
+                continue
+
+            # The new codes may have been looked up, and cached as invalid, before they were minted.
+            invalidate_coupons(*codes)
+            minted.extend(codes)
+
+        return minted
+
+
+class CouponManager(models.Manager.from_queryset(CouponQuerySet)):
+    pass
@@ -0,0 +1,47 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:19
+
+from django.db import migrations, models
+
+
+def populate_category_paths(apps, schema_editor): # noqa: unused-argument
+    Category = apps.get_model('shop', 'Category')
+
+    children = {}
+    for pk, parent_id in Category.objects.values_list('id', 'parent_category_id'):
+        children.setdefault(parent_id, []).append(pk)
+
+    categories = []
+    stack = [(pk, '/') for pk in children.get(None, [])]
+
+    while stack:
+        pk, parent_path = stack.pop()
+        path = f'{parent_path}{pk}/'
+        categories.append(Category(id=pk, path=path, depth=path.count('/') - 2))
+        stack.extend((child, path) for child in children.get(pk, []))
+
+    Category.objects.bulk_update(categories, ['path', 'depth'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_order_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['path'], name='shop_category_path_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(populate_category_paths, migrations.RunPython.noop),
+    ]
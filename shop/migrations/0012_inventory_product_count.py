@@ -0,0 +1,36 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:37
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_product_counts(apps, schema_editor): # noqa: unused-argument
+    Inventory = apps.get_model('shop', 'Inventory')
+    Product = apps.get_model('shop', 'Product')
+
+    counts = (
+        Product.objects.filter(inventory__isnull=False, is_deleted=False).order_by()
+        .values('inventory').annotate(count=Count('id')).values_list('inventory', 'count')
+    )
+
+    Inventory.objects.bulk_update(
+        [Inventory(id=inventory_id, product_count=count) for inventory_id, count in counts],
+        ['product_count'],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_stockreservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_product_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_inventory_product_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSnapshot',
+            fields=[
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='shop.order')),
+                ('order_date', models.DateTimeField()),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('is_final', models.BooleanField(default=False)),
+                ('document', models.JSONField(default=dict)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Order Snapshot',
+                'verbose_name_plural': 'Order Snapshots',
+                'indexes': [models.Index(fields=['user', 'is_final', '-order_date', '-order'], name='shop_snapshot_history_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:05
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import ExpressionWrapper, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Round
+
+
+def populate_effective_prices(apps, schema_editor): # noqa: unused-argument
+    Product = apps.get_model('shop', 'Product')
+    Discount = apps.get_model('shop', 'Discount')
+
+    percentage = Discount.objects.filter(product=OuterRef('pk')).values('discount_percentage')[:1]
+
+    Product.objects.update(
+        effective_price=Round(
+            ExpressionWrapper(
+                F('price') * (Value(Decimal(100)) - Coalesce(Subquery(percentage), Value(Decimal(0))))
+                / Value(Decimal(100)),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2),
+            ),
+            2,
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_ordersnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+            preserve_default=False,
+        ),
+        migrations.RunPython(populate_effective_prices, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['effective_price', 'id'], name='shop_product_eff_price_idx'),
+        ),
+    ]
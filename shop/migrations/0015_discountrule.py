@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:47
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0014_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiscountRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('discount_percentage', models.DecimalField(decimal_places=2, max_digits=5, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)])),
+                ('starts_at', models.DateTimeField()),
+                ('ends_at', models.DateTimeField(blank=True, null=True)),
+                ('is_live', models.BooleanField(default=False, editable=False)),
+                ('categories', models.ManyToManyField(blank=True, related_name='discount_rules', to='shop.category')),
+                ('products', models.ManyToManyField(blank=True, related_name='discount_rules', to='shop.product')),
+            ],
+            options={
+                'verbose_name': 'Discount Rule',
+                'verbose_name_plural': 'Discount Rules',
+                'indexes': [models.Index(fields=['is_live', 'starts_at'], name='shop_discountrule_start_idx'), models.Index(fields=['is_live', 'ends_at'], name='shop_discountrule_end_idx')],
+            },
+        ),
+    ]
@@ -2,10 +2,13 @@ from account.models import CustomUser, Address
 from core.models import LogicalMixin, TimeStampMixin
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models, IntegrityError
-from django.shortcuts import get_object_or_404
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import models, transaction, IntegrityError
+from django.db.models import Exists, F, Max, OuterRef, Q, Sum, Value
+from django.db.models.functions import Concat, Substr
 from django.utils.translation import gettext_lazy as _
 from utils.coupon_generator import generate_coupon_code
+from .managers import CategoryManager, CouponManager, DiscountRuleManager, InventoryManager, ProductManager
 
 
 class Category(models.Model):
@@ -14,64 +17,119 @@ class Category(models.Model):
     parent_category = models.ForeignKey(
         'self', on_delete=models.CASCADE, null=True, blank=True, related_name='subcategories'
     )
+    path = models.CharField(max_length=255, default='', editable=False)
+    depth = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = CategoryManager()
 
     class Meta:
 
         verbose_name = 'Category'
         verbose_name_plural = 'Categories'
 
+        indexes = [
+            models.Index(fields=['path'], name='shop_category_path_idx', opclasses=['varchar_pattern_ops']),
+        ]
+
     def __str__(self):
 
         return self.name
 
-    @staticmethod
-    def calculate_max_depth(root_category):
+    def save(self, *args, **kwargs):
 
         """
-        Recursively calculates the maximum depth of the category tree starting from a given root category.
+        Save the category and keep the materialized path of it and its subtree in sync.
+        A category can not be moved under itself or one of its own descendants.
         """
 
-        if not root_category.subcategories.exists():
-            return 0
-        else:
-            return 1 + max(Category.calculate_max_depth(sub) for sub in root_category.subcategories.all())
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'parent_category' not in update_fields:
+            return super().save(*args, **kwargs)
 
-    def get_descendants(self, include_self=False, levels=None):
+        with transaction.atomic():
+
+            old_path = ''
+            if self.pk:
+                old_path = Category.objects.filter(pk=self.pk).values_list('path', flat=True).first() or ''
+
+            parent_path = '/'
+            if self.parent_category_id:
+                parent_path = Category.objects.filter(
+                    pk=self.parent_category_id
+                ).values_list('path', flat=True).get()
+                if old_path and parent_path.startswith(old_path):
+                    raise ValidationError(_('A category can not be moved under itself or its descendants.'))
+
+            super().save(*args, **kwargs)
+
+            new_path = f'{parent_path}{self.pk}/'
+            new_depth = new_path.count('/') - 2
+
+            if old_path and old_path != new_path:
+                Category.objects.filter(path__startswith=old_path).update(
+                    path=Concat(Value(new_path), Substr('path', len(old_path) + 1), output_field=models.CharField()),
+                    depth=F('depth') + (new_depth - (old_path.count('/') - 2)),
+                )
+                # The moved subtree may now be covered by other category discount rules.
+                if DiscountRule.objects.filter(is_live=True, categories__isnull=False).exists():
+                    Product.objects.archived.filter(category__path__startswith=new_path).update_effective_prices()
+            elif not old_path:
+                Category.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+
+            self.path = new_path
+            self.depth = new_depth
+
+    @property
+    def ancestor_ids(self):
+
+        return [int(pk) for pk in self.path.strip('/').split('/')[:-1] if pk]
+
+    @staticmethod
+    def calculate_max_depth(root_category):
 
         """
-        Fetch all descendants of the current category using dynamically determined levels of prefetching.
-        If 'levels' is not provided, calculate it based on the maximum depth of the category tree.
+        Calculates the maximum depth of the category tree below a given root category with one aggregate query.
         """
 
-        if levels is None:
-            levels = Category.calculate_max_depth(self)
+        max_depth = Category.objects.filter(
+            path__startswith=root_category.path
+        ).aggregate(max_depth=Max('depth'))['max_depth']
+
+        return (max_depth or root_category.depth) - root_category.depth
+
+    def get_ancestors(self, include_self=False):
 
-        result = [self] if include_self else []
-        queryset = Category.objects.all()
+        """
+        Fetch all ancestors of the current category, from the root down, in a single query.
+        """
 
-        for _ in range(levels):
+        ids = self.ancestor_ids + ([self.pk] if include_self else [])
+        return Category.objects.filter(pk__in=ids).order_by('depth')
 
-            queryset = queryset.prefetch_related('subcategories')
+    def get_descendants(self, include_self=False, levels=None):
 
-        categories = queryset.filter(id=self.id)
+        """
+        Fetch all descendants of the current category with one prefix query on the materialized path.
+        If 'levels' is provided, only descendants up to that many levels below the category are returned.
+        """
 
-        # noinspection PyShadowingNames
-        def collect_categories(category, current_level):
+        queryset = Category.objects.filter(path__startswith=self.path)
 
-            if current_level > 0:
-                for subcategory in category.subcategories.all():
-                    result.append(subcategory)
-                    collect_categories(subcategory, current_level - 1)
+        if not include_self:
+            queryset = queryset.exclude(pk=self.pk)
 
-        for category in categories:
-            collect_categories(category, levels)
+        if levels is not None:
+            queryset = queryset.filter(depth__lte=self.depth + levels)
 
-        return result
+        return queryset.order_by('path')
 
 
 class Inventory(models.Model):
     name = models.CharField(max_length=255)
     capacity = models.PositiveIntegerField()
+    product_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = InventoryManager()
 
     class Meta:
         verbose_name = 'Inventory'
@@ -95,23 +153,121 @@ class Product(TimeStampMixin, LogicalMixin, models.Model):
     image = models.ImageField(upload_to='product_media/', null=False, blank=False, default='product_media/default.png')
     about = models.TextField()
     quantity = models.PositiveIntegerField(default=0)
+    reserved_quantity = models.PositiveIntegerField(default=0, editable=False)
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, editable=False)
     is_active = models.BooleanField(default=True)
     is_deleted = models.BooleanField(default=False)
 
+    objects = ProductManager()
+
     class Meta:
         verbose_name = 'Product'
         verbose_name_plural = 'Products'
 
+        indexes = [
+            models.Index(fields=['-create_at', '-id'], name='shop_product_create_at_id_idx'),
+            models.Index(fields=['effective_price', 'id'], name='shop_product_eff_price_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+    @property
+    def available_quantity(self):
+        return max(self.quantity - self.reserved_quantity, 0)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+
+        instance = super().from_db(db, field_names, values)
+        if 'inventory_id' in field_names and 'is_deleted' in field_names:
+            instance._loaded_inventory_slot = instance.inventory_slot
+        if 'price' in field_names:
+            instance._loaded_price = instance.price
+        if 'category_id' in field_names:
+            instance._loaded_category_id = instance.category_id
+        return instance
+
+    @staticmethod
+    def compute_effective_price(price, discount_percentage=None):
+
+        discounted = Decimal(str(price)) * (100 - Decimal(str(discount_percentage or 0))) / 100
+        return discounted.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+    def best_discount_percentage(self):
+
+        """
+        The largest of the product's own discount and the live discount rules covering it or its category subtree.
+        """
+
+        percentages = []
+        covering = Exists(Category.objects.filter(pk=self.category_id, path__startswith=OuterRef('categories__path')))
+
+        if not self._state.adding:
+            percentages.append(
+                Discount.objects.filter(product_id=self.pk).values_list('discount_percentage', flat=True).first()
+            )
+            covering |= Q(products=self.pk)
+
+        percentages.append(
+            DiscountRule.objects.filter(covering, is_live=True).aggregate(best=Max('discount_percentage'))['best']
+        )
+
+        return max((percentage for percentage in percentages if percentage is not None), default=None)
+
+    def refresh_effective_price(self):
+
+        self.effective_price = self.compute_effective_price(self.price, self.best_discount_percentage())
+
+    @property
+    def inventory_slot(self):
+
+        """
+        The inventory this product is counted in: none once it is logically deleted.
+        """
+
+        return None if self.is_deleted else self.inventory_id
+
+    def loaded_inventory_slot(self):
+
+        if self._state.adding:
+            return None
+
+        if not hasattr(self, '_loaded_inventory_slot'):
+            inventory_id, is_deleted = Product.objects.archived.filter(pk=self.pk).values_list(
+                'inventory_id', 'is_deleted'
+            ).first() or (None, False)
+            self._loaded_inventory_slot = None if is_deleted else inventory_id
+
+        return self._loaded_inventory_slot
+
     def save(self, *args, **kwargs):
-        if self.inventory:
-            current_count = self.inventory.product.count()
-            if current_count >= self.inventory.capacity:
+
+        update_fields = kwargs.get('update_fields')
+
+        if update_fields is None or {'price', 'category', 'category_id'} & set(update_fields):
+            if (
+                self._state.adding
+                or getattr(self, '_loaded_price', None) != self.price
+                or getattr(self, '_loaded_category_id', None) != self.category_id
+            ):
+                self.refresh_effective_price()
+                if update_fields is not None:
+                    kwargs['update_fields'] = update_fields = {*update_fields, 'effective_price'}
+            self._loaded_price, self._loaded_category_id = self.price, self.category_id
+
+        if update_fields is not None and not {'inventory', 'inventory_id', 'is_deleted'} & set(update_fields):
+            return super().save(*args, **kwargs)
+
+        old_slot, new_slot = self.loaded_inventory_slot(), self.inventory_slot
+
+        with transaction.atomic():
+            if old_slot != new_slot and not Inventory.objects.move_product(old_slot, new_slot):
                 raise ValidationError('Inventory capacity exceeded for this product.')
-        super().save(*args, **kwargs)
+            super().save(*args, **kwargs)
+
+        self._loaded_inventory_slot = new_slot
 
     def delete(self, using=None, keep_parents=False):
         """
@@ -150,33 +306,18 @@ class Order(LogicalMixin, models.Model):
 
     def create_order_items(self, cart):
 
-        total_price = 0
-
-        for product_id, item in cart.items():
-            product = get_object_or_404(Product, id=product_id)
-            if product.quantity < item['quantity']:
-                raise ValidationError(f'Not enough quantity for product {product.name}')
-
-            if hasattr(product, 'discount'):
-                price = product.price * (1 - product.discount.discount_percentage / 100)
-            else:
-                price = product.price
-
-            OrderItem.objects.create(
-                product=product,
-                order=self,
-                quantity=item['quantity'],
-                price=price
-            )
+        """
+        Add the lines of a cart to the order through the checkout engine and return the new order total.
+        """
 
-            total_price += float(price) * item['quantity']
+        from .checkout import CheckoutError, place_order
 
-            product.quantity -= item['quantity']
-            product.save()
+        try:
+            place_order(self, cart)
+        except CheckoutError as e:
+            raise ValidationError(str(e))
 
-        self.total_price = total_price
-        self.save()
-        return total_price
+        return self.total_price
 
 
 class OrderItem(models.Model):
@@ -197,10 +338,7 @@ class OrderItem(models.Model):
         if self.quantity > self.product.quantity:
             raise ValidationError(f"Insufficient quantity available for {self.product.name}.")
 
-        if hasattr(self.product, 'discount'):
-            self.price = self.product.price * (1 - self.product.discount.discount_percentage / 100)
-        else:
-            self.price = self.product.price * self.quantity
+        self.price = self.product.effective_price * self.quantity
 
         super().save(*args, **kwargs)
 
@@ -237,33 +375,53 @@ class Coupon(models.Model):
     def __str__(self):
         return f"{self.coupon_code} - {self.amount_of_discount}"
 
-    def save(self, *args, **kwargs):
+    objects = CouponManager()
+
+    CODE_ATTEMPTS = 5
 
-        if not (1 <= self.amount_of_discount <= 1000000):
+    @staticmethod
+    def validate_amount(amount_of_discount):
+
+        if not (1 <= amount_of_discount <= 1000000):
             raise ValidationError("Amount of discount must be between $1 and $1,000,000.")
 
-        while not self.coupon_code:
-            code = generate_coupon_code()
+    @staticmethod
+    def rarity_for(amount_of_discount):
+
+        if 1 <= amount_of_discount <= 10:
+            return 'Common'
+        elif 11 <= amount_of_discount <= 100:
+            return 'Uncommon'
+        elif 101 <= amount_of_discount <= 1000:
+            return 'Rare'
+        elif 1001 <= amount_of_discount <= 10000:
+            return 'Epic'
+        elif 10001 <= amount_of_discount <= 1000000:
+            return 'Legendary'
+        return None
+
+    def save(self, *args, **kwargs):
+
+        self.validate_amount(self.amount_of_discount)
+
+        if not self.coupon_code:
+            self.coupon_code = generate_coupon_code()
+
+        self.rarity = self.rarity_for(self.amount_of_discount)
+
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+
+        # A new coupon may draw a code that is already taken; the insert runs in a savepoint so a collision only
+        # rolls back this attempt, and a fresh code is drawn a bounded number of times.
+        for attempt in range(1, self.CODE_ATTEMPTS + 1):
             try:
-                self.coupon_code = code
-                super().save(*args, **kwargs)
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
             except IntegrityError:
-                pass
-
-        if 1 <= self.amount_of_discount <= 10:
-            self.rarity = 'Common'
-        elif 11 <= self.amount_of_discount <= 100:
-            self.rarity = 'Uncommon'
-        elif 101 <= self.amount_of_discount <= 1000:
-            self.rarity = 'Rare'
-        elif 1001 <= self.amount_of_discount <= 10000:
-            self.rarity = 'Epic'
-        elif 10001 <= self.amount_of_discount <= 1000000:
-            self.rarity = 'Legendary'
-        else:
-            self.rarity = None
-
-        super().save(*args, **kwargs)
+                if attempt == self.CODE_ATTEMPTS or not Coupon.objects.filter(coupon_code=self.coupon_code).exists():
+                    raise
+                self.coupon_code = generate_coupon_code()
 
     class Meta:
         verbose_name = 'Coupon'
@@ -326,35 +484,43 @@ class Cart(TimeStampMixin, LogicalMixin, models.Model):
     def deactivate_related_objects(self):
 
         """
-        Deactivate related objects when the cart is inactive.
+        Deactivate related objects when the cart is inactive, skipping those already inactive.
         """
 
-        if self.order:
+        if self.order_id and self.order.is_active:
+            Order.objects.filter(pk=self.order_id).update(is_active=False)
             self.order.is_active = False
-            self.order.save(update_fields=['is_active'])
 
-        if self.coupon:
+        # Coupons redeemed at confirmation are already inactive. Others are saved, so their cached lookup is cleared.
+        if self.coupon_id and self.coupon.is_active:
             self.coupon.is_active = False
             self.coupon.save(update_fields=['is_active'])
 
-    def calculate_total_price(self):
+    def compute_total_price(self):
 
         """
-        Calculate the total price of the cart based on order items and applied coupon (if any).
+        The sum of the order items, aggregated in the database, less the coupon of the cart.
+        The coupon of a cart is used up by it, so it counts even once it is inactive.
         """
 
         total_price = 0
 
-        if self.order:
-            order_items = self.order.order_items.all()
-            for item in order_items:
-                total_price += item.price
+        if self.order_id:
+            total_price = self.order.order_items.aggregate(total=Sum('price'))['total'] or 0
 
-        if self.coupon and self.coupon.is_active:
+        if self.coupon_id:
             total_price -= self.coupon.amount_of_discount
 
-        self.total_price = total_price
-        self.save(update_fields=['total_price'])
+        return total_price
+
+    def calculate_total_price(self):
+
+        """
+        Calculate the total price of the cart based on order items and applied coupon (if any).
+        """
+
+        self.total_price = self.compute_total_price()
+        Cart.objects.filter(pk=self.pk).update(total_price=self.total_price)
 
 
 class Wishlist(TimeStampMixin, models.Model):
@@ -397,3 +563,153 @@ class WishlistProduct(models.Model):
 
     def __str__(self):
         return f'{self.wishlist.user.username} - {self.product.name}'
+
+
+class CartItem(models.Model):
+
+    """
+    A line of a user cart, used by shop.cart_store.DatabaseCartStore.
+    """
+
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='cart_items'
+    )
+
+    product = models.ForeignKey(
+        'Product',
+        on_delete=models.CASCADE,
+        related_name='cart_items'
+    )
+
+    quantity = models.PositiveIntegerField(default=1)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        verbose_name = 'Cart Item'
+        verbose_name_plural = 'Cart Items'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='shop_cartitem_user_product_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.product} x {self.quantity}'
+
+
+class StockReservation(models.Model):
+
+    """
+    A time-limited hold on the stock of a product, counted in Product.reserved_quantity until it expires.
+    """
+
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='stock_reservations'
+    )
+
+    product = models.ForeignKey(
+        'Product',
+        on_delete=models.CASCADE,
+        related_name='reservations'
+    )
+
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = 'Stock Reservation'
+        verbose_name_plural = 'Stock Reservations'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='shop_reservation_user_product_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.product} x {self.quantity} until {self.expires_at}'
+
+
+class OrderSnapshot(models.Model):
+
+    """
+    Read-only copy of an order as it was bought: product names, prices and discounts are stored in 'document'
+    so order history is served from this table alone. Drafts are rewritten at each checkout; once the order is
+    confirmed the snapshot is final and never changes again.
+    """
+
+    order = models.OneToOneField(
+        Order,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='snapshot'
+    )
+
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='order_snapshots'
+    )
+
+    order_date = models.DateTimeField()
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    is_final = models.BooleanField(default=False)
+    document = models.JSONField(default=dict)
+
+    class Meta:
+        verbose_name = 'Order Snapshot'
+        verbose_name_plural = 'Order Snapshots'
+        indexes = [
+            models.Index(fields=['user', 'is_final', '-order_date', '-order'], name='shop_snapshot_history_idx'),
+        ]
+
+    def __str__(self):
+        return f'Snapshot of order {self.order_id}'
+
+
+class DiscountRule(models.Model):
+
+    """
+    A scheduled discount for a set of products and/or whole category subtrees, live between starts_at and ends_at.
+
+    'is_live' is switched by shop.discounts.sync_discount_rules, which also recomputes the effective price of the
+    products the rule covers. When several discounts apply to a product, the largest one wins.
+    """
+
+    name = models.CharField(max_length=255)
+    discount_percentage = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        validators=[MinValueValidator(0), MaxValueValidator(100)]
+    )
+    starts_at = models.DateTimeField()
+    ends_at = models.DateTimeField(null=True, blank=True)
+    is_live = models.BooleanField(default=False, editable=False)
+
+    products = models.ManyToManyField(
+        Product,
+        blank=True,
+        related_name='discount_rules'
+    )
+
+    categories = models.ManyToManyField(
+        Category,
+        blank=True,
+        related_name='discount_rules'
+    )
+
+    objects = DiscountRuleManager()
+
+    class Meta:
+        verbose_name = 'Discount Rule'
+        verbose_name_plural = 'Discount Rules'
+        indexes = [
+            models.Index(fields=['is_live', 'starts_at'], name='shop_discountrule_start_idx'),
+            models.Index(fields=['is_live', 'ends_at'], name='shop_discountrule_end_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} - {self.discount_percentage}%'
+
+    def clean(self):
+        if self.ends_at and self.ends_at <= self.starts_at:
+            raise ValidationError(_('A discount rule must end after it starts.'))
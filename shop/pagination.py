@@ -0,0 +1,76 @@
+import base64
+import binascii
+from dataclasses import dataclass
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+@dataclass
+class KeysetPage:
+
+    object_list: list
+    next_cursor: str | None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+class KeysetPaginator:
+
+    """
+    Cursor (keyset) pagination over a (timestamp, id) pair, newest first.
+
+    Each page is fetched with a single indexed range query instead of an OFFSET, so the cost of a page does
+    not grow with its position in the listing and rows inserted meanwhile never shift or repeat items.
+    """
+
+    def __init__(self, queryset, page_size, field='create_at'):
+
+        self.queryset = queryset.order_by(f'-{field}', '-pk')
+        self.page_size = page_size
+        self.field = field
+
+    def get_page(self, cursor=None):
+
+        queryset = self.queryset
+
+        if cursor:
+            value, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__lt': value}) | Q(**{self.field: value, 'pk__lt': pk})
+            )
+
+        object_list = list(queryset[:self.page_size + 1])
+
+        next_cursor = None
+        if len(object_list) > self.page_size:
+            object_list = object_list[:self.page_size]
+            last = object_list[-1]
+            next_cursor = self.encode_cursor(getattr(last, self.field), last.pk)
+
+        return KeysetPage(object_list, next_cursor)
+
+    @staticmethod
+    def encode_cursor(value, pk):
+
+        return base64.urlsafe_b64encode(f'{value.isoformat()}|{pk}'.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+
+        try:
+            value, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            value = parse_datetime(value)
+            pk = int(pk)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise InvalidCursor('Invalid cursor.')
+
+        if value is None:
+            raise InvalidCursor('Invalid cursor.')
+
+        return value, pk
@@ -0,0 +1,130 @@
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Case, F, When
+from django.utils import timezone
+from .models import Product, StockReservation
+
+
+class InsufficientStock(ValueError):
+    pass
+
+
+def change_hold(user_id, product_id, get_quantity, now=None):
+
+    """
+    Set the hold of a user on a product to get_quantity(current hold) and restart its time to live.
+
+    Only the reservation row and the product row are touched, both by primary or unique key: stock is taken with
+    a conditional UPDATE of Product.reserved_quantity, so the available stock can never go below zero.
+    """
+
+    now = now or timezone.now()
+
+    with transaction.atomic():
+        reservation = StockReservation.objects.select_for_update().filter(
+            user_id=user_id, product_id=product_id
+        ).first()
+        current = reservation.quantity if reservation else 0
+        quantity = max(get_quantity(current), 0)
+        delta = quantity - current
+
+        if delta > 0:
+            taken = Product.objects.filter(
+                id=product_id, is_active=True, quantity__gte=F('reserved_quantity') + delta
+            ).update(reserved_quantity=F('reserved_quantity') + delta)
+            if not taken:
+                raise InsufficientStock('Not enough stock available for this product')
+        elif delta < 0:
+            Product.objects.archived.filter(id=product_id).update(reserved_quantity=F('reserved_quantity') + delta)
+
+        if not quantity:
+            if reservation:
+                reservation.delete()
+            return 0
+
+        expires_at = now + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+
+        if reservation:
+            reservation.quantity, reservation.expires_at = quantity, expires_at
+            reservation.save(update_fields=['quantity', 'expires_at'])
+        else:
+            StockReservation.objects.create(
+                user_id=user_id, product_id=product_id, quantity=quantity, expires_at=expires_at
+            )
+
+        return quantity
+
+
+def hold(user_id, product_id, quantity, now=None):
+    return change_hold(user_id, product_id, lambda current: quantity, now)
+
+
+def extend_hold(user_id, product_id, amount=1, now=None):
+    return change_hold(user_id, product_id, lambda current: current + amount, now)
+
+
+def hold_available(user_id, quantities):
+
+    """
+    Extend the holds of a user by {product_id: quantity}, each clamped to the stock still available.
+    Returns the (product, quantity) pairs actually held; inactive and sold out products are left out.
+    """
+
+    products = Product.objects.filter(id__in=quantities, is_active=True).in_bulk()
+    held = []
+
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
+        quantity = min(quantity, product.available_quantity) if product else 0
+        if quantity < 1:
+            continue
+        try:
+            extend_hold(user_id, product_id, quantity)
+        except InsufficientStock:
+            # Another user took the stock since it was read.
+            continue
+        held.append((product, quantity))
+
+    return held
+
+
+def release(user_id, product_id):
+    return change_hold(user_id, product_id, lambda current: 0)
+
+
+def release_expired(now=None, batch_size=1000):
+
+    """
+    Give the stock of expired holds back, 'batch_size' holds per transaction: one query picks the expired holds
+    through the expires_at index, one UPDATE returns their stock and one DELETE drops them.
+    """
+
+    now = now or timezone.now()
+    released = 0
+
+    while True:
+        with transaction.atomic():
+            batch = list(
+                StockReservation.objects.select_for_update().filter(expires_at__lte=now)
+                .order_by('expires_at', 'id').values_list('id', 'product_id', 'quantity')[:batch_size]
+            )
+            if not batch:
+                return released
+
+            quantities = Counter()
+            for _, product_id, quantity in batch:
+                quantities[product_id] += quantity
+
+            Product.objects.archived.filter(id__in=quantities).update(
+                reserved_quantity=Case(
+                    *(When(id=product_id, then=F('reserved_quantity') - quantity)
+                      for product_id, quantity in quantities.items()),
+                    default=F('reserved_quantity'),
+                    output_field=models.PositiveIntegerField(),
+                )
+            )
+            StockReservation.objects.filter(id__in=[pk for pk, _, _ in batch]).delete()
+
+        released += len(batch)
@@ -1,54 +1,42 @@
 from rest_framework import serializers
 from .models import (
-    Order,
-    OrderItem,
+    OrderSnapshot,
     Product
 )
 
 
-class ProductNameSerializer(serializers.ModelSerializer):
+class ProductSerializer(serializers.ModelSerializer):
 
-    class Meta:
-        model = Product
-        fields = ['id', 'name']
-
-
-class OrderItemSerializer(serializers.ModelSerializer):
-
-    product = ProductNameSerializer(read_only=True)
-
-    class Meta:
-        model = OrderItem
-        fields = '__all__'
-
-
-class OrderSerializer(serializers.ModelSerializer):
-
-    order_items = OrderItemSerializer(many=True, read_only=True)
+    discount_percentage = serializers.SerializerMethodField()
+    effective_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
 
     class Meta:
-        model = Order
-        fields = '__all__'
-
+        model = Product
+        fields = [
+            'id', 'name', 'about', 'image', 'price', 'discount_percentage', 'effective_price', 'is_active', 'create_at'
+        ]
 
-class ShowOrderItemSerializer(serializers.ModelSerializer):
+    # noinspection PyMethodMayBeStatic
+    def get_discount_percentage(self, obj):
 
-    product_name = serializers.CharField(source='product.name')
+        # Catalog querysets annotate the discount that won; other products look it up.
+        percentage = getattr(obj, 'discount_percentage', None)
+        if percentage is None:
+            percentage = obj.best_discount_percentage()
 
-    class Meta:
-        model = OrderItem
-        fields = ['product_name', 'quantity', 'price']
+        return f'{percentage:.2f}' if percentage else None
 
 
-class ShowOrderSerializer(serializers.ModelSerializer):
+class OrderSnapshotSerializer(serializers.ModelSerializer):
 
+    id = serializers.IntegerField(source='pk', read_only=True)
     status = serializers.SerializerMethodField()
-    order_items = ShowOrderItemSerializer(many=True, read_only=True)
+    order_items = serializers.ListField(source='document.items', read_only=True)
 
     class Meta:
-        model = Order
+        model = OrderSnapshot
         fields = ['id', 'order_date', 'total_price', 'status', 'order_items']
 
     # noinspection PyMethodMayBeStatic
     def get_status(self, obj):
-        return 'still active' if obj.is_active else 'closed'
+        return 'closed' if obj.is_final else 'still active'
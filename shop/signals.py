@@ -0,0 +1,102 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from .cache import bump_catalog_version, invalidate_category_tree, invalidate_coupons, invalidate_order_history
+from .discounts import refresh_prices, refresh_rule_prices
+from .models import Category, Coupon, Discount, DiscountRule, Inventory, OrderSnapshot, Product
+
+
+# noinspection PyUnusedLocal
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, **kwargs):
+
+    invalidate_category_tree()
+    bump_catalog_version()
+
+
+# noinspection PyUnusedLocal
+@receiver([post_save, post_delete], sender=Coupon)
+def coupon_changed(sender, instance, **kwargs):
+    invalidate_coupons(instance.coupon_code)
+
+
+# noinspection PyUnusedLocal
+@receiver(post_save, sender=Product)
+def product_saved(sender, **kwargs):
+    bump_catalog_version()
+
+
+# noinspection PyUnusedLocal
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+
+    if instance.inventory_slot is not None:
+        Inventory.objects.move_product(instance.inventory_slot, None)
+    bump_catalog_version()
+
+
+# noinspection PyUnusedLocal
+@receiver(post_delete, sender=OrderSnapshot)
+def order_snapshot_deleted(sender, instance, **kwargs):
+
+    # Only final snapshots are cached; drafts of active orders are always read from the database.
+    if instance.is_final:
+        invalidate_order_history(instance.user_id)
+
+
+# noinspection PyUnusedLocal
+@receiver([post_save, post_delete], sender=Discount)
+def discount_changed(sender, instance, **kwargs):
+
+    Product.objects.archived.filter(pk=instance.product_id).update_effective_prices()
+    bump_catalog_version()
+
+
+# noinspection PyUnusedLocal
+@receiver(post_save, sender=DiscountRule)
+def discount_rule_saved(sender, instance, created, **kwargs):
+
+    # A new rule covers nothing until its products and categories are set.
+    if not created:
+        refresh_rule_prices(DiscountRule.objects.filter(pk=instance.pk))
+
+
+# noinspection PyUnusedLocal
+@receiver(pre_delete, sender=DiscountRule)
+def discount_rule_deleted(sender, instance, **kwargs):
+
+    if DiscountRule.objects.filter(pk=instance.pk, is_live=True).update(is_live=False):
+        refresh_rule_prices(DiscountRule.objects.filter(pk=instance.pk))
+
+
+def discount_rule_targets_changed(relation, field, instance, action, reverse, pk_set):
+
+    """
+    Reprice the products whose coverage changed when the products or categories of a live rule are edited.
+    """
+
+    if reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            refresh_prices(**{field: [instance.pk]})
+        return
+
+    if not DiscountRule.objects.filter(pk=instance.pk, is_live=True).exists():
+        return
+
+    if action == 'pre_clear':
+        instance._cleared_targets = list(getattr(instance, relation).values_list('pk', flat=True))
+    elif action == 'post_clear':
+        refresh_prices(**{field: getattr(instance, '_cleared_targets', [])})
+    elif action in ('post_add', 'post_remove'):
+        refresh_prices(**{field: pk_set})
+
+
+# noinspection PyUnusedLocal
+@receiver(m2m_changed, sender=DiscountRule.products.through)
+def discount_rule_products_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    discount_rule_targets_changed('products', 'product_ids', instance, action, reverse, pk_set)
+
+
+# noinspection PyUnusedLocal
+@receiver(m2m_changed, sender=DiscountRule.categories.through)
+def discount_rule_categories_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    discount_rule_targets_changed('categories', 'category_ids', instance, action, reverse, pk_set)
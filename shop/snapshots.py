@@ -0,0 +1,111 @@
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from .cache import invalidate_order_history
+from .models import OrderItem, OrderSnapshot, Product
+
+
+def snapshot_item_queryset(queryset=None):
+
+    """
+    Order items with what snapshot_items() needs: their product, and as 'discount_percentage' the discount that won
+    when the order was priced, the product's own or a discount rule's, as in the product's effective price.
+    """
+
+    queryset = OrderItem.objects.all() if queryset is None else queryset
+
+    return queryset.select_related('product').annotate(
+        discount_percentage=Product.objects.discount_percentage_expression('product__')
+    )
+
+
+def snapshot_items(order_items):
+
+    """
+    Describe order items as stored in a snapshot. Items must come from snapshot_item_queryset().
+    """
+
+    items = []
+
+    for item in order_items:
+        discount = Decimal(item.discount_percentage or 0).quantize(Decimal('0.01'))
+        items.append({
+            'product_id': item.product_id,
+            'product_name': item.product.name,
+            'quantity': item.quantity,
+            'unit_price': str((item.price / item.quantity).quantize(Decimal('0.01'))) if item.quantity else '0.00',
+            'discount_percentage': str(discount) if discount else None,
+            'price': str(item.price),
+        })
+
+    return items
+
+
+def cart_details(cart):
+
+    return {
+        'coupon': cart.coupon.coupon_code if cart.coupon else None,
+        'paid_price': str(cart.total_price),
+    }
+
+
+def build_document(order, order_items=None, cart=None):
+
+    if order_items is None:
+        order_items = snapshot_item_queryset().filter(order=order).order_by('id')
+
+    document = {'items': snapshot_items(order_items)}
+
+    if cart is not None:
+        document.update(cart_details(cart))
+
+    return document
+
+
+def draft_snapshot(order):
+
+    """
+    An unsaved draft snapshot of 'order', for reading orders that do not have one without writing it.
+    """
+
+    return OrderSnapshot(
+        order=order, user_id=order.user_id, order_date=order.order_date, total_price=order.total_price,
+        document=build_document(order), is_final=False,
+    )
+
+
+def take_snapshot(order, final=False, cart=None, order_items=None):
+
+    """
+    Write the snapshot of an order: a draft at each checkout, and the final copy when it is confirmed.
+    Finalizing keeps the lines of the draft, as they were when the products were put in the order.
+    Final snapshots are append-only and are never rewritten.
+    """
+
+    draft = None
+    if final and order_items is None:
+        draft = OrderSnapshot.objects.filter(order=order, is_final=False).values_list('document', flat=True).first()
+
+    if draft is not None:
+        document = {**draft, **(cart_details(cart) if cart is not None else {})}
+    else:
+        document = build_document(order, order_items, cart)
+
+    values = {'document': document, 'total_price': order.total_price, 'is_final': final}
+
+    with transaction.atomic():
+        updated = OrderSnapshot.objects.filter(order=order, is_final=False).update(**values)
+
+        if not updated:
+            try:
+                with transaction.atomic():
+                    OrderSnapshot.objects.create(
+                        order=order, user_id=order.user_id, order_date=order.order_date, **values
+                    )
+            except IntegrityError:
+                # The order already has a final snapshot.
+                return None
+
+    if final:
+        invalidate_order_history(order.user_id)
+
+    return document
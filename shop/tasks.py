@@ -0,0 +1,19 @@
+from celery import shared_task
+from .discounts import sync_discount_rules as sync_rules
+from .reservations import release_expired
+
+
+# noinspection PyUnusedLocal
+@shared_task(bind=True)
+def release_expired_reservations(self, batch_size=1000):
+
+    released = release_expired(batch_size=batch_size)
+    return f"Released {released} expired stock reservations."
+
+
+# noinspection PyUnusedLocal
+@shared_task(bind=True)
+def sync_discount_rules(self):
+
+    switched = sync_rules()
+    return f"Switched {switched} discount rules."
@@ -1,6 +1,6 @@
 from django import template
 from django.utils.safestring import mark_safe
-from django.urls import reverse
+from shop.cache import get_subcategories_html
 
 register = template.Library()
 
@@ -8,19 +8,4 @@ register = template.Library()
 @register.filter(name='show_subcategories')
 def show_subcategories(category):
 
-    subcategories = category.subcategories.all()
-
-    if not subcategories:
-        return ''
-
-    html = '<div class="ml-4">'
-
-    for sub in subcategories:
-
-        url = reverse('shop:category_products', args=[sub.id])
-        sub_html = show_subcategories(sub)
-        html += f'<p><a href="{url}" class="text-blue-500 hover:text-blue-700">{sub.name}</a></p>{sub_html}'
-
-    html += '</div>'
-
-    return mark_safe(html)
+    return mark_safe(get_subcategories_html(category.id))
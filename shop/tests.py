@@ -7,16 +7,45 @@ from .models import (
     Inventory,
     Product,
     Discount,
+    DiscountRule,
     Order,
     OrderItem,
+    OrderSnapshot,
     Coupon,
     Cart,
+    StockReservation,
     Wishlist,
     WishlistProduct
 )
+from .cart_store import DatabaseCartStore, InMemoryCartStore, RedisCartStore, UserCart, get_cart_store
+from .checkout import CheckoutError, CouponUnavailable, confirm_order, place_order
+from .discounts import sync_discount_rules
+from .reservations import InsufficientStock, extend_hold, hold, release, release_expired
+from .snapshots import take_snapshot
+from .templatetags.category_tags import show_subcategories
+from .throttling import CacheBucketStore, InMemoryBucketStore, get_bucket_store
+from django.contrib.messages import constants as message_constants
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import caches
 from django.core.exceptions import ValidationError
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection
+from django.http import HttpRequest, HttpResponse
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from datetime import timedelta
 from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+import threading
+
+
+def clear_caches():
+
+    for cache in caches.all():
+        cache.clear()
 
 
 class CategoryModelTest(TestCase):
@@ -57,371 +86,1327 @@ class CategoryModelTest(TestCase):
             Category.objects.get(name='Test Category')
 
 
-class InventoryModelTest(TestCase):
-
-    def test_create_inventory(self):
+class CategoryTreeTest(TestCase):
 
-        inventory = Inventory.objects.create(name='Test Inventory', capacity=100)
+    def setUp(self):
 
-        self.assertEqual(inventory.name, 'Test Inventory')
-        self.assertEqual(inventory.capacity, 100)
+        self.root = Category.objects.create(name='Root')
+        self.child = Category.objects.create(name='Child', parent_category=self.root)
+        self.grandchild = Category.objects.create(name='Grandchild', parent_category=self.child)
+        self.other_root = Category.objects.create(name='Other Root')
 
-    def test_read_inventory(self):
+    def test_path_and_depth_on_create(self):
 
-        inventory = Inventory.objects.create(name='Test Inventory', capacity=100)
+        self.assertEqual(self.root.path, f'/{self.root.id}/')
+        self.assertEqual(self.grandchild.path, f'/{self.root.id}/{self.child.id}/{self.grandchild.id}/')
+        self.assertEqual(self.root.depth, 0)
+        self.assertEqual(self.grandchild.depth, 2)
 
-        retrieved_inventory = Inventory.objects.get(name='Test Inventory')
+    def test_get_descendants_single_query(self):
 
-        self.assertEqual(inventory, retrieved_inventory)
+        with self.assertNumQueries(1):
+            descendants = list(self.root.get_descendants(include_self=True))
 
-    def test_update_inventory(self):
+        self.assertEqual(descendants, [self.root, self.child, self.grandchild])
 
-        inventory = Inventory.objects.create(name='Test Inventory', capacity=100)
+    def test_get_descendants_levels(self):
 
-        inventory.name = 'Updated Test Inventory'
-        inventory.capacity = 200
-        inventory.save()
+        self.assertEqual(list(self.root.get_descendants(levels=1)), [self.child])
 
-        updated_inventory = Inventory.objects.get(name='Updated Test Inventory')
+    def test_get_ancestors(self):
 
-        self.assertEqual(updated_inventory.name, 'Updated Test Inventory')
-        self.assertEqual(updated_inventory.capacity, 200)
+        with self.assertNumQueries(1):
+            ancestors = list(self.grandchild.get_ancestors())
 
-    def test_delete_inventory(self):
+        self.assertEqual(ancestors, [self.root, self.child])
 
-        inventory = Inventory.objects.create(name='Test Inventory', capacity=100)
+    def test_calculate_max_depth(self):
 
-        inventory.delete()
+        self.assertEqual(Category.calculate_max_depth(self.root), 2)
+        self.assertEqual(Category.calculate_max_depth(self.grandchild), 0)
 
-        # noinspection PyTypeChecker
-        with self.assertRaises(Inventory.DoesNotExist):
-            Inventory.objects.get(name='Test Inventory')
+    def test_move_subtree(self):
 
+        self.child.parent_category = self.other_root
+        self.child.save()
 
-class ProductModelTest(TestCase):
+        self.grandchild.refresh_from_db()
 
-    def setUp(self):
-        self.user = CustomUser.objects.create(username='test_user', email='test@example.com')
-        self.category = Category.objects.create(name='Test Category')
-        self.inventory = Inventory.objects.create(name='Test Inventory', capacity=100)
+        self.assertEqual(self.grandchild.path, f'/{self.other_root.id}/{self.child.id}/{self.grandchild.id}/')
+        self.assertEqual(list(self.root.get_descendants()), [])
+        self.assertEqual(list(self.other_root.get_descendants()), [self.child, self.grandchild])
 
-    def test_create_product(self):
+    def test_move_to_root(self):
 
-        product = Product.objects.create(
-            category=self.category,
-            user=self.user,
-            inventory=self.inventory,
-            name='Test Product',
-            about='Test Description',
-            quantity=50,
-            price=10.99
-        )
+        self.child.parent_category = None
+        self.child.save()
 
-        self.assertEqual(product.name, 'Test Product')
-        self.assertEqual(product.quantity, 50)
-        self.assertEqual(product.price, 10.99)
+        self.grandchild.refresh_from_db()
 
-    def test_read_product(self):
+        self.assertEqual(self.child.depth, 0)
+        self.assertEqual(self.grandchild.depth, 1)
 
-        product = Product.objects.create(
-            category=self.category,
-            user=self.user,
-            inventory=self.inventory,
-            name='Test Product',
-            about='Test Description',
-            quantity=50,
-            price=10.99
-        )
+    def test_move_under_descendant(self):
 
-        retrieved_product = Product.objects.get(name='Test Product')
+        self.root.parent_category = self.grandchild
 
-        self.assertEqual(product, retrieved_product)
+        with self.assertRaises(ValidationError):
+            self.root.save()
 
-    def test_update_product(self):
+    def test_delete_subtree(self):
 
-        product = Product.objects.create(
-            category=self.category,
-            user=self.user,
-            inventory=self.inventory,
-            name='Test Product',
-            about='Test Description',
-            quantity=50,
-            price=10.99
-        )
+        self.child.delete()
 
-        product.name = 'Updated Test Product'
-        product.price = 15.99
-        product.save()
+        self.assertEqual(list(self.root.get_descendants()), [])
 
-        updated_product = Product.objects.get(name='Updated Test Product')
 
-        self.assertEqual(updated_product.name, 'Updated Test Product')
-        self.assertEqual(updated_product.price, Decimal('15.99'))
+class ProductInCategoryTest(TestCase):
 
-    def test_delete_product(self):
+    def setUp(self):
 
-        product = Product.objects.create(
-            category=self.category,
-            user=self.user,
-            inventory=self.inventory,
-            name='Test Product',
-            about='Test Description',
-            quantity=50,
-            price=10.99
+        self.user = CustomUser.objects.create(
+            username='seller', email='seller@example.com', phone_number='+989393214333'
         )
+        self.root = Category.objects.create(name='Root')
+        self.child = Category.objects.create(name='Child', parent_category=self.root)
+        self.grandchild = Category.objects.create(name='Grandchild', parent_category=self.child)
+        self.other_root = Category.objects.create(name='Other Root')
 
-        product.delete()
+        self.root_product = self.create_product(self.root, 'Root Product')
+        self.grandchild_product = self.create_product(self.grandchild, 'Grandchild Product')
+        self.other_product = self.create_product(self.other_root, 'Other Product')
 
-        # noinspection PyTypeChecker
-        with self.assertRaises(Product.DoesNotExist):
-            Product.objects.get(name='Test Product')
+    def create_product(self, category, name):
 
-        self.assertFalse(product.is_active)
-        self.assertTrue(product.is_deleted)
+        return Product.objects.create(category=category, user=self.user, name=name, about='About', price=10)
 
+    def test_in_category_includes_subtree(self):
 
-class DiscountModelTest(TestCase):
+        with self.assertNumQueries(1):
+            products = set(Product.objects.in_category(self.root.id))
 
-    def setUp(self):
+        self.assertEqual(products, {self.root_product, self.grandchild_product})
 
-        category = Category.objects.create(name='Test Category')
-        user = CustomUser.objects.create(username='test_user')
-        inventory = Inventory.objects.create(name='Test Inventory', capacity=100)
+    def test_in_category_of_subcategory(self):
 
-        self.product = Product.objects.create(
-            category=category,
-            user=user,
-            inventory=inventory,
-            name='Test Product',
-            about='Test Description',
-            quantity=50,
-            price=10.99
-        )
+        self.assertEqual(list(Product.objects.in_category(self.child.id)), [self.grandchild_product])
 
-    def test_create_discount(self):
+    def test_subtree_ids_without_self(self):
 
-        discount = Discount.objects.create(product=self.product, discount_percentage=20.00)
+        subtree = Category.objects.filter(id__in=Category.objects.subtree_ids(self.root.id, include_self=False))
 
-        self.assertEqual(discount.product.name, 'Test Product')
-        self.assertEqual(discount.discount_percentage, 20.00)
+        self.assertEqual(set(subtree), {self.child, self.grandchild})
 
-    def test_read_discount(self):
+    def test_category_products_view(self):
 
-        discount = Discount.objects.create(product=self.product, discount_percentage=20.00)
+        response = self.client.get(reverse('shop:category_products', args=[self.child.id]))
 
-        retrieved_discount = Discount.objects.get(product=self.product)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['products']), [self.grandchild_product])
 
-        self.assertEqual(discount, retrieved_discount)
 
-    def test_update_discount(self):
+class CategoryTreeCacheTest(TestCase):
 
-        discount = Discount.objects.create(product=self.product, discount_percentage=20.00)
+    def setUp(self):
 
-        discount.discount_percentage = 30.00
-        discount.save()
+        clear_caches()
 
-        updated_discount = Discount.objects.get(product=self.product)
+        self.root = Category.objects.create(name='Root')
+        self.child = Category.objects.create(name='Child', parent_category=self.root)
+        self.grandchild = Category.objects.create(name='Grandchild', parent_category=self.child)
 
-        self.assertEqual(updated_discount.discount_percentage, 30.00)
+    def test_first_render_single_query(self):
 
-    def test_delete_discount(self):
+        with self.assertNumQueries(1):
+            html = show_subcategories(self.root)
 
-        discount = Discount.objects.create(product=self.product, discount_percentage=20.00)
+        self.assertIn('Child', html)
+        self.assertIn('Grandchild', html)
+        self.assertIn(reverse('shop:category_products', args=[self.grandchild.id]), html)
 
-        discount.delete()
+    def test_cache_hit_without_queries(self):
 
-        # noinspection PyTypeChecker
-        with self.assertRaises(Discount.DoesNotExist):
-            Discount.objects.get(product=self.product)
+        show_subcategories(self.root)
 
+        with self.assertNumQueries(0):
+            show_subcategories(self.root)
+            show_subcategories(self.child)
 
-class OrderModelTest(TestCase):
+    def test_invalidated_on_save(self):
 
-    def test_create_order(self):
+        show_subcategories(self.root)
 
-        order = Order.objects.create(total_price=50.00)
+        Category.objects.create(name='New Child', parent_category=self.root)
 
-        self.assertIsNotNone(order)
-        self.assertEqual(order.total_price, 50.00)
+        self.assertIn('New Child', show_subcategories(self.root))
 
-    def test_read_order(self):
+    def test_invalidated_on_delete(self):
 
-        order = Order.objects.create(total_price=50.00)
+        show_subcategories(self.root)
 
-        retrieved_order = Order.objects.get(id=order.id)
+        self.grandchild.delete()
 
-        self.assertEqual(order, retrieved_order)
+        self.assertNotIn('Grandchild', show_subcategories(self.root))
 
-    def test_update_order(self):
+    def test_leaf_category(self):
 
-        order = Order.objects.create(total_price=50.00)
+        self.assertEqual(show_subcategories(self.grandchild), '')
 
-        order.total_price = 60.00
-        order.save()
+    def test_names_are_escaped(self):
 
-        updated_order = Order.objects.get(id=order.id)
+        Category.objects.create(name='<b>Bold</b>', parent_category=self.root)
 
-        self.assertEqual(updated_order.total_price, 60.00)
+        self.assertIn('&lt;b&gt;Bold&lt;/b&gt;', show_subcategories(self.root))
 
-    def test_delete_order(self):
 
-        order = Order.objects.create(total_price=50.00)
+@override_settings(PRODUCT_PAGE_SIZE=2)
+class ProductListPaginationTest(TestCase):
 
-        order.delete()
+    def setUp(self):
 
-        # noinspection PyTypeChecker
-        with self.assertRaises(Order.DoesNotExist):
-            Order.objects.get(id=order.id)
+        user = CustomUser.objects.create(username='seller', email='seller@example.com', phone_number='+989393214333')
+        category = Category.objects.create(name='Test Category')
 
+        self.products = [
+            Product.objects.create(category=category, user=user, name=f'Product {index}', about='About', price=10)
+            for index in range(5)
+        ]
 
-class OrderItemModelTest(TestCase):
+        # Same timestamp for every row, so ordering relies on the id tie-breaker.
+        Product.objects.update(create_at=timezone.now())
 
-    def setUp(self):
+    def collect_pages(self, url, key):
 
-        category = Category.objects.create(name='Test Category')
-        user = CustomUser.objects.create(username='test-user', email='test@example.com')
-        inventory = Inventory.objects.create(name='Test Inventory', capacity=100)
+        names, cursor = [], None
 
-        self.product = Product.objects.create(
-            category=category,
-            user=user,
-            inventory=inventory,
-            name='Test Product',
-            about='Test Description',
-            quantity=10,
-            price=20.00
-        )
-        self.order = Order.objects.create(total_price=0)
+        while True:
+            response = self.client.get(url, {'cursor': cursor} if cursor else {})
+            page = response.context['products'] if key is None else response.json()['results']
+            names += [product.name if key is None else product[key] for product in page]
+            cursor = response.context['next_cursor'] if key is None else response.json()['next_cursor']
+            if not cursor:
+                return names
 
-    def test_create_order_item(self):
+    def test_home_pages_are_stable_and_complete(self):
 
-        order_item = OrderItem.objects.create(product=self.product, order=self.order, quantity=2)
+        names = self.collect_pages(reverse('shop:home'), None)
 
-        self.assertIsNotNone(order_item)
-        self.assertEqual(order_item.product, self.product)
-        self.assertEqual(order_item.order, self.order)
-        self.assertEqual(order_item.quantity, 2)
-        self.assertEqual(order_item.price, 40.00)
+        self.assertEqual(names, [f'Product {index}' for index in reversed(range(5))])
 
-    def test_read_order_item(self):
+    def test_home_page_size(self):
 
-        order_item = OrderItem.objects.create(product=self.product, order=self.order, quantity=2)
+        response = self.client.get(reverse('shop:home'))
 
-        retrieved_order_item = OrderItem.objects.get(id=order_item.id)
+        self.assertEqual(len(response.context['products']), 2)
+        self.assertContains(response, 'id="load-more"')
 
-        self.assertEqual(order_item, retrieved_order_item)
+    def test_fragment_mode_returns_only_cards(self):
 
-    def test_update_order_item(self):
+        first_page = self.client.get(reverse('shop:home'))
+        response = self.client.get(
+            reverse('shop:home'), {'cursor': first_page.context['next_cursor'], 'fragment': 1}
+        )
 
-        order_item = OrderItem.objects.create(product=self.product, order=self.order, quantity=2)
+        self.assertNotContains(response, '<html')
+        self.assertContains(response, 'Product 2')
+        self.assertTrue(response['X-Next-Cursor'])
 
-        order_item.quantity = 3
-        order_item.save()
+    def test_invalid_cursor(self):
 
-        updated_order_item = OrderItem.objects.get(id=order_item.id)
+        response = self.client.get(reverse('shop:home'), {'cursor': 'not-a-cursor'})
 
-        self.assertEqual(updated_order_item.quantity, 3)
-        self.assertEqual(updated_order_item.price, 60.00)
+        self.assertEqual(response.status_code, 400)
 
-    def test_delete_order_item(self):
+    def test_api_pages_are_stable_and_complete(self):
 
-        order_item = OrderItem.objects.create(product=self.product, order=self.order, quantity=2)
+        names = self.collect_pages(reverse('shop:product-list-api'), 'name')
 
-        order_item.delete()
+        self.assertEqual(names, [f'Product {index}' for index in reversed(range(5))])
 
-        # noinspection PyTypeChecker
-        with self.assertRaises(OrderItem.DoesNotExist):
-            OrderItem.objects.get(id=order_item.id)
+    def test_api_invalid_cursor(self):
 
-    def test_save_order_item_insufficient_quantity(self):
+        response = self.client.get(reverse('shop:product-list-api'), {'cursor': 'not-a-cursor'})
 
-        with self.assertRaises(ValidationError):
-            OrderItem.objects.create(product=self.product, order=self.order, quantity=20)
+        self.assertEqual(response.status_code, 400)
 
 
-class CouponModelTest(TestCase):
+class CatalogQuerySetTest(TestCase):
+
     def setUp(self):
 
-        self.coupon_data = {
-            'amount_of_discount': 50,
-        }
+        self.user = CustomUser.objects.create(
+            username='seller', email='seller@example.com', phone_number='+989393214333'
+        )
+        self.category = Category.objects.create(name='Test Category')
 
-    def test_create_coupon(self):
+    def create_products(self, count):
 
-        coupon = Coupon.objects.create(**self.coupon_data)
-        self.assertTrue(isinstance(coupon, Coupon))
+        for index in range(count):
+            product = Product.objects.create(
+                category=self.category, user=self.user, name=f'Product {index}', about='About', price=100
+            )
+            if index % 2:
+                Discount.objects.create(product=product, discount_percentage=20)
 
-    def test_coupon_code_generation(self):
+    def count_queries(self, url):
 
-        coupon = Coupon.objects.create(**self.coupon_data)
-        self.assertIsNotNone(coupon.coupon_code)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
 
-    def test_coupon_amount_range(self):
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
 
-        coupon_data = {
-            'amount_of_discount': 1000001,
-        }
-        with self.assertRaises(ValidationError):
-            Coupon.objects.create(**coupon_data)
+    def test_effective_price(self):
 
-    def test_coupon_rarity_assignment(self):
+        self.create_products(2)
 
-        rarity_mapping = {
-            5: 'Common',
-            50: 'Uncommon',
-            500: 'Rare',
-            5000: 'Epic',
-            50000: 'Legendary'
-        }
-        for amount, rarity in rarity_mapping.items():
-            coupon_data = {'amount_of_discount': amount}
+        prices = dict(Product.objects.for_catalog().values_list('name', 'effective_price'))
 
-            coupon = Coupon.objects.create(**coupon_data)
-            self.assertEqual(coupon.rarity, rarity)
+        self.assertEqual(prices, {'Product 0': Decimal('100.00'), 'Product 1': Decimal('80.00')})
 
-    def test_read_coupon(self):
+    def test_discount_loaded_in_same_query(self):
 
-        coupon = Coupon.objects.create(**self.coupon_data)
-        retrieved_coupon = Coupon.objects.get(id=coupon.id)
-        self.assertEqual(coupon, retrieved_coupon)
+        self.create_products(4)
 
-    def test_update_coupon(self):
+        with self.assertNumQueries(1):
+            percentages = [
+                getattr(getattr(product, 'discount', None), 'discount_percentage', None)
+                for product in Product.objects.for_catalog()
+            ]
 
-        coupon = Coupon.objects.create(**self.coupon_data)
-        new_discount_amount = 75
-        coupon.amount_of_discount = new_discount_amount
-        coupon.save()
-        updated_coupon = Coupon.objects.get(id=coupon.id)
-        self.assertEqual(updated_coupon.amount_of_discount, new_discount_amount)
+        self.assertEqual(percentages.count(None), 2)
 
-    def test_delete_coupon(self):
+    def test_constant_query_count(self):
 
-        coupon = Coupon.objects.create(**self.coupon_data)
-        coupon_id = coupon.id
+        urls = [
+            reverse('shop:home'),
+            reverse('shop:category_products', args=[self.category.id]),
+            reverse('shop:product-list-api'),
+        ]
 
-        coupon.delete()
+        self.create_products(1)
+        few = [self.count_queries(url) for url in urls]
 
-        # noinspection PyTypeChecker
-        with self.assertRaises(Coupon.DoesNotExist):
-            Coupon.objects.get(id=coupon_id)
+        self.create_products(10)
+        many = [self.count_queries(url) for url in urls]
 
+        self.assertEqual(few, many)
 
-class CartModelTest(TestCase):
+
+class AnonymousPageCacheTest(TestCase):
 
     def setUp(self):
 
-        self.seller_user = CustomUser.objects.create(
-            username='seller',
-            email='seller@example.com',
-            phone_number='+989393214333',
-            password='Strong_123_password'
+        clear_caches()
+        self.user = CustomUser.objects.create(
+            username='seller', email='seller@example.com', phone_number='+989393214333', is_active=True
         )
-
-        self.buyer_user = CustomUser.objects.create(
-            username='buyer',
-            email='buyer@example.com',
-            phone_number='+989165412191',
-            password='Strong_123_password'
+        self.category = Category.objects.create(name='Test Category')
+        self.product = Product.objects.create(
+            category=self.category, user=self.user, name='Product', about='About', price=10
+        )
+
+    def get(self, url, **headers):
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, headers=headers)
+
+        return response, [query['sql'] for query in context.captured_queries if 'shop_' in query['sql']]
+
+    def test_pages_are_served_from_cache_until_the_catalog_changes(self):
+
+        for url in (reverse('shop:home'), reverse('shop:category_list'),
+                    reverse('shop:category_products', args=[self.category.id])):
+            first, queries = self.get(url)
+            self.assertTrue(queries)
+
+            second, queries = self.get(url)
+            self.assertEqual(queries, [])
+            self.assertEqual(second.content, first.content)
+
+        self.product.name = 'Renamed'
+        self.product.save()
+
+        response, queries = self.get(reverse('shop:home'))
+        self.assertTrue(queries)
+        self.assertContains(response, 'Renamed')
+
+        Discount.objects.create(product=self.product, discount_percentage=50)
+        self.assertContains(self.get(reverse('shop:home'))[0], '5.00 $')
+
+    def test_conditional_requests(self):
+
+        response = self.get(reverse('shop:home'))[0]
+
+        not_modified, queries = self.get(reverse('shop:home'), if_none_match=response['ETag'])
+        self.assertEqual((not_modified.status_code, queries), (304, []))
+
+        not_modified = self.get(reverse('shop:home'), if_modified_since=response['Last-Modified'])[0]
+        self.assertEqual(not_modified.status_code, 304)
+
+        Category.objects.create(name='New Category')
+        self.assertEqual(self.get(reverse('shop:home'), if_none_match=response['ETag'])[0].status_code, 200)
+
+    def test_personal_pages_are_not_cached(self):
+
+        self.get(reverse('shop:home'))
+
+        storage, response = CookieStorage(HttpRequest()), HttpResponse()
+        storage.add(message_constants.SUCCESS, 'Logged in successfully!')
+        storage.update(response)
+        self.client.cookies[storage.cookie_name] = response.cookies[storage.cookie_name].value
+        self.assertContains(self.get(reverse('shop:home'))[0], 'Logged in successfully!')
+
+        self.client.force_login(self.user)
+        response, queries = self.get(reverse('shop:home'))
+        self.assertTrue(queries)
+        self.assertNotIn('ETag', response)
+
+
+class EffectivePriceTest(TestCase):
+
+    def setUp(self):
+
+        self.user = CustomUser.objects.create(
+            username='seller', email='seller@example.com', phone_number='+989393214333'
+        )
+        self.product = Product.objects.create(
+            category=Category.objects.create(name='Test Category'), user=self.user, name='Product', about='About',
+            price=80,
+        )
+
+    def effective_price(self):
+
+        return Product.objects.values_list('effective_price', flat=True).get(pk=self.product.pk)
+
+    def test_kept_in_sync_with_discount(self):
+
+        self.assertEqual(self.effective_price(), Decimal('80.00'))
+
+        discount = Discount.objects.create(product=self.product, discount_percentage=25)
+        self.assertEqual(self.effective_price(), Decimal('60.00'))
+
+        discount.discount_percentage = Decimal('12.5')
+        discount.save()
+        self.assertEqual(self.effective_price(), Decimal('70.00'))
+
+        discount.delete()
+        self.assertEqual(self.effective_price(), Decimal('80.00'))
+
+    def test_price_change_updates_column(self):
+
+        Discount.objects.create(product=self.product, discount_percentage=50)
+        product = Product.objects.get(pk=self.product.pk)
+
+        product.price = 30
+        product.save(update_fields=['price'])
+        self.assertEqual(self.effective_price(), Decimal('15.00'))
+
+        product.quantity = 3
+        with CaptureQueriesContext(connection) as context:
+            product.save()
+        self.assertFalse([query for query in context.captured_queries if 'shop_discount' in query['sql']])
+
+    def test_bulk_create_and_price_range(self):
+
+        Product.objects.bulk_create(
+            Product(category=self.product.category, user=self.user, name=f'Bulk {price}', about='', price=price)
+            for price in (10, 20, 30)
+        )
+
+        names = Product.objects.filter(effective_price__range=(15, 35)).order_by('effective_price')
+        self.assertEqual([product.name for product in names], ['Bulk 20', 'Bulk 30'])
+
+
+class DiscountRuleTest(TestCase):
+
+    def setUp(self):
+
+        self.user = CustomUser.objects.create(
+            username='seller', email='seller@example.com', phone_number='+989393214333'
+        )
+        self.root = Category.objects.create(name='Root')
+        self.child = Category.objects.create(name='Child', parent_category=self.root)
+        self.other = Category.objects.create(name='Other')
+        self.now = timezone.now()
+
+    def product(self, category, name='Product', price=100):
+
+        return Product.objects.create(category=category, user=self.user, name=name, about='About', price=price)
+
+    @staticmethod
+    def effective_price(product):
+
+        return Product.objects.archived.values_list('effective_price', flat=True).get(pk=product.pk)
+
+    def rule(self, percentage, starts_in=0, ends_in=None, products=(), categories=()):
+
+        rule = DiscountRule.objects.create(
+            name=f'{percentage}% off',
+            discount_percentage=percentage,
+            starts_at=self.now + timedelta(hours=starts_in),
+            ends_at=self.now + timedelta(hours=ends_in) if ends_in is not None else None,
+        )
+        rule.products.set(products)
+        rule.categories.set(categories)
+        return rule
+
+    def test_rule_is_applied_between_start_and_end(self):
+
+        product = self.product(self.child)
+        rule = self.rule(20, starts_in=1, ends_in=3, categories=[self.root])
+
+        self.assertEqual(sync_discount_rules(self.now), 0)
+        self.assertEqual(self.effective_price(product), Decimal('100.00'))
+
+        self.assertEqual(sync_discount_rules(self.now + timedelta(hours=1)), 1)
+        rule.refresh_from_db()
+        self.assertTrue(rule.is_live)
+        self.assertEqual(self.effective_price(product), Decimal('80.00'))
+
+        self.assertEqual(sync_discount_rules(self.now + timedelta(hours=2)), 0)
+
+        self.assertEqual(sync_discount_rules(self.now + timedelta(hours=3)), 1)
+        rule.refresh_from_db()
+        self.assertFalse(rule.is_live)
+        self.assertEqual(self.effective_price(product), Decimal('100.00'))
+
+    def test_catalog_shows_the_discount_that_won(self):
+
+        clear_caches()
+        rule_only = self.product(self.child, 'Rule only')
+        both = self.product(self.child, 'Both')
+        Discount.objects.create(product=both, discount_percentage=10)
+        self.rule(30, categories=[self.root])
+        sync_discount_rules(self.now)
+
+        for url in (reverse('shop:home'), reverse('shop:category_products', args=[self.child.id])):
+            response = self.client.get(url)
+            content = response.content.decode()
+            self.assertEqual(content.count('30.00% OFF'), 2)
+            self.assertNotIn('10.00% OFF', content)
+            self.assertEqual(content.count('data-product-price="70.00"'), 2)
+            self.assertNotIn('data-product-price="100', content)
+
+        response = self.client.get(reverse('shop:product-list-api'))
+        self.assertEqual(
+            {(product['name'], product['discount_percentage'], product['effective_price'])
+             for product in response.data['results']},
+            {(rule_only.name, '30.00', '70.00'), (both.name, '30.00', '70.00')},
+        )
+
+    def test_snapshot_records_the_discount_that_won(self):
+
+        rule_only = self.product(self.child, 'Rule only')
+        both = self.product(self.child, 'Both')
+        plain = self.product(self.other, 'Plain')
+        Discount.objects.create(product=both, discount_percentage=10)
+        self.rule(30, categories=[self.root])
+        sync_discount_rules(self.now)
+
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=product, quantity=1, price=self.effective_price(product))
+            for product in (rule_only, both, plain)
+        )
+
+        document = take_snapshot(order, final=True)
+
+        self.assertEqual(
+            [(item['product_name'], item['discount_percentage'], item['unit_price']) for item in document['items']],
+            [('Rule only', '30.00', '70.00'), ('Both', '30.00', '70.00'), ('Plain', None, '100.00')],
+        )
+
+    def test_rule_covers_listed_products_and_category_subtree(self):
+
+        in_subtree = self.product(self.child, 'In subtree')
+        listed = self.product(self.other, 'Listed')
+        outside = self.product(self.other, 'Outside')
+
+        self.rule(10, categories=[self.root], products=[listed])
+        sync_discount_rules(self.now)
+
+        self.assertEqual(self.effective_price(in_subtree), Decimal('90.00'))
+        self.assertEqual(self.effective_price(listed), Decimal('90.00'))
+        self.assertEqual(self.effective_price(outside), Decimal('100.00'))
+
+    def test_best_discount_wins(self):
+
+        product = self.product(self.child)
+        Discount.objects.create(product=product, discount_percentage=15)
+
+        self.rule(10, categories=[self.root])
+        sync_discount_rules(self.now)
+        self.assertEqual(self.effective_price(product), Decimal('85.00'))
+
+        self.rule(30, products=[product], ends_in=1)
+        sync_discount_rules(self.now)
+        self.assertEqual(self.effective_price(product), Decimal('70.00'))
+
+        sync_discount_rules(self.now + timedelta(hours=1))
+        self.assertEqual(self.effective_price(product), Decimal('85.00'))
+
+    def test_new_and_moved_products_pick_up_live_rules(self):
+
+        self.rule(25, categories=[self.child])
+        sync_discount_rules(self.now)
+
+        product = self.product(self.child)
+        self.assertEqual(product.effective_price, Decimal('75.00'))
+
+        bulk, = Product.objects.bulk_create([
+            Product(category=self.child, user=self.user, name='Bulk', about='', price=40)
+        ])
+        self.assertEqual(bulk.effective_price, Decimal('30.00'))
+        self.assertEqual(self.effective_price(bulk), Decimal('30.00'))
+
+        product.category = self.other
+        product.save()
+        self.assertEqual(self.effective_price(product), Decimal('100.00'))
+
+        self.other.parent_category = self.child
+        self.other.save()
+        self.assertEqual(self.effective_price(product), Decimal('75.00'))
+
+    def test_editing_a_live_rule_reprices_products(self):
+
+        kept, removed = self.product(self.other, 'Kept'), self.product(self.other, 'Removed')
+        rule = self.rule(50, products=[kept, removed])
+        sync_discount_rules(self.now)
+
+        rule.products.remove(removed)
+        self.assertEqual(self.effective_price(removed), Decimal('100.00'))
+
+        rule.refresh_from_db()
+        rule.discount_percentage = 40
+        rule.save()
+        self.assertEqual(self.effective_price(kept), Decimal('60.00'))
+
+        rule.delete()
+        self.assertEqual(self.effective_price(kept), Decimal('100.00'))
+
+    def test_transitions_are_set_based_on_a_large_catalog(self):
+
+        Product.objects.bulk_create(
+            (Product(category=self.child, user=self.user, name=f'Product {index}', about='', price=10)
+             for index in range(100_000)),
+            batch_size=5000,
+        )
+        self.rule(10, starts_in=1, ends_in=2, categories=[self.root])
+        self.rule(20, starts_in=1, ends_in=2, categories=[self.child])
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(sync_discount_rules(self.now + timedelta(hours=1)), 2)
+        updates = [query for query in context.captured_queries if query['sql'].startswith('UPDATE "shop_product"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Product.objects.filter(effective_price=Decimal('8.00')).count(), 100_000)
+
+        sync_discount_rules(self.now + timedelta(hours=2))
+        self.assertEqual(Product.objects.filter(effective_price=Decimal('10.00')).count(), 100_000)
+
+
+class InventoryModelTest(TestCase):
+
+    def test_create_inventory(self):
+
+        inventory = Inventory.objects.create(name='Test Inventory', capacity=100)
+
+        self.assertEqual(inventory.name, 'Test Inventory')
+        self.assertEqual(inventory.capacity, 100)
+
+    def test_read_inventory(self):
+
+        inventory = Inventory.objects.create(name='Test Inventory', capacity=100)
+
+        retrieved_inventory = Inventory.objects.get(name='Test Inventory')
+
+        self.assertEqual(inventory, retrieved_inventory)
+
+    def test_update_inventory(self):
+
+        inventory = Inventory.objects.create(name='Test Inventory', capacity=100)
+
+        inventory.name = 'Updated Test Inventory'
+        inventory.capacity = 200
+        inventory.save()
+
+        updated_inventory = Inventory.objects.get(name='Updated Test Inventory')
+
+        self.assertEqual(updated_inventory.name, 'Updated Test Inventory')
+        self.assertEqual(updated_inventory.capacity, 200)
+
+    def test_delete_inventory(self):
+
+        inventory = Inventory.objects.create(name='Test Inventory', capacity=100)
+
+        inventory.delete()
+
+        # noinspection PyTypeChecker
+        with self.assertRaises(Inventory.DoesNotExist):
+            Inventory.objects.get(name='Test Inventory')
+
+
+class InventoryCounterTest(TestCase):
+
+    def setUp(self):
+
+        self.user = CustomUser.objects.create(
+            username='seller', email='seller@example.com', phone_number='+989393214333'
+        )
+        self.category = Category.objects.create(name='Test Category')
+        self.inventory = Inventory.objects.create(name='Small', capacity=2)
+        self.other = Inventory.objects.create(name='Large', capacity=10)
+
+    def create_product(self, inventory, name='Product'):
+
+        return Product.objects.create(
+            category=self.category, user=self.user, inventory=inventory, name=name, about='About', price=10
+        )
+
+    def counts(self):
+
+        return dict(Inventory.objects.values_list('name', 'product_count'))
+
+    def test_capacity_enforced_by_counter(self):
+
+        self.create_product(self.inventory, 'First')
+        product = self.create_product(self.inventory, 'Second')
+
+        with self.assertRaises(ValidationError):
+            self.create_product(self.inventory, 'Third')
+
+        product.quantity = 5
+        with CaptureQueriesContext(connection) as context:
+            product.save()
+
+        self.assertFalse([query for query in context.captured_queries if 'shop_inventory' in query['sql']])
+
+        self.assertEqual(self.counts(), {'Small': 2, 'Large': 0})
+
+    def test_move_and_delete(self):
+
+        product = self.create_product(self.inventory)
+
+        product.inventory = self.other
+        product.save()
+        self.assertEqual(self.counts(), {'Small': 0, 'Large': 1})
+
+        Product.objects.get(pk=product.pk).delete()
+        self.assertEqual(self.counts(), {'Small': 0, 'Large': 0})
+
+    def test_queryset_delete_and_undelete(self):
+
+        self.create_product(self.inventory, 'First')
+        self.create_product(self.other, 'Second')
+
+        Product.objects.all().delete()
+        self.assertEqual(self.counts(), {'Small': 0, 'Large': 0})
+
+        Product.objects.archived.filter(name='First').undelete()
+        self.assertEqual(self.counts(), {'Small': 1, 'Large': 0})
+
+    def test_hard_delete(self):
+
+        self.create_product(self.inventory)
+
+        self.category.delete()
+
+        self.assertEqual(self.counts(), {'Small': 0, 'Large': 0})
+
+
+class ProductModelTest(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='test_user', email='test@example.com')
+        self.category = Category.objects.create(name='Test Category')
+        self.inventory = Inventory.objects.create(name='Test Inventory', capacity=100)
+
+    def test_create_product(self):
+
+        product = Product.objects.create(
+            category=self.category,
+            user=self.user,
+            inventory=self.inventory,
+            name='Test Product',
+            about='Test Description',
+            quantity=50,
+            price=10.99
+        )
+
+        self.assertEqual(product.name, 'Test Product')
+        self.assertEqual(product.quantity, 50)
+        self.assertEqual(product.price, 10.99)
+
+    def test_read_product(self):
+
+        product = Product.objects.create(
+            category=self.category,
+            user=self.user,
+            inventory=self.inventory,
+            name='Test Product',
+            about='Test Description',
+            quantity=50,
+            price=10.99
+        )
+
+        retrieved_product = Product.objects.get(name='Test Product')
+
+        self.assertEqual(product, retrieved_product)
+
+    def test_update_product(self):
+
+        product = Product.objects.create(
+            category=self.category,
+            user=self.user,
+            inventory=self.inventory,
+            name='Test Product',
+            about='Test Description',
+            quantity=50,
+            price=10.99
+        )
+
+        product.name = 'Updated Test Product'
+        product.price = 15.99
+        product.save()
+
+        updated_product = Product.objects.get(name='Updated Test Product')
+
+        self.assertEqual(updated_product.name, 'Updated Test Product')
+        self.assertEqual(updated_product.price, Decimal('15.99'))
+
+    def test_delete_product(self):
+
+        product = Product.objects.create(
+            category=self.category,
+            user=self.user,
+            inventory=self.inventory,
+            name='Test Product',
+            about='Test Description',
+            quantity=50,
+            price=10.99
+        )
+
+        product.delete()
+
+        # noinspection PyTypeChecker
+        with self.assertRaises(Product.DoesNotExist):
+            Product.objects.get(name='Test Product')
+
+        self.assertFalse(product.is_active)
+        self.assertTrue(product.is_deleted)
+
+
+class DiscountModelTest(TestCase):
+
+    def setUp(self):
+
+        category = Category.objects.create(name='Test Category')
+        user = CustomUser.objects.create(username='test_user')
+        inventory = Inventory.objects.create(name='Test Inventory', capacity=100)
+
+        self.product = Product.objects.create(
+            category=category,
+            user=user,
+            inventory=inventory,
+            name='Test Product',
+            about='Test Description',
+            quantity=50,
+            price=10.99
+        )
+
+    def test_create_discount(self):
+
+        discount = Discount.objects.create(product=self.product, discount_percentage=20.00)
+
+        self.assertEqual(discount.product.name, 'Test Product')
+        self.assertEqual(discount.discount_percentage, 20.00)
+
+    def test_read_discount(self):
+
+        discount = Discount.objects.create(product=self.product, discount_percentage=20.00)
+
+        retrieved_discount = Discount.objects.get(product=self.product)
+
+        self.assertEqual(discount, retrieved_discount)
+
+    def test_update_discount(self):
+
+        discount = Discount.objects.create(product=self.product, discount_percentage=20.00)
+
+        discount.discount_percentage = 30.00
+        discount.save()
+
+        updated_discount = Discount.objects.get(product=self.product)
+
+        self.assertEqual(updated_discount.discount_percentage, 30.00)
+
+    def test_delete_discount(self):
+
+        discount = Discount.objects.create(product=self.product, discount_percentage=20.00)
+
+        discount.delete()
+
+        # noinspection PyTypeChecker
+        with self.assertRaises(Discount.DoesNotExist):
+            Discount.objects.get(product=self.product)
+
+
+class OrderModelTest(TestCase):
+
+    def test_create_order(self):
+
+        order = Order.objects.create(total_price=50.00)
+
+        self.assertIsNotNone(order)
+        self.assertEqual(order.total_price, 50.00)
+
+    def test_read_order(self):
+
+        order = Order.objects.create(total_price=50.00)
+
+        retrieved_order = Order.objects.get(id=order.id)
+
+        self.assertEqual(order, retrieved_order)
+
+    def test_update_order(self):
+
+        order = Order.objects.create(total_price=50.00)
+
+        order.total_price = 60.00
+        order.save()
+
+        updated_order = Order.objects.get(id=order.id)
+
+        self.assertEqual(updated_order.total_price, 60.00)
+
+    def test_delete_order(self):
+
+        order = Order.objects.create(total_price=50.00)
+
+        order.delete()
+
+        # noinspection PyTypeChecker
+        with self.assertRaises(Order.DoesNotExist):
+            Order.objects.get(id=order.id)
+
+
+# Refreshing the session on every request keeps query counts comparable between requests.
+@override_settings(ORDER_HISTORY_PAGE_SIZE=20, SESSION_REFRESH_INTERVAL=0)
+class OrderHistoryAPITest(TestCase):
+
+    def setUp(self):
+
+        clear_caches()
+        self.user = CustomUser.objects.create(
+            username='shopper', email='shopper@example.com', phone_number='+989393214334', is_active=True
+        )
+        self.product = Product.objects.create(
+            category=Category.objects.create(name='Test Category'), user=self.user, name='Product', about='About',
+            price=10, quantity=10,
+        )
+        self.client.force_login(self.user)
+
+    def create_orders(self, count, is_active=False):
+
+        orders = Order.objects.bulk_create(Order(user=self.user, is_active=is_active) for _ in range(count))
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=self.product, quantity=2, price=20) for order in orders
+        )
+        call_command('backfill_order_snapshots', stdout=StringIO())
+        return orders
+
+    def get(self, cursor=None):
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('shop:user-orders'), {'cursor': cursor} if cursor else {})
+
+        self.assertEqual(response.status_code, 200)
+        return response, len(context.captured_queries)
+
+    def test_query_count_independent_of_order_count(self):
+
+        counts, created = [], 0
+        for total in (1, 100, 10000):
+            self.create_orders(total - created)
+            created = total
+            clear_caches()
+            response, queries = self.get()
+            counts.append(queries)
+            self.assertEqual(len(response.data['results']), min(total, 20))
+
+        self.assertEqual(len(set(counts)), 1)
+
+    def test_pages_walk_all_closed_orders(self):
+
+        orders = self.create_orders(45)
+        self.create_orders(1, is_active=True)
+
+        response, _ = self.get()
+        self.assertEqual(response.data['results'][0]['status'], 'still active')
+        seen = [order['id'] for order in response.data['results'][1:]]
+
+        while response.data['next_cursor']:
+            response, _ = self.get(response.data['next_cursor'])
+            seen += [order['id'] for order in response.data['results']]
+
+        self.assertEqual(seen, sorted((order.id for order in orders), reverse=True))
+        self.assertEqual(response.data['results'][-1]['order_items'][0]['product_name'], 'Product')
+
+    def test_closed_orders_cached_until_an_order_closes(self):
+
+        self.create_orders(3)
+        active, = self.create_orders(1, is_active=True)
+
+        _, cold = self.get()
+        response, warm = self.get()
+        self.assertLess(warm, cold)
+        self.assertEqual(len(response.data['results']), 4)
+
+        active.is_active = False
+        active.save(update_fields=['is_active'])
+        take_snapshot(active, final=True)
+
+        response, _ = self.get()
+        self.assertEqual([order['status'] for order in response.data['results']], ['closed'] * 4)
+
+    def test_active_order_without_snapshot_is_read_without_writes(self):
+
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=order, product=self.product, quantity=2, price=20)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('shop:active-order'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], order.id)
+        self.assertEqual(response.data['order_items'][0]['quantity'], 2)
+        self.assertFalse([query for query in context.captured_queries if 'shop_ordersnapshot' in query['sql']
+                          and not query['sql'].startswith('SELECT')])
+        self.assertFalse(OrderSnapshot.objects.filter(order=order).exists())
+
+    def test_snapshot_keeps_purchase_time_details(self):
+
+        Discount.objects.create(product=self.product, discount_percentage=50)
+        order = Order.objects.create(user=self.user)
+        place_order(order, {str(self.product.id): {'quantity': 2}})
+
+        self.product.name = 'Renamed'
+        self.product.save()
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('shop:active-order'))
+
+        self.assertFalse([query for query in context.captured_queries if 'shop_orderitem' in query['sql']])
+
+        item, = response.data['order_items']
+        self.assertEqual(response.data['status'], 'still active')
+        self.assertEqual(
+            (item['product_name'], item['unit_price'], item['discount_percentage'], item['price']),
+            ('Product', '5.00', '50.00', '10.00'),
+        )
+
+        order.is_active = False
+        order.save(update_fields=['is_active'])
+        take_snapshot(order, final=True)
+        place_order(Order.objects.create(user=self.user), {str(self.product.id): {'quantity': 1}})
+
+        self.assertEqual(OrderSnapshot.objects.get(pk=order.pk).document['items'][0]['product_name'], 'Product')
+        self.assertIsNone(take_snapshot(order))
+
+
+class OrderItemModelTest(TestCase):
+
+    def setUp(self):
+
+        category = Category.objects.create(name='Test Category')
+        user = CustomUser.objects.create(username='test-user', email='test@example.com')
+        inventory = Inventory.objects.create(name='Test Inventory', capacity=100)
+
+        self.product = Product.objects.create(
+            category=category,
+            user=user,
+            inventory=inventory,
+            name='Test Product',
+            about='Test Description',
+            quantity=10,
+            price=20.00
+        )
+        self.order = Order.objects.create(total_price=0)
+
+    def test_create_order_item(self):
+
+        order_item = OrderItem.objects.create(product=self.product, order=self.order, quantity=2)
+
+        self.assertIsNotNone(order_item)
+        self.assertEqual(order_item.product, self.product)
+        self.assertEqual(order_item.order, self.order)
+        self.assertEqual(order_item.quantity, 2)
+        self.assertEqual(order_item.price, 40.00)
+
+    def test_read_order_item(self):
+
+        order_item = OrderItem.objects.create(product=self.product, order=self.order, quantity=2)
+
+        retrieved_order_item = OrderItem.objects.get(id=order_item.id)
+
+        self.assertEqual(order_item, retrieved_order_item)
+
+    def test_update_order_item(self):
+
+        order_item = OrderItem.objects.create(product=self.product, order=self.order, quantity=2)
+
+        order_item.quantity = 3
+        order_item.save()
+
+        updated_order_item = OrderItem.objects.get(id=order_item.id)
+
+        self.assertEqual(updated_order_item.quantity, 3)
+        self.assertEqual(updated_order_item.price, 60.00)
+
+    def test_delete_order_item(self):
+
+        order_item = OrderItem.objects.create(product=self.product, order=self.order, quantity=2)
+
+        order_item.delete()
+
+        # noinspection PyTypeChecker
+        with self.assertRaises(OrderItem.DoesNotExist):
+            OrderItem.objects.get(id=order_item.id)
+
+    def test_save_order_item_insufficient_quantity(self):
+
+        with self.assertRaises(ValidationError):
+            OrderItem.objects.create(product=self.product, order=self.order, quantity=20)
+
+
+class CouponModelTest(TestCase):
+    def setUp(self):
+
+        self.coupon_data = {
+            'amount_of_discount': 50,
+        }
+
+    def test_create_coupon(self):
+
+        coupon = Coupon.objects.create(**self.coupon_data)
+        self.assertTrue(isinstance(coupon, Coupon))
+
+    def test_coupon_code_generation(self):
+
+        coupon = Coupon.objects.create(**self.coupon_data)
+        self.assertIsNotNone(coupon.coupon_code)
+
+    def test_coupon_amount_range(self):
+
+        coupon_data = {
+            'amount_of_discount': 1000001,
+        }
+        with self.assertRaises(ValidationError):
+            Coupon.objects.create(**coupon_data)
+
+    def test_coupon_rarity_assignment(self):
+
+        rarity_mapping = {
+            5: 'Common',
+            50: 'Uncommon',
+            500: 'Rare',
+            5000: 'Epic',
+            50000: 'Legendary'
+        }
+        for amount, rarity in rarity_mapping.items():
+            coupon_data = {'amount_of_discount': amount}
+
+            coupon = Coupon.objects.create(**coupon_data)
+            self.assertEqual(coupon.rarity, rarity)
+
+    def test_read_coupon(self):
+
+        coupon = Coupon.objects.create(**self.coupon_data)
+        retrieved_coupon = Coupon.objects.get(id=coupon.id)
+        self.assertEqual(coupon, retrieved_coupon)
+
+    def test_update_coupon(self):
+
+        coupon = Coupon.objects.create(**self.coupon_data)
+        new_discount_amount = 75
+        coupon.amount_of_discount = new_discount_amount
+        coupon.save()
+        updated_coupon = Coupon.objects.get(id=coupon.id)
+        self.assertEqual(updated_coupon.amount_of_discount, new_discount_amount)
+
+    def test_delete_coupon(self):
+
+        coupon = Coupon.objects.create(**self.coupon_data)
+        coupon_id = coupon.id
+
+        coupon.delete()
+
+        # noinspection PyTypeChecker
+        with self.assertRaises(Coupon.DoesNotExist):
+            Coupon.objects.get(id=coupon_id)
+
+    def test_coupon_code_collision_draws_a_new_code(self):
+
+        taken = Coupon.objects.create(**self.coupon_data)
+        generated = iter(['AAAAAAAA', 'BBBBBBBB'])
+
+        with patch('shop.models.generate_coupon_code', lambda: next(generated)):
+            coupon = Coupon(coupon_code=taken.coupon_code, **self.coupon_data)
+            coupon.save()
+
+        self.assertEqual(coupon.coupon_code, 'AAAAAAAA')
+        self.assertEqual(Coupon.objects.count(), 2)
+
+    def test_coupon_code_collisions_are_bounded(self):
+
+        taken = Coupon.objects.create(**self.coupon_data)
+
+        with patch('shop.models.generate_coupon_code', lambda: taken.coupon_code):
+            with self.assertRaises(IntegrityError):
+                Coupon(coupon_code=taken.coupon_code, **self.coupon_data).save()
+
+        self.assertEqual(Coupon.objects.count(), 1)
+
+
+class CouponMintTest(TestCase):
+
+    def test_mint_skips_codes_in_use(self):
+
+        taken = Coupon.objects.create(amount_of_discount=5)
+        generated = iter([taken.coupon_code, 'AAAAAAAA', 'AAAAAAAA', 'BBBBBBBB', 'CCCCCCCC'])
+
+        with patch('utils.coupon_generator.generate_coupon_code', lambda: next(generated)):
+            codes = Coupon.objects.mint(2, 5000, batch_size=2)
+
+        self.assertEqual(sorted(codes), ['AAAAAAAA', 'BBBBBBBB'])
+        self.assertEqual(
+            list(Coupon.objects.filter(coupon_code__in=codes).values_list('rarity', flat=True).distinct()), ['Epic']
+        )
+
+    def test_mint_uses_one_lookup_and_insert_per_batch(self):
+
+        with CaptureQueriesContext(connection) as context:
+            codes = Coupon.objects.mint(3000, 50, batch_size=1000)
+
+        self.assertEqual(len(set(codes)), 3000)
+        self.assertEqual(Coupon.objects.filter(rarity='Uncommon').count(), 3000)
+        selects = [query for query in context.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 3)
+
+
+@override_settings(
+    THROTTLE_BUCKET_STORE='shop.throttling.InMemoryBucketStore', COUPON_CHECK_BURST=5, COUPON_CHECK_RATE=1
+)
+class CheckCouponAPITest(TestCase):
+
+    def setUp(self):
+
+        clear_caches()
+        self.user = CustomUser.objects.create(
+            username='shopper', email='shopper@example.com', phone_number='+989393214334', is_active=True
+        )
+        self.coupon = Coupon.objects.create(amount_of_discount=50)
+        self.client.force_login(self.user)
+        get_bucket_store().buckets.clear()
+
+    def check(self, coupon_code):
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('shop:check-coupon'), {'coupon': coupon_code})
+
+        coupon_queries = [query for query in context.captured_queries if 'shop_coupon' in query['sql']]
+        return response, len(coupon_queries)
+
+    def test_valid_and_invalid_codes_are_cached(self):
+
+        response, queries = self.check(self.coupon.coupon_code)
+        self.assertEqual(response.data, {'valid': True, 'discount': Decimal('50.00')})
+        self.assertEqual(queries, 1)
+
+        response, queries = self.check(self.coupon.coupon_code)
+        self.assertTrue(response.data['valid'])
+        self.assertEqual(queries, 0)
+
+        response, queries = self.check('ZZZZZZZZ')
+        self.assertEqual((response.status_code, response.data, queries), (200, {'valid': False}, 1))
+
+        response, queries = self.check('ZZZZZZZZ')
+        self.assertEqual((response.data, queries), ({'valid': False}, 0))
+
+        response, queries = self.check('not a code')
+        self.assertEqual((response.data, queries), ({'valid': False}, 0))
+
+    def test_hand_entered_codes_are_checked(self):
+
+        Coupon.objects.create(coupon_code='NY-2025', amount_of_discount=20)
+
+        response, queries = self.check('NY-2025')
+        self.assertEqual((response.data, queries), ({'valid': True, 'discount': Decimal('20.00')}, 1))
+
+        response, queries = self.check('SALE 10')
+        self.assertEqual((response.data, queries), ({'valid': False}, 1))
+
+    def test_cache_follows_coupon_changes(self):
+
+        self.check(self.coupon.coupon_code)
+
+        self.coupon.is_active = False
+        self.coupon.save(update_fields=['is_active'])
+        self.assertEqual(self.check(self.coupon.coupon_code)[0].data, {'valid': False})
+
+        with patch('utils.coupon_generator.generate_coupon_code', lambda: 'MINTED01'):
+            self.assertFalse(self.check('MINTED01')[0].data['valid'])
+            Coupon.objects.mint(1, 20)
+        self.assertTrue(self.check('MINTED01')[0].data['valid'])
+
+    def test_checks_are_throttled_per_user(self):
+
+        for _ in range(5):
+            self.assertEqual(self.check('ZZZZZZZZ')[0].status_code, 200)
+
+        response, queries = self.check('ZZZZZZZZ')
+        self.assertEqual((response.status_code, queries), (429, 0))
+        self.assertIn('Retry-After', response)
+
+
+class TokenBucketTest(TestCase):
+
+    def test_bucket_refills_over_time(self):
+
+        store = InMemoryBucketStore()
+
+        self.assertEqual([store.take('key', 2, 0.5, now=0) for _ in range(2)], [0, 0])
+        self.assertEqual(store.take('key', 2, 0.5, now=0), 2)
+        self.assertEqual(store.take('key', 2, 0.5, now=1), 1)
+        self.assertEqual(store.take('key', 2, 0.5, now=2), 0)
+        self.assertEqual(store.take('other', 2, 0.5, now=2), 0)
+
+    def test_cache_store(self):
+
+        clear_caches()
+        store = CacheBucketStore()
+
+        self.assertEqual(store.take('key', 1, 1, now=100), 0)
+        self.assertEqual(store.take('key', 1, 1, now=100.5), 0.5)
+        self.assertEqual(store.take('key', 1, 1, now=102), 0)
+
+
+class CartModelTest(TestCase):
+
+    def setUp(self):
+
+        self.seller_user = CustomUser.objects.create(
+            username='seller',
+            email='seller@example.com',
+            phone_number='+989393214333',
+            password='Strong_123_password'
+        )
+
+        self.buyer_user = CustomUser.objects.create(
+            username='buyer',
+            email='buyer@example.com',
+            phone_number='+989165412191',
+            password='Strong_123_password'
         )
 
         self.buyer_address = Address.objects.create(
@@ -505,6 +1490,617 @@ class CartModelTest(TestCase):
         self.assertEqual(updated_product.quantity, initial_quantity - self.order_item.quantity)
 
 
+class FakeRedis:
+
+    """
+    Minimal in-process stand-in for the redis-py hash commands used by RedisCartStore.
+    """
+
+    def __init__(self):
+
+        self.data = {}
+        self.expiry = {}
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def hincrby(self, key, field, amount=1):
+
+        hash_ = self.data.setdefault(key, {})
+        hash_[str(field)] = str(int(hash_.get(str(field), 0)) + amount)
+        return int(hash_[str(field)])
+
+    def hset(self, key, field=None, value=None, mapping=None):
+
+        mapping = dict(mapping or {}, **({str(field): value} if field is not None else {}))
+        self.data.setdefault(key, {}).update({str(name): str(value) for name, value in mapping.items()})
+        return len(mapping)
+
+    def hsetnx(self, key, field, value):
+
+        hash_ = self.data.setdefault(key, {})
+        if str(field) in hash_:
+            return 0
+        hash_[str(field)] = str(value)
+        return 1
+
+    def hdel(self, key, *fields):
+        return sum(self.data.get(key, {}).pop(str(field), None) is not None for field in fields)
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def expire(self, key, timeout):
+
+        self.expiry[key] = timeout
+        return True
+
+    def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+
+class FakePipeline:
+
+    def __init__(self, client):
+
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.commands.append((getattr(self.client, name), args))
+
+    def execute(self):
+        return [command(*args) for command, args in self.commands]
+
+
+class CartStoreContract:
+
+    def get_store(self):
+        raise NotImplementedError
+
+    def setUp(self):
+
+        self.user = CustomUser.objects.create(
+            username='shopper', email='shopper@example.com', phone_number='+989393214334'
+        )
+        self.category = Category.objects.create(name='Test Category')
+        self.product = Product.objects.create(
+            category=self.category, user=self.user, name='Product', about='About', price=100
+        )
+        self.other = Product.objects.create(
+            category=self.category, user=self.user, name='Other', about='About', price=50
+        )
+        self.store = self.get_store()
+
+    def test_increment_creates_and_accumulates(self):
+
+        self.assertEqual(self.store.increment(self.user.id, self.product.id, 1, Decimal('100.00')), 1)
+        self.assertEqual(self.store.increment(self.user.id, self.product.id, 2, Decimal('100.00')), 3)
+
+        item = self.store.items(self.user.id)[str(self.product.id)]
+        self.assertEqual(item['quantity'], 3)
+        self.assertEqual(Decimal(item['price']), Decimal('100.00'))
+
+    def test_decrement_removes_empty_line(self):
+
+        self.store.increment(self.user.id, self.product.id, 2, 100)
+
+        self.assertEqual(self.store.increment(self.user.id, self.product.id, -1), 1)
+        self.assertEqual(self.store.increment(self.user.id, self.product.id, -5), 0)
+        self.assertEqual(self.store.items(self.user.id), {})
+
+    def test_set_quantity_and_remove(self):
+
+        self.store.set_quantity(self.user.id, self.product.id, 4, 100)
+        self.store.set_quantity(self.user.id, self.other.id, 2, 50)
+        self.store.remove(self.user.id, str(self.product.id))
+
+        self.assertEqual(list(self.store.items(self.user.id)), [str(self.other.id)])
+        self.assertEqual(self.store.count(self.user.id), 2)
+
+        self.store.set_quantity(self.user.id, self.other.id, 0)
+        self.assertEqual(self.store.count(self.user.id), 0)
+
+    def test_set_prices(self):
+
+        self.store.increment(self.user.id, self.product.id, 1, 100)
+        self.store.set_prices(self.user.id, {self.product.id: Decimal('80.00'), self.other.id: Decimal('40.00')})
+
+        items = self.store.items(self.user.id)
+        self.assertEqual(list(items), [str(self.product.id)])
+        self.assertEqual(Decimal(items[str(self.product.id)]['price']), Decimal('80.00'))
+
+    def test_merge_and_clear(self):
+
+        self.store.increment(self.user.id, self.product.id, 1, 100)
+        self.store.merge(self.user.id, {
+            str(self.product.id): {'quantity': 2, 'price': '100'},
+            str(self.other.id): {'quantity': 1, 'price': '50'},
+        })
+
+        self.assertEqual(self.store.count(self.user.id), 4)
+
+        self.store.clear(self.user.id)
+        self.assertEqual(self.store.items(self.user.id), {})
+
+
+class InMemoryCartStoreTest(CartStoreContract, TestCase):
+
+    def get_store(self):
+        return InMemoryCartStore()
+
+
+class DatabaseCartStoreTest(CartStoreContract, TestCase):
+
+    def get_store(self):
+        return DatabaseCartStore()
+
+    def test_increment_does_not_rewrite_cart(self):
+
+        self.store.increment(self.user.id, self.other.id, 1, 50)
+        self.store.increment(self.user.id, self.product.id, 1, 100)
+
+        with CaptureQueriesContext(connection) as context:
+            self.store.increment(self.user.id, self.product.id, 1)
+
+        statements = [query['sql'] for query in context.captured_queries if 'cartitem' in query['sql'].lower()]
+        self.assertFalse(any(sql.startswith('DELETE') or sql.startswith('INSERT') for sql in statements))
+
+    def test_increment_rejects_missing_products(self):
+
+        with self.assertRaises(Product.DoesNotExist):
+            self.store.increment(self.user.id, 0, 1, 100)
+
+        self.assertEqual(self.store.items(self.user.id), {})
+
+    def test_failed_insert_without_a_line_is_raised(self):
+
+        with patch('shop.models.CartItem.objects.create', side_effect=IntegrityError('CHECK constraint failed')):
+            with self.assertRaises(IntegrityError):
+                self.store.increment(self.user.id, self.product.id, 1, 100)
+
+
+class RedisCartStoreTest(CartStoreContract, TestCase):
+
+    def get_store(self):
+        return RedisCartStore(client=FakeRedis(), timeout=60)
+
+    def test_keys_expire(self):
+
+        self.store.increment(self.user.id, self.product.id, 1, 100)
+
+        self.assertEqual(self.store.client.expiry, {f'cart:{self.user.id}': 60, f'cart:{self.user.id}:prices': 60})
+
+
+@override_settings(CART_STORE='shop.cart_store.InMemoryCartStore')
+class CartViewsTest(TestCase):
+
+    def setUp(self):
+
+        self.user = CustomUser.objects.create(
+            username='shopper', email='shopper@example.com', phone_number='+989393214334', is_active=True
+        )
+        self.category = Category.objects.create(name='Test Category')
+        self.product = Product.objects.create(
+            category=self.category, user=self.user, name='Product', about='About', price=100, quantity=10
+        )
+        self.client.force_login(self.user)
+
+    def test_add_update_and_remove(self):
+
+        self.client.post(reverse('shop:add-to-cart'), {'product_id': self.product.id})
+        self.client.post(reverse('shop:add-to-cart'), {'product_id': self.product.id})
+
+        self.assertEqual(get_cart_store().count(self.user.id), 2)
+        self.assertNotIn('cart', self.client.session)
+
+        self.client.post(
+            reverse('shop:update-cart'), {'product_id': self.product.id, 'quantity': 5}, content_type='application/json'
+        )
+        self.assertEqual(get_cart_store().count(self.user.id), 5)
+
+        self.client.post(reverse('shop:remove-from-cart'), {'product_id': self.product.id})
+        self.assertEqual(get_cart_store().count(self.user.id), 0)
+
+    def test_session_cart_is_migrated(self):
+
+        session = self.client.session
+        session['cart'] = {str(self.product.id): {'quantity': 3, 'price': '100'}}
+        session.save()
+
+        response = self.client.get(reverse('shop:cart-api'))
+
+        self.assertEqual(response.data['cart_count'], 3)
+        self.assertNotIn('cart', self.client.session)
+        self.assertEqual(get_cart_store().count(self.user.id), 3)
+
+
+# Refreshing the session on every request keeps query counts comparable between requests.
+@override_settings(CART_STORE='shop.cart_store.DatabaseCartStore', SESSION_REFRESH_INTERVAL=0)
+class CartAPIViewTest(TestCase):
+
+    def setUp(self):
+
+        self.user = CustomUser.objects.create(
+            username='shopper', email='shopper@example.com', phone_number='+989393214334', is_active=True
+        )
+        self.category = Category.objects.create(name='Test Category')
+        self.client.force_login(self.user)
+
+    def fill_cart(self, count):
+
+        store = get_cart_store()
+        products = Product.objects.bulk_create(
+            Product(category=self.category, user=self.user, name=f'Product {index}', about='About', price=100)
+            for index in range(count)
+        )
+        for product in products:
+            store.increment(self.user.id, product.id, 2, product.price)
+
+        return products
+
+    def count_queries(self):
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('shop:cart-api'))
+
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_query_count_independent_of_cart_size(self):
+
+        self.fill_cart(2)
+        small = self.count_queries()
+
+        self.fill_cart(38)
+        self.assertEqual(self.count_queries(), small)
+
+    def test_stale_lines_pruned(self):
+
+        kept, removed, inactive = self.fill_cart(3)
+        removed.delete()
+        Product.objects.filter(id=inactive.id).update(is_active=False)
+
+        response = self.client.get(reverse('shop:cart-api'))
+
+        self.assertEqual([item['id'] for item in response.data['cart_items']], [kept.id])
+        self.assertEqual(list(get_cart_store().items(self.user.id)), [str(kept.id)])
+
+    def test_prices_revalidated(self):
+
+        product, = self.fill_cart(1)
+        Discount.objects.create(product=product, discount_percentage=25)
+
+        response = self.client.get(reverse('shop:cart-api'))
+
+        item, = response.data['cart_items']
+        self.assertEqual(Decimal(item['price']), Decimal('75.00'))
+        self.assertTrue(item['price_changed'])
+        self.assertEqual(response.data['total_price'], 150)
+        self.assertEqual(get_cart_store().items(self.user.id)[str(product.id)]['price'], '75.00')
+
+
+class CheckoutEngineTest(TestCase):
+
+    def setUp(self):
+
+        self.user = CustomUser.objects.create(
+            username='shopper', email='shopper@example.com', phone_number='+989393214334'
+        )
+        self.category = Category.objects.create(name='Test Category')
+        self.order = Order.objects.create(user=self.user)
+
+    def create_products(self, count, quantity=10):
+
+        return Product.objects.bulk_create(
+            Product(
+                category=self.category, user=self.user, name=f'Product {index}', about='About', price=10,
+                quantity=quantity,
+            )
+            for index in range(count)
+        )
+
+    def test_query_count_independent_of_cart_size(self):
+
+        small = {str(product.id): {'quantity': 1} for product in self.create_products(2)}
+        large = {str(product.id): {'quantity': 2} for product in self.create_products(30)}
+        other_order = Order.objects.create(user=self.user)
+
+        with CaptureQueriesContext(connection) as small_context:
+            place_order(self.order, small)
+        with CaptureQueriesContext(connection) as large_context:
+            place_order(other_order, large)
+
+        self.assertEqual(len(small_context.captured_queries), len(large_context.captured_queries))
+
+    def test_stock_and_totals(self):
+
+        product, discounted = self.create_products(2)
+        Discount.objects.create(product=discounted, discount_percentage=50)
+
+        place_order(self.order, {str(product.id): {'quantity': 3}, str(discounted.id): {'quantity': 2}})
+        place_order(self.order, {str(product.id): {'quantity': 1}})
+
+        product.refresh_from_db()
+        item = self.order.order_items.get(product=product)
+        self.assertEqual(product.quantity, 6)
+        self.assertEqual((item.quantity, item.price), (4, Decimal('40.00')))
+        self.assertEqual(self.order.total_price, Decimal('50.00'))
+        self.assertEqual(Order.objects.get(pk=self.order.pk).total_price, Decimal('50.00'))
+
+    def test_insufficient_stock_rolls_back(self):
+
+        product, scarce = self.create_products(2, quantity=2)
+
+        with self.assertRaises(CheckoutError):
+            place_order(self.order, {str(product.id): {'quantity': 1}, str(scarce.id): {'quantity': 3}})
+
+        self.assertEqual(set(Product.objects.values_list('quantity', flat=True)), {2})
+        self.assertFalse(self.order.order_items.exists())
+
+
+@override_settings(STOCK_RESERVATION_TTL=600)
+class StockReservationTest(TestCase):
+
+    def setUp(self):
+
+        self.user = CustomUser.objects.create(
+            username='shopper', email='shopper@example.com', phone_number='+989393214334'
+        )
+        self.rival = CustomUser.objects.create(
+            username='rival', email='rival@example.com', phone_number='+989393214335'
+        )
+        self.product = Product.objects.create(
+            category=Category.objects.create(name='Test Category'), user=self.user, name='Product', about='About',
+            price=10, quantity=5,
+        )
+        self.now = timezone.now()
+
+    def reserved(self):
+
+        self.product.refresh_from_db()
+        return self.product.reserved_quantity
+
+    def test_holds_reduce_available_stock(self):
+
+        extend_hold(self.user.id, self.product.id, 2, now=self.now)
+        extend_hold(self.user.id, self.product.id, 1, now=self.now)
+        hold(self.rival.id, self.product.id, 2, now=self.now)
+
+        self.assertEqual(self.reserved(), 5)
+        self.assertEqual(self.product.available_quantity, 0)
+
+        with self.assertRaises(InsufficientStock):
+            extend_hold(self.rival.id, self.product.id, 1, now=self.now)
+
+        release(self.user.id, self.product.id)
+        self.assertEqual(self.reserved(), 2)
+        self.assertFalse(StockReservation.objects.filter(user=self.user).exists())
+
+    def test_expired_holds_released_in_bulk(self):
+
+        hold(self.user.id, self.product.id, 2, now=self.now)
+        hold(self.rival.id, self.product.id, 1, now=self.now + timedelta(minutes=5))
+
+        self.assertEqual(release_expired(now=self.now + timedelta(minutes=9)), 0)
+        self.assertEqual(release_expired(now=self.now + timedelta(minutes=10), batch_size=1), 1)
+        self.assertEqual(self.reserved(), 1)
+
+        self.assertEqual(release_expired(now=self.now + timedelta(minutes=15), batch_size=1), 1)
+        self.assertEqual(self.reserved(), 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_renewed_hold_survives_sweep(self):
+
+        hold(self.user.id, self.product.id, 1, now=self.now)
+        extend_hold(self.user.id, self.product.id, 1, now=self.now + timedelta(minutes=8))
+
+        self.assertEqual(release_expired(now=self.now + timedelta(minutes=12)), 0)
+        self.assertEqual(self.reserved(), 2)
+
+    def test_merged_cart_lines_hold_stock(self):
+
+        sold_out = Product.objects.create(
+            category=self.product.category, user=self.user, name='Sold out', about='About', price=10, quantity=0
+        )
+        hold(self.rival.id, self.product.id, 2, now=self.now)
+        cart = UserCart(self.user.id, InMemoryCartStore())
+
+        cart.merge({
+            str(self.product.id): {'quantity': 4, 'price': '1'},
+            str(sold_out.id): {'quantity': 1, 'price': '1'},
+            'not-a-product': {'quantity': 1},
+        })
+
+        self.assertEqual(cart.items(), {str(self.product.id): {'quantity': 3, 'price': '10.00'}})
+        self.assertEqual(self.reserved(), 5)
+        self.assertEqual(StockReservation.objects.get(user=self.user).quantity, 3)
+
+    def test_checkout_consumes_own_holds_only(self):
+
+        hold(self.user.id, self.product.id, 2, now=self.now)
+        hold(self.rival.id, self.product.id, 2, now=self.now)
+
+        with self.assertRaises(CheckoutError):
+            place_order(Order.objects.create(user=self.user), {str(self.product.id): {'quantity': 4}})
+
+        place_order(Order.objects.create(user=self.user), {str(self.product.id): {'quantity': 3}})
+
+        self.assertEqual(self.reserved(), 2)
+        self.assertEqual(self.product.quantity, 2)
+        self.assertEqual(list(StockReservation.objects.values_list('user', flat=True)), [self.rival.id])
+
+
+class ConcurrentCheckoutTest(TransactionTestCase):
+
+    def test_stock_never_negative(self):
+
+        user = CustomUser.objects.create(
+            username='shopper', email='shopper@example.com', phone_number='+989393214334'
+        )
+        product = Product.objects.create(
+            category=Category.objects.create(name='Test Category'), user=user, name='Product', about='About',
+            price=10, quantity=5,
+        )
+        orders = [Order.objects.create(user=user) for _ in range(20)]
+        placed = []
+
+        def buy(order):
+            try:
+                place_order(order, {str(product.id): {'quantity': 1}})
+                placed.append(order.id)
+            except (CheckoutError, OperationalError):
+                # Lost the race, or the database refused the concurrent write lock.
+                pass
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=(order,)) for order in orders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertGreaterEqual(product.quantity, 0)
+        self.assertEqual(product.quantity + len(placed), 5)
+        self.assertEqual(OrderItem.objects.count(), len(placed))
+
+
+class ConfirmOrderAPITest(TestCase):
+
+    def setUp(self):
+
+        clear_caches()
+        self.coupon = Coupon.objects.create(amount_of_discount=5)
+        self.product = Product.objects.create(
+            category=Category.objects.create(name='Test Category'),
+            user=CustomUser.objects.create(username='seller', email='seller@example.com', phone_number='+989393214333'),
+            name='Product', about='About', price=20, quantity=10,
+        )
+
+    def shopper(self, index):
+
+        user = CustomUser.objects.create(
+            username=f'shopper{index}', email=f'shopper{index}@example.com', phone_number=f'+98939321{index:04d}',
+            is_active=True,
+        )
+        Address.objects.create(
+            user=user, country='Test Country', city='Test City', address='123 Test St', zipcode='12345', is_active=True
+        )
+        order = Order.objects.create(user=user)
+        place_order(order, {str(self.product.id): {'quantity': 1}})
+        return user, order
+
+    def confirm(self, user):
+
+        self.client.force_login(user)
+        return self.client.post(reverse('shop:confirm-order'), {'coupon_code': self.coupon.coupon_code})
+
+    def test_coupon_is_redeemed_once(self):
+
+        first, first_order = self.shopper(1)
+        second, second_order = self.shopper(2)
+
+        response = self.confirm(first)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Cart.objects.get(pk=response.data['cart_id']).total_price, Decimal('15.00'))
+
+        self.coupon.refresh_from_db()
+        self.assertFalse(self.coupon.is_active)
+
+        response = self.confirm(second)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'message': 'This coupon has already been used'})
+
+        second_order.refresh_from_db()
+        self.assertTrue(second_order.is_active)
+        self.assertFalse(Cart.objects.filter(order=second_order).exists())
+
+    def test_query_count_independent_of_order_size(self):
+
+        counts = []
+
+        for index, lines in ((1, 1), (2, 30)):
+            user, order = self.shopper(index)
+            products = Product.objects.bulk_create(
+                Product(category=self.product.category, user=self.product.user, name=f'Extra {index} {line}',
+                        about='', price=1, quantity=1)
+                for line in range(lines - 1)
+            )
+            if products:
+                place_order(order, {str(product.id): {'quantity': 1} for product in products})
+            if index == 2:
+                self.coupon = Coupon.objects.create(amount_of_discount=5)
+
+            self.client.force_login(user)
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post(reverse('shop:confirm-order'), {'coupon_code': self.coupon.coupon_code})
+            self.assertEqual(response.status_code, 200)
+
+            statements = [
+                query['sql'] for query in context.captured_queries
+                if query['sql'].startswith(('SELECT', 'INSERT', 'UPDATE')) and '"shop_' in query['sql']
+            ]
+            counts.append(len(statements))
+
+            cart = Cart.objects.get(pk=response.data['cart_id'])
+            self.assertEqual(cart.total_price, Decimal(20 + lines - 1 - 5))
+            self.assertFalse(cart.is_active)
+            self.assertFalse(Order.objects.get(pk=order.pk).is_active)
+
+        # Active order and address lookups, closing the order, claiming and reading the coupon, the total,
+        # the cart INSERT, and reading and finalizing the snapshot.
+        self.assertEqual(counts, [8, 8])
+
+    def test_unknown_coupon(self):
+
+        user, order = self.shopper(1)
+
+        with self.assertRaisesMessage(CouponUnavailable, 'This coupon is not valid'):
+            confirm_order(order, user.addresses.get(), 'ZZZZZZZZ')
+
+
+class ConcurrentCouponRedemptionTest(TransactionTestCase):
+
+    def test_redeemed_exactly_once(self):
+
+        coupon = Coupon.objects.create(amount_of_discount=5)
+        orders = []
+
+        for index in range(100):
+            user = CustomUser.objects.create(
+                username=f'shopper{index}', email=f'shopper{index}@example.com', phone_number=f'+98939321{index:04d}'
+            )
+            address = Address.objects.create(
+                user=user, country='Country', city='City', address='Street', zipcode='12345', is_active=True
+            )
+            orders.append((Order.objects.create(user=user), address))
+
+        redeemed, refused = [], []
+
+        def confirm(order, address):
+            try:
+                redeemed.append(confirm_order(order, address, coupon.coupon_code))
+            except CouponUnavailable:
+                refused.append(order.id)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=confirm, args=pair) for pair in orders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        coupon.refresh_from_db()
+        self.assertFalse(coupon.is_active)
+        self.assertEqual(len(redeemed), 1)
+        self.assertEqual(len(redeemed) + len(refused), 100)
+        self.assertEqual(Cart.objects.filter(coupon=coupon).count(), 1)
+        self.assertEqual(Cart.objects.count(), 1)
+
+
 class WishlistTestCase(TestCase):
 
     def setUp(self):
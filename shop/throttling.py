@@ -0,0 +1,133 @@
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+
+class BaseBucketStore:
+
+    """
+    Keeps token buckets by key. A bucket holds up to 'capacity' tokens and gains 'rate' tokens per second; every
+    request takes one token and is refused while the bucket is empty.
+    """
+
+    def take(self, key, capacity, rate, now=None):
+
+        """
+        Take a token from the bucket. Returns 0 when a token was taken, otherwise the seconds until one is available.
+        """
+
+        raise NotImplementedError
+
+    @staticmethod
+    def refill(bucket, capacity, rate, now):
+
+        tokens, updated_at = bucket if bucket is not None else (capacity, now)
+        tokens = min(capacity, tokens + (now - updated_at) * rate)
+
+        if tokens >= 1:
+            return (tokens - 1, now), 0
+
+        return (tokens, now), (1 - tokens) / rate
+
+
+class InMemoryBucketStore(BaseBucketStore):
+
+    """
+    Process-local store, for tests and single process development servers.
+    """
+
+    def __init__(self):
+
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def take(self, key, capacity, rate, now=None):
+
+        now = time.monotonic() if now is None else now
+
+        with self.lock:
+            self.buckets[key], wait = self.refill(self.buckets.get(key), capacity, rate, now)
+
+        return wait
+
+
+class CacheBucketStore(BaseBucketStore):
+
+    """
+    Buckets kept in the 'ratelimit' cache, so they are shared by every process using the same cache server.
+    Concurrent requests of one user may read the same bucket and both pass, which only loosens the limit slightly.
+    """
+
+    def take(self, key, capacity, rate, now=None):
+
+        now = time.time() if now is None else now
+        key = f'throttle:{key}'
+
+        bucket, wait = self.refill(caches['ratelimit'].get(key), capacity, rate, now)
+        # A bucket left alone long enough to fill up is the same as no bucket.
+        caches['ratelimit'].set(key, bucket, int(capacity / rate) + 1)
+
+        return wait
+
+
+_store = None
+
+
+def get_bucket_store():
+
+    global _store
+
+    if _store is None:
+        _store = import_string(settings.THROTTLE_BUCKET_STORE)()
+
+    return _store
+
+
+# noinspection PyUnusedLocal
+@receiver(setting_changed)
+def reset_bucket_store(setting, **kwargs):
+
+    global _store
+
+    if setting == 'THROTTLE_BUCKET_STORE':
+        _store = None
+
+
+class TokenBucketThrottle(BaseThrottle):
+
+    """
+    Per user token bucket throttle. Subclasses name a 'scope' and the settings holding its capacity and refill rate.
+    """
+
+    scope = None
+    capacity_setting = None
+    rate_setting = None
+
+    def __init__(self):
+
+        self.wait_seconds = 0
+
+    def allow_request(self, request, view):
+
+        ident = request.user.pk if request.user.is_authenticated else self.get_ident(request)
+        self.wait_seconds = get_bucket_store().take(
+            f'{self.scope}:{ident}', getattr(settings, self.capacity_setting), getattr(settings, self.rate_setting)
+        )
+
+        return not self.wait_seconds
+
+    def wait(self):
+
+        return self.wait_seconds
+
+
+class CouponCheckThrottle(TokenBucketThrottle):
+
+    scope = 'coupon-check'
+    capacity_setting = 'COUPON_CHECK_BURST'
+    rate_setting = 'COUPON_CHECK_RATE'
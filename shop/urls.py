@@ -1,6 +1,7 @@
 from django.urls import path
 from .views import (
     ProductListView,
+    ProductListAPIView,
     CategoryListView,
     ProductInCategoryListView,
     AddToCartView,
@@ -33,6 +34,7 @@ urlpatterns = [
 
     # API view
 
+    path('api/products/', ProductListAPIView.as_view(), name='product-list-api'),
     path('api/add-to-cart/', AddToCartView.as_view(), name='add-to-cart'),
     path('api/get-cart-count/', CartCountView.as_view(), name='get-cart-count'),
     path('api/cart/', CartAPIView.as_view(), name='cart-api'),
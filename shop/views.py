@@ -1,52 +1,87 @@
 from account.models import Address
-from django.contrib import messages
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.db import transaction
-from django.http import JsonResponse
+from django.http import HttpResponseBadRequest, JsonResponse
 from django.shortcuts import render, get_object_or_404
+from django.utils.decorators import method_decorator
 from django.views.generic import (
     View,
     ListView,
     TemplateView,
 )
-from rest_framework import (
-    status,
-    generics,
-)
-from rest_framework.exceptions import ValidationError
+from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from .cache import cache_anonymous_page, get_closed_orders_page, get_coupon_discount
+from .cart_store import cart_for
+from .checkout import CheckoutError, confirm_order, place_order
 from .models import (
     Product,
     Category,
     Order,
-    OrderItem,
-    Coupon,
-    Cart,
+    OrderSnapshot,
 )
+from .pagination import KeysetPaginator, InvalidCursor
+from .reservations import InsufficientStock, extend_hold, hold, release
+from .snapshots import draft_snapshot
 from .serializers import (
-    OrderSerializer,
-    ShowOrderSerializer,
+    OrderSnapshotSerializer,
+    ProductSerializer,
 )
+from .throttling import CouponCheckThrottle
 
 
+@method_decorator(cache_anonymous_page, name='dispatch')
 class ProductListView(View):
 
     @staticmethod
     def get_cart_count(request):
-        cart = request.session.get('cart', {})
-        return sum(item['quantity'] for item in cart.values())
+        if not request.user.is_authenticated:
+            return 0
+        return cart_for(request).count()
+
+    @staticmethod
+    def get_page(request):
+        paginator = KeysetPaginator(
+            Product.objects.filter(is_active=True).for_catalog(),
+            settings.PRODUCT_PAGE_SIZE,
+        )
+        return paginator.get_page(request.GET.get('cursor'))
 
     @staticmethod
     def get(request):
-        if 'success_message' in request.session:
-            messages.success(request, request.session.pop('success_message'))
+        try:
+            page = ProductListView.get_page(request)
+        except InvalidCursor as e:
+            return HttpResponseBadRequest(str(e))
 
-        products = Product.objects.filter(is_active=True).prefetch_related('discount')
-        cart_count = ProductListView.get_cart_count(request)
+        context = {'products': page.object_list, 'next_cursor': page.next_cursor}
+
+        if request.GET.get('fragment'):
+            response = render(request, 'partials/product_cards.html', context)
+            response['X-Next-Cursor'] = page.next_cursor or ''
+            return response
 
-        return render(request, 'home.html', {'products': products, 'cart_count': cart_count})
+        context['cart_count'] = ProductListView.get_cart_count(request)
+
+        return render(request, 'home.html', context)
+
+
+class ProductListAPIView(APIView):
+
+    def get(self, request):
+        try:
+            page = ProductListView.get_page(request)
+        except InvalidCursor as e:
+            return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'results': ProductSerializer(page.object_list, many=True, context={'request': request}).data,
+            'next_cursor': page.next_cursor,
+        })
 
 
 class CartCountView(View):
@@ -56,6 +91,7 @@ class CartCountView(View):
         return JsonResponse({'cart_count': cart_count})
 
 
+@method_decorator(cache_anonymous_page, name='dispatch')
 class CategoryListView(ListView):
     model = Category
     template_name = 'category_list.html'
@@ -65,6 +101,7 @@ class CategoryListView(ListView):
         return Category.objects.filter(parent_category__isnull=True)
 
 
+@method_decorator(cache_anonymous_page, name='dispatch')
 class ProductInCategoryListView(ListView):
 
     model = Product
@@ -73,10 +110,7 @@ class ProductInCategoryListView(ListView):
 
     def get_queryset(self):
 
-        category_id = self.kwargs['category_id']
-        category = Category.objects.get(id=category_id)
-        descendant_categories = category.get_descendants(include_self=True)
-        return Product.objects.filter(category__in=descendant_categories).distinct()
+        return Product.objects.in_category(self.kwargs['category_id']).for_catalog()
 
 
 class AddToCartView(APIView):
@@ -86,19 +120,12 @@ class AddToCartView(APIView):
         product_id = request.data.get('product_id')
         product = get_object_or_404(Product, id=product_id)
 
-        if hasattr(product, 'discount'):
-            price = product.price * (1 - product.discount.discount_percentage / 100)
-        else:
-            price = product.price
-
-        cart = self.request.session.get('cart', {})
-        if product_id in cart:
-            cart[product_id]['quantity'] += 1
-        else:
-            cart[product_id] = {'quantity': 1, 'price': str(price)}
+        try:
+            extend_hold(request.user.pk, product.id, 1)
+        except InsufficientStock as e:
+            return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        self.request.session['cart'] = cart
-        self.request.session.modified = True
+        cart_for(request).increment(product.id, 1, product.effective_price)
         return Response({'message': 'Product added to cart'}, status=status.HTTP_200_OK)
 
 
@@ -112,19 +139,43 @@ class CartAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        cart = self.request.session.get('cart', {})
-        cart_items = []
+        cart = cart_for(request)
+        lines = cart.items()
+
+        # One query for every line: current prices and discounts come with the displayed columns.
+        products = Product.objects.filter(id__in=lines, is_active=True).for_catalog().in_bulk()
+
+        stale = [product_id for product_id in lines if int(product_id) not in products]
+        if stale:
+            cart.remove(*stale)
+
+        cart_items, repriced = [], {}
+
+        for product_id, item in lines.items():
+            product = products.get(int(product_id))
+            if product is None:
+                continue
+
+            try:
+                price_changed = Decimal(item['price']) != product.effective_price
+            except (TypeError, InvalidOperation):
+                price_changed = True
+
+            if price_changed:
+                repriced[product.id] = product.effective_price
 
-        for product_id, item in cart.items():
-            product = Product.objects.get(id=product_id)
             cart_items.append({
                 'id': product.id,
                 'name': product.name,
                 'description': product.about,
-                'price': item['price'],
-                'quantity': item['quantity']
+                'price': str(product.effective_price),
+                'quantity': item['quantity'],
+                'price_changed': price_changed,
             })
 
+        if repriced:
+            cart.set_prices(repriced)
+
         response_data = {
             'cart_items': cart_items,
             'cart_count': sum(item['quantity'] for item in cart_items),
@@ -142,18 +193,12 @@ class UpdateCartAPIView(APIView):
         quantity = request.data.get('quantity')
         product = get_object_or_404(Product, id=product_id)
 
-        cart = self.request.session.get('cart', {})
-
-        if quantity < 1:
-            cart.pop(product_id, None)
-        else:
-            if product_id in cart:
-                cart[product_id]['quantity'] = quantity
-            else:
-                cart[product_id] = {'quantity': quantity, 'price': str(product.price)}
+        try:
+            hold(request.user.pk, product.id, quantity)
+        except InsufficientStock as e:
+            return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        self.request.session['cart'] = cart
-        self.request.session.modified = True
+        cart_for(request).set_quantity(product.id, quantity, product.effective_price)
 
         return Response({'message': 'Cart updated successfully'})
 
@@ -164,11 +209,10 @@ class RemoveFromCartAPIView(APIView):
     def post(self, request):
         product_id = str(request.data.get('product_id'))
 
-        cart = self.request.session.get('cart', {})
-        cart.pop(product_id, None)
+        if product_id.isdigit():
+            release(request.user.pk, product_id)
 
-        self.request.session['cart'] = cart
-        self.request.session.modified = True
+        cart_for(request).remove(product_id)
 
         return Response({'message': 'Item removed from cart successfully'})
 
@@ -178,7 +222,8 @@ class CheckoutAPIView(APIView):
 
     @transaction.atomic
     def post(self, request):
-        cart = self.request.session.get('cart', {})
+        user_cart = cart_for(request)
+        cart = user_cart.items()
 
         if not cart:
             return Response({'message': 'Your cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
@@ -189,41 +234,17 @@ class CheckoutAPIView(APIView):
             order = Order.objects.create(user=request.user)
 
         try:
-            for product_id, item in cart.items():
-                product = get_object_or_404(Product, id=product_id)
-
-                if product.quantity < item['quantity']:
-                    raise ValidationError(f'Not enough quantity for product {product.name}')
-
-                order_item, created = OrderItem.objects.get_or_create(
-                    order=order,
-                    product=product,
-                    defaults={'quantity': item['quantity'], 'price': product.price}
-                )
-
-                if not created:
-
-                    order_item.quantity += item['quantity']
-                    order_item.price = product.price * order_item.quantity
-                    order_item.save()
-
-                product.quantity -= item['quantity']
-                product.save()
-
-            order.total_price = sum(item.price for item in order.order_items.all())
-            order.save()
-
-        except ValidationError as e:
+            place_order(order, cart)
+        except CheckoutError as e:
             return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        self.request.session['cart'] = {}
-        self.request.session.modified = True
+        user_cart.clear()
 
         order_items = [{
             'name': item.product.name,
             'quantity': item.quantity,
             'price': item.price
-        } for item in order.order_items.all()]
+        } for item in order.order_items.select_related('product')]
 
         return Response({
             'message': 'Order created successfully',
@@ -241,24 +262,29 @@ class ActiveOrderAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        try:
-            order = Order.objects.get(user=self.request.user, is_active=True)
-            order_data = OrderSerializer(order).data
-            return Response(order_data, status=status.HTTP_200_OK)
-        except Order.DoesNotExist:
-            return Response({'error': 'No active order found'}, status=status.HTTP_404_NOT_FOUND)
+        snapshot = OrderSnapshot.objects.filter(
+            user=self.request.user, is_final=False
+        ).order_by('-order_date', '-pk').first()
+
+        if snapshot is None:
+            # Snapshots are written at checkout; orders placed before they existed are described without writing.
+            order = Order.objects.filter(user=self.request.user, is_active=True).first()
+            if order is None:
+                return Response({'error': 'No active order found'}, status=status.HTTP_404_NOT_FOUND)
+            snapshot = draft_snapshot(order)
+
+        return Response(OrderSnapshotSerializer(snapshot).data, status=status.HTTP_200_OK)
 
 
 class CheckCouponAPIView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_classes = [CouponCheckThrottle]
 
     def post(self, request):
-        coupon_code = self.request.data.get('coupon')
-        try:
-            coupon = get_object_or_404(Coupon, coupon_code=coupon_code, is_active=True)
-            return Response({'valid': True, 'discount': coupon.amount_of_discount}, status=200)
-        except Coupon.DoesNotExist:
+        discount = get_coupon_discount(self.request.data.get('coupon'))
+        if discount is None:
             return Response({'valid': False}, status=200)
+        return Response({'valid': True, 'discount': discount}, status=200)
 
 
 class ConfirmOrderAPIView(APIView):
@@ -280,34 +306,39 @@ class ConfirmOrderAPIView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        coupon_code = request.data.get('coupon_code')
-        coupon = None
-        if coupon_code:
-            try:
-                coupon = Coupon.objects.get(coupon_code=coupon_code, is_active=True)
-            except Coupon.DoesNotExist:
-                pass
-
-        cart = Cart.objects.create(
-            custom_user=user,
-            order=order,
-            address=address,
-            coupon=coupon,
-            is_active=True
-        )
-        cart.calculate_total_price()
-        cart.deactivate_related_objects()
-
-        cart.is_active = False
-        cart.save(update_fields=['is_active'])
+        try:
+            cart = confirm_order(order, address, request.data.get('coupon_code'))
+        except CheckoutError as error:
+            return Response({'message': str(error)}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response({'message': 'Order confirmed successfully', 'cart_id': cart.id}, status=status.HTTP_200_OK)
 
 
-class UserOrdersAPIView(generics.ListAPIView):
+class UserOrdersAPIView(APIView):
 
-    serializer_class = ShowOrderSerializer
     permission_classes = [IsAuthenticated]
 
-    def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).order_by('-order_date')
+    def get_closed_page(self, cursor):
+        page = KeysetPaginator(
+            OrderSnapshot.objects.filter(user=self.request.user, is_final=True),
+            settings.ORDER_HISTORY_PAGE_SIZE,
+            field='order_date',
+        ).get_page(cursor)
+        return {
+            'results': OrderSnapshotSerializer(page.object_list, many=True).data,
+            'next_cursor': page.next_cursor,
+        }
+
+    def get(self, request):
+        cursor = request.GET.get('cursor')
+        try:
+            page = get_closed_orders_page(request.user.pk, cursor, self.get_closed_page)
+        except InvalidCursor as e:
+            return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = page['results']
+        if not cursor:
+            drafts = OrderSnapshot.objects.filter(user=request.user, is_final=False).order_by('-order_date', '-pk')
+            results = OrderSnapshotSerializer(drafts, many=True).data + results
+
+        return Response({'results': results, 'next_cursor': page['next_cursor']})
@@ -1,22 +1,25 @@
 // noinspection DuplicatedCode,JSUnresolvedReference,UnnecessaryLocalVariableJS
 
 document.addEventListener('DOMContentLoaded', function () {
-    const addToCartButtons = document.querySelectorAll('.add-to-cart-btn');
-
-    addToCartButtons.forEach(function (button) {
-        button.addEventListener('click', function () {
-            const productId = this.getAttribute('data-product-id');
-            const productName = this.getAttribute('data-product-name');
-            const productPrice = this.getAttribute('data-product-price');
-
-            if (!isUserAuthenticated) {
-                addToLocalStorageCart(productId, productName, productPrice);
-            } else {
-                addProductToCart(productId, productPrice);
-            }
-        });
+    document.addEventListener('click', function (event) {
+        const button = event.target.closest('.add-to-cart-btn');
+        if (!button) {
+            return;
+        }
+
+        const productId = button.getAttribute('data-product-id');
+        const productName = button.getAttribute('data-product-name');
+        const productPrice = button.getAttribute('data-product-price');
+
+        if (!isUserAuthenticated) {
+            addToLocalStorageCart(productId, productName, productPrice);
+        } else {
+            addProductToCart(productId, productPrice);
+        }
     });
 
+    setUpInfiniteScroll();
+
     updateCartCountOnLoad();
 
     document.addEventListener('visibilitychange', function () {
@@ -35,6 +38,49 @@ document.addEventListener('DOMContentLoaded', function () {
         .catch(error => console.error('Error checking login status:', error));
 });
 
+function setUpInfiniteScroll() {
+    const loadMore = document.getElementById('load-more');
+    const productGrid = document.getElementById('product-grid');
+
+    if (!loadMore || !productGrid || !('IntersectionObserver' in window)) {
+        return;
+    }
+
+    let loading = false;
+
+    const observer = new IntersectionObserver(function (entries) {
+        if (!entries[0].isIntersecting || loading) {
+            return;
+        }
+
+        loading = true;
+        const cursor = loadMore.getAttribute('data-next-cursor');
+
+        fetch(`/?fragment=1&cursor=${encodeURIComponent(cursor)}`)
+            .then(response => {
+                const nextCursor = response.headers.get('X-Next-Cursor');
+                return response.text().then(html => ({ html, nextCursor }));
+            })
+            .then(({ html, nextCursor }) => {
+                productGrid.insertAdjacentHTML('beforeend', html);
+
+                if (nextCursor) {
+                    loadMore.setAttribute('data-next-cursor', nextCursor);
+                    loadMore.querySelector('a').setAttribute('href', `?cursor=${nextCursor}`);
+                } else {
+                    observer.disconnect();
+                    loadMore.remove();
+                }
+            })
+            .catch(error => console.error('Error loading products:', error))
+            .finally(() => {
+                loading = false;
+            });
+    });
+
+    observer.observe(loadMore);
+}
+
 function addToLocalStorageCart(productId, productName, productPrice) {
     let cart = JSON.parse(localStorage.getItem('cart')) || {};
 
@@ -49,7 +49,7 @@ function renderOrderSummary(data) {
         // noinspection JSDeprecatedSymbols
         orderItem.innerHTML = `
             <div class="cart-item-details">
-                <h2 class="text-lg font-semibold">${item.product.name}</h2>
+                <h2 class="text-lg font-semibold">${item.product_name}</h2>
                 <p class="text-gray-700">Quantity: ${item.quantity}</p>
             </div>
             <div class="cart-item-actions">
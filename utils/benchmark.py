@@ -0,0 +1,46 @@
+import statistics
+import time
+from contextlib import contextmanager
+from django.db import connections, transaction
+from django.test.utils import CaptureQueriesContext
+
+
+class _Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rollback_atomic(using=None):
+
+    """
+    Run a block inside a transaction that is always rolled back, so benchmarks leave no synthetic data behind.
+    """
+
+    try:
+        with transaction.atomic(using=using):
+            yield
+            raise _Rollback
+    except _Rollback:
+        pass
+
+
+def measure(func, repeat=5, using='default'):
+
+    """
+    Call 'func' 'repeat' times and return its timings in milliseconds and the number of queries per call.
+    """
+
+    timings = []
+
+    with CaptureQueriesContext(connections[using]) as context:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+
+    return {
+        'median': statistics.median(timings),
+        'min': min(timings),
+        'max': max(timings),
+        'queries': len(context.captured_queries) // repeat,
+    }
@@ -5,3 +5,17 @@ import string
 def generate_coupon_code():
 
     return ''.join(random.choices(string.ascii_letters + string.digits, k=8))
+
+
+def generate_coupon_codes(count):
+
+    """
+    Generate 'count' distinct coupon codes.
+    """
+
+    codes = set()
+
+    while len(codes) < count:
+        codes.update(generate_coupon_code() for _ in range(count - len(codes)))
+
+    return codes
@@ -1,8 +1,11 @@
-from django.core.mail import send_mail
-from django.conf import settings
+def verification_email(user_email, verification_code):
 
+    """
+    The recipient, subject and body of the email carrying a verification code.
+    """
 
-def send_verification_code(user_email, verification_code):
-    subject = 'Authentication code: Online Shopping Store (Infinite Shop)'
-    message = f'Your authentication code is: {verification_code}'
-    send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [user_email])
+    return {
+        'recipient': user_email,
+        'subject': 'Authentication code: Online Shopping Store (Infinite Shop)',
+        'body': f'Your authentication code is: {verification_code}',
+    }